@@ -79,6 +79,12 @@ class DiagnosticService:
             context += f"- RPM: {gen.get('rpm', 0)}\n"
             context += f"- Vibración: {gen.get('vibracion', 0)} mm/s\n"
         
+        if motor_data.get("anomalyAttribution"):
+            anomaly = motor_data["anomalyAttribution"]
+            context += f"\n**Última anomalía detectada por ML** (score: {anomaly.get('score', 0):.2f}, {anomaly.get('timestamp', '')}):\n"
+            for feature, z in anomaly.get("features", {}).items():
+                context += f"- {feature}: {z:+.2f} desviaciones estándar\n"
+        
         return context
     
     async def chat(
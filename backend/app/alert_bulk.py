@@ -0,0 +1,86 @@
+"""
+Set-based bulk operations on alerts: resolve, delete or archive by filter.
+
+Each operation is one statement over the alerts table (UPDATE / DELETE with
+RETURNING id, plus INSERT ... SELECT for the archive) inside one writer job.
+No Alert objects are loaded, so clearing a large backlog costs one index
+scan. The returned ids keep the active-alert index in sync.
+"""
+import json
+import time
+from datetime import datetime
+
+from sqlalchemy import select, update, delete, insert, func, literal, Boolean, DateTime
+
+from app.database import Alert, AlertArchive
+from app.db_writer import db_writer, write_log, PRIORITY_USER
+from app.alert_index import alert_index
+from app.cache import summary_cache
+
+ACTIONS = ("resolve", "delete", "archive")
+FILTER_FIELDS = ("category", "severity", "phase", "resolved")
+
+
+def filter_conditions(filters, fields=FILTER_FIELDS) -> list:
+    """AlertBulkFilter -> SQL conditions (an empty list matches every alert)"""
+    conditions = []
+    for field in fields:
+        value = getattr(filters, field)
+        if value is not None:
+            conditions.append(getattr(Alert, field) == value)
+    if filters.start_time:
+        conditions.append(Alert.timestamp >= filters.start_time)
+    if filters.end_time:
+        conditions.append(Alert.timestamp <= filters.end_time)
+    return conditions
+
+
+async def _resolve(session, conditions: list, now: datetime) -> list:
+    # resolved = 0 usa el índice parcial de alertas activas
+    statement = (
+        update(Alert)
+        .where(Alert.resolved == False, *conditions)
+        .values(resolved=True, resolved_at=now)
+        .returning(Alert.id)
+    )
+    return (await session.execute(statement)).scalars().all()
+
+
+async def _delete(session, conditions: list, now: datetime) -> list:
+    alerts = Alert.__table__
+    statement = delete(alerts).where(*conditions).returning(alerts.c.id)
+    return (await session.execute(statement)).scalars().all()
+
+
+async def _archive(session, conditions: list, now: datetime) -> list:
+    """Copy matching alerts to alerts_archive (active ones archived as resolved now), then delete them"""
+    alerts = Alert.__table__
+    columns = [c.name for c in alerts.columns]
+    values = {c: alerts.c[c] for c in columns}
+    values["resolved"] = literal(True, Boolean)
+    values["resolved_at"] = func.coalesce(alerts.c.resolved_at, literal(now, DateTime))
+    rows = select(*values.values(), literal(now, DateTime)).where(*conditions)
+    await session.execute(insert(AlertArchive).from_select(columns + ["archived_at"], rows))
+    return await _delete(session, conditions, now)
+
+
+JOBS = {"resolve": _resolve, "delete": _delete, "archive": _archive}
+
+
+async def bulk_alerts(action: str, filters) -> dict:
+    """Run one bulk operation through the writer; returns {"action", "count", "duration_ms"}"""
+    # resolve solo toma alertas activas: el filtro `resolved` no aplica
+    conditions = filter_conditions(filters, FILTER_FIELDS[:3] if action == "resolve" else FILTER_FIELDS)
+    job = JOBS[action]
+    now = datetime.utcnow()
+    details = filters.model_dump_json(exclude_none=True)
+
+    started = time.perf_counter()
+    ids = await db_writer.submit(lambda session: job(session, conditions, now), PRIORITY_USER)
+    duration = (time.perf_counter() - started) * 1000
+    await write_log("info", "api", f"Bulk {action}: {len(ids)} alerts", details)
+    # Resueltas, borradas o archivadas: ninguna sigue activa
+    alert_index.resolve(ids)
+    summary_cache.invalidate()
+    print(f"✅ Bulk {action}: {len(ids)} alertas en {duration:.1f} ms ({json.loads(details) or 'todas'})")
+    return {"action": action, "count": len(ids), "duration_ms": round(duration, 2)}
@@ -0,0 +1,122 @@
+"""
+In-memory index of unresolved alerts.
+
+`/api/alerts/active` is polled constantly by the dashboard; it is answered
+from this index instead of the alerts table. Every path that creates or
+resolves alerts (MQTT and batch ingestion, auto-resolution, the resolve
+endpoints) updates the index right after its writer job commits. Because
+those updates run in commit order, the index follows the table.
+
+On startup `reconcile()` runs as a writer job, so no write can interleave.
+It compares the index with the unresolved rows in the database, fixes any
+difference, and reports it. Until that first check finishes, the endpoint
+keeps reading the database.
+"""
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+
+from app.database import Alert
+from app.db_writer import db_writer, write_log, PRIORITY_USER
+
+ALERT_COLUMNS = [c.name for c in Alert.__table__.columns]
+
+
+def alert_row(alert) -> dict:
+    """ORM Alert or Core row -> plain dict with the alerts columns"""
+    if isinstance(alert, Alert):
+        return {c: getattr(alert, c) for c in ALERT_COLUMNS}
+    return dict(alert._mapping)
+
+
+class ActiveAlertIndex:
+    def __init__(self):
+        self.alerts = {}  # id -> fila
+        self.by_severity = {}  # severidad -> set de ids
+        self.by_category = {}  # categoría -> set de ids
+        self.ready = False
+        self._ordered = None  # lista más nuevas primero, se recalcula tras cada cambio
+        self.last_check = None
+
+    def _index(self, key: dict, value, alert_id: int):
+        key.setdefault(value, set()).add(alert_id)
+
+    def _unindex(self, key: dict, value, alert_id: int):
+        ids = key.get(value)
+        if ids is not None:
+            ids.discard(alert_id)
+            if not ids:
+                del key[value]
+
+    def add(self, rows):
+        """Register committed alerts (resolved ones are ignored)"""
+        for row in rows:
+            if row["resolved"] or row["id"] is None:
+                continue
+            self.alerts[row["id"]] = row
+            self._index(self.by_severity, row["severity"], row["id"])
+            self._index(self.by_category, row["category"], row["id"])
+            self._ordered = None
+
+    def resolve(self, ids):
+        """Drop alerts resolved (or deleted) by a committed job"""
+        for alert_id in ids:
+            row = self.alerts.pop(alert_id, None)
+            if row is not None:
+                self._unindex(self.by_severity, row["severity"], alert_id)
+                self._unindex(self.by_category, row["category"], alert_id)
+                self._ordered = None
+
+    def active(self, severity: str = None, category: str = None) -> list:
+        """Unresolved alerts, newest first, optionally filtered by severity and category"""
+        if self._ordered is None:
+            self._ordered = sorted(self.alerts.values(), key=lambda r: (r["timestamp"], r["id"]), reverse=True)
+        if severity is None and category is None:
+            return self._ordered
+        ids = None
+        for key, value in ((self.by_severity, severity), (self.by_category, category)):
+            if value is not None:
+                matching = key.get(value, set())
+                ids = matching if ids is None else ids & matching
+        return [row for row in self._ordered if row["id"] in ids]
+
+    async def _check(self, session) -> dict:
+        """Writer job: compare with the unresolved rows in the table and adopt them"""
+        query = select(*[Alert.__table__.c[c] for c in ALERT_COLUMNS]).where(Alert.resolved == False)
+        rows = {row.id: dict(row._mapping) for row in (await session.execute(query)).all()}
+        missing = rows.keys() - self.alerts.keys()
+        stale = self.alerts.keys() - rows.keys()
+        changed = [i for i in rows.keys() & self.alerts.keys() if rows[i] != self.alerts[i]]
+        self.resolve(list(self.alerts))
+        self.add(rows.values())
+        return {"db_active": len(rows), "missing": len(missing), "stale": len(stale), "changed": len(changed)}
+
+    async def reconcile(self, startup: bool = False) -> dict:
+        """Consistency check against the database (see module docstring)"""
+        started = time.perf_counter()
+        report = await db_writer.submit(self._check, PRIORITY_USER)
+        report["duration_ms"] = round((time.perf_counter() - started) * 1000, 2)
+        report["checked_at"] = datetime.utcnow()
+        was_ready, self.ready = self.ready, True
+        self.last_check = report
+
+        # En el arranque las alertas previas "faltan" por definición: solo es discrepancia después
+        drift = report["stale"] + report["changed"] + (0 if startup or not was_ready else report["missing"])
+        print(f"🔔 Índice de alertas activas: {report['db_active']} alertas, {drift} discrepancias corregidas")
+        if drift:
+            await write_log("warning", "database", "Active alert index out of sync with the database",
+                            {k: v for k, v in report.items() if k != "checked_at"})
+        return report
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready,
+            "active": len(self.alerts),
+            "by_severity": {k: len(v) for k, v in self.by_severity.items()},
+            "last_check": self.last_check,
+        }
+
+
+# Global index (filled by reconcile() during warm-up)
+alert_index = ActiveAlertIndex()
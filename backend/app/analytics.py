@@ -0,0 +1,377 @@
+"""
+Report statistics backends (ANALYTICS_BACKEND).
+
+"numpy": load only the report columns from both tiers and aggregate the arrays.
+"sql": run the aggregations (per-field avg/min/max, hourly grouping, alert
+counts) as GROUP BY queries; SQLite aggregates the hot range and every alert
+in place, and DuckDB, when installed, aggregates the cold-tier reading
+partitions in memory. Only
+the aggregated rows reach Python, never one object per reading.
+"""
+import asyncio
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import text, bindparam, DateTime
+
+from app.config import settings
+from app.database import MotorReading, Alert, alerts_history_sql
+from app.cold_archive import cold_archive
+from app.history import load_columns
+from app.partitions import readings_sql
+from app.reading_blocks import has_blocks
+
+try:
+    import duckdb
+except ImportError:  # Opcional: sin DuckDB los rangos con días fríos usan la ruta NumPy
+    duckdb = None
+
+# Columnas que leen los reportes (el nivel frío solo descomprime estas)
+REPORT_READING_COLUMNS = [
+    "timestamp", "temperature", "vibration", "rpm",
+    "voltage_a", "voltage_b", "voltage_c", "current_a", "current_b", "current_c",
+]
+REPORT_ALERT_COLUMNS = ["timestamp", "severity", "category"]
+
+
+def _summary(values, digits: int) -> dict:
+    """avg/min/max de los valores no nulos (0 si no hay datos)"""
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return {"avg": 0, "min": 0, "max": 0}
+    return {
+        "avg": round(float(values.mean()), digits),
+        "min": round(float(values.min()), digits),
+        "max": round(float(values.max()), digits)
+    }
+
+
+def _mean(values) -> float:
+    values = values[~np.isnan(values)]
+    return round(float(values.mean()), 2) if len(values) else 0
+
+
+def calculate_statistics(readings: dict, alerts: dict) -> dict:
+    """
+    Calcula estadísticas del período incluyendo análisis temporal por hora
+    readings / alerts: columnas como arrays (ver app/history.load_columns)
+    """
+    if not len(readings["timestamp"]):
+        return {}
+
+    # Alertas por severidad
+    severities = alerts["severity"]
+    alerts_by_severity = {
+        "critical": int(np.count_nonzero(severities == "critical")),
+        "warning": int(np.count_nonzero(severities == "warning")),
+        "info": int(np.count_nonzero(severities == "info"))
+    }
+
+    # Alertas por categoría
+    categories, category_counts = np.unique(alerts["category"], return_counts=True)
+    alerts_by_category = {str(c): int(n) for c, n in zip(categories, category_counts)}
+
+    # ===== ANÁLISIS TEMPORAL POR HORA =====
+    hours, hour_index = np.unique(readings["timestamp"].astype("datetime64[h]"), return_inverse=True)
+    n_hours = len(hours)
+
+    def hourly(values):
+        # Como antes, solo cuentan los valores verdaderos (no nulos y distintos de 0)
+        mask = ~np.isnan(values) & (values != 0)
+        counts = np.bincount(hour_index[mask], minlength=n_hours)
+        sums = np.bincount(hour_index[mask], weights=values[mask], minlength=n_hours)
+        maxima = np.full(n_hours, -np.inf)
+        np.maximum.at(maxima, hour_index[mask], values[mask])
+        return counts, sums, maxima
+
+    temp_n, temp_sum, temp_max = hourly(readings["temperature"])
+    vib_n, vib_sum, vib_max = hourly(readings["vibration"])
+    rpm_n, rpm_sum, _ = hourly(readings["rpm"])
+
+    # Agrupar alertas por hora
+    alert_hours = alerts["timestamp"].astype("datetime64[h]")
+    pos = np.clip(np.searchsorted(hours, alert_hours), 0, max(n_hours - 1, 0))
+    in_hours = hours[pos] == alert_hours
+    alerts_per_hour = np.bincount(pos[in_hours], minlength=n_hours)
+    critical_per_hour = np.bincount(pos[in_hours & (severities == "critical")], minlength=n_hours)
+
+    # Calcular estadísticas por hora
+    hourly_stats = []
+    for i in np.flatnonzero((vib_n > 0) | (temp_n > 0)):
+        hourly_stats.append({
+            'hour': hours[i].astype(datetime).strftime('%Y-%m-%d %H:%M'),
+            'temperature_avg': round(float(temp_sum[i] / temp_n[i]), 2) if temp_n[i] else 0,
+            'temperature_max': round(float(temp_max[i]), 2) if temp_n[i] else 0,
+            'vibration_avg': round(float(vib_sum[i] / vib_n[i]), 2) if vib_n[i] else 0,
+            'vibration_max': round(float(vib_max[i]), 2) if vib_n[i] else 0,
+            'rpm_avg': round(float(rpm_sum[i] / rpm_n[i]), 0) if rpm_n[i] else 0,
+            'alerts': int(alerts_per_hour[i]),
+            'critical_alerts': int(critical_per_hour[i])
+        })
+
+    # Identificar horas críticas (vibración > 8 o temperatura > 70 o alertas críticas > 0)
+    critical_hours = [
+        h for h in hourly_stats
+        if h['vibration_max'] > 8 or h['temperature_max'] > 70 or h['critical_alerts'] > 0
+    ]
+
+    stats = {
+        "total_readings": len(readings["timestamp"]),
+        "temperature": _summary(readings["temperature"], 2),
+        "vibration": _summary(readings["vibration"], 2),
+        "rpm": _summary(readings["rpm"], 0),
+        "phase_a": {
+            "voltage_avg": _mean(readings["voltage_a"]),
+            "current_avg": _mean(readings["current_a"])
+        },
+        "phase_b": {
+            "voltage_avg": _mean(readings["voltage_b"]),
+            "current_avg": _mean(readings["current_b"])
+        },
+        "phase_c": {
+            "voltage_avg": _mean(readings["voltage_c"]),
+            "current_avg": _mean(readings["current_c"])
+        },
+        "alerts": {
+            "total": len(alerts["timestamp"]),
+            "by_severity": alerts_by_severity,
+            "by_category": alerts_by_category
+        },
+        "hourly_analysis": hourly_stats,
+        "critical_hours": critical_hours
+    }
+
+    return stats
+
+
+# avg/min/max globales
+SUMMARY_FIELDS = ["temperature", "vibration", "rpm"]
+# solo promedio global, por fase
+PHASE_FIELDS = ["voltage_a", "voltage_b", "voltage_c", "current_a", "current_b", "current_c"]
+# análisis por hora (valores verdaderos: no nulos y distintos de 0)
+HOURLY_FIELDS = ["temperature", "vibration", "rpm"]
+
+_HOUR_EXPR = {
+    "sqlite": "strftime('%Y-%m-%d %H:00', timestamp)",
+    "duckdb": "strftime(date_trunc('hour', timestamp), '%Y-%m-%d %H:00')",
+}
+_PARAMS = {
+    "sqlite": (":start", ":end"),
+    "duckdb": ("$start", "$end"),
+}
+
+
+def _queries(dialect: str, readings: str, alerts: str = None) -> dict:
+    """Overall, hourly and (with an alerts source) alert aggregation SQL for one engine"""
+    hour = _HOUR_EXPR[dialect]
+    start, end = _PARAMS[dialect]
+    where = f"WHERE timestamp >= {start} AND timestamp <= {end}"
+
+    overall = ["COUNT(*)"]
+    for field in SUMMARY_FIELDS + PHASE_FIELDS:
+        overall += [f"COUNT({field})", f"SUM({field})", f"MIN({field})", f"MAX({field})"]
+
+    hourly = [f"{hour} AS hour"]
+    for field in HOURLY_FIELDS:
+        value = f"NULLIF({field}, 0)"
+        hourly += [f"COUNT({value})", f"SUM({value})", f"MAX({value})"]
+
+    queries = {
+        "overall": f"SELECT {', '.join(overall)} FROM {readings} {where}",
+        "hourly": f"SELECT {', '.join(hourly)} FROM {readings} {where} GROUP BY hour",
+    }
+    if alerts:
+        queries["alerts"] = f"SELECT {hour} AS hour, severity, category, COUNT(*) FROM {alerts} {where} " \
+                            f"GROUP BY hour, severity, category"
+    return queries
+
+
+async def _hot_parts(session, ranges: dict) -> dict:
+    """Aggregate the hot range inside SQLite; ranges maps query name -> (start, end)"""
+    parts = {}
+    for name, sql in _queries("sqlite", readings_sql(*ranges["overall"]), alerts_history_sql()).items():
+        start, end = ranges[name]
+        stmt = text(sql).bindparams(bindparam("start", type_=DateTime), bindparam("end", type_=DateTime))
+        parts[name] = (await session.execute(stmt, {"start": start, "end": end})).all()
+    return parts
+
+
+def _concat(chunks: list, columns: list, dtypes: dict) -> dict:
+    if not chunks:
+        return {c: np.array([], dtype=dtypes.get(c, np.float64)) for c in columns}
+    return {c: np.concatenate([chunk[c] for chunk in chunks]) for c in columns}
+
+
+def _cold_parts(ranges: dict) -> dict:
+    """Aggregate cold reading partitions with DuckDB over the column arrays (alerts are never cold)"""
+    readings_columns = ["timestamp"] + list(dict.fromkeys(SUMMARY_FIELDS + PHASE_FIELDS + HOURLY_FIELDS))
+    dtypes = {"timestamp": "datetime64[us]"}
+    readings = _concat(cold_archive.read("motor_readings", readings_columns, *ranges["overall"]), readings_columns, dtypes)
+
+    con = duckdb.connect()
+    try:
+        con.register("cold_readings", readings)
+        # NaN marca NULL en el archivo frío
+        columns = ", ".join(["timestamp"] + [f"NULLIF({c}, 'NaN'::DOUBLE) AS {c}" for c in readings_columns[1:]])
+        parts = {"alerts": []}
+        for name, sql in _queries("duckdb", f"(SELECT {columns} FROM cold_readings)").items():
+            start, end = ranges[name]
+            parts[name] = con.execute(sql, {"start": start, "end": end}).fetchall()
+        return parts
+    finally:
+        con.close()
+
+
+def _combine(parts: list) -> dict:
+    """Merge partial aggregates into the calculate_statistics() result shape"""
+    total = 0
+    overall = {f: {"count": 0, "sum": 0.0, "min": None, "max": None} for f in SUMMARY_FIELDS + PHASE_FIELDS}
+    hours = {}
+    alerts_total = 0
+    by_severity = {"critical": 0, "warning": 0, "info": 0}
+    by_category = {}
+    alerts_by_hour = {}
+
+    for part in parts:
+        row = part["overall"][0]
+        total += row[0] or 0
+        for i, field in enumerate(SUMMARY_FIELDS + PHASE_FIELDS):
+            count, value_sum, low, high = row[1 + 4 * i: 5 + 4 * i]
+            if not count:
+                continue
+            agg = overall[field]
+            agg["count"] += count
+            agg["sum"] += value_sum
+            agg["min"] = low if agg["min"] is None else min(agg["min"], low)
+            agg["max"] = high if agg["max"] is None else max(agg["max"], high)
+
+        for row in part["hourly"]:
+            acc = hours.setdefault(row[0], {f: [0, 0.0, None] for f in HOURLY_FIELDS})
+            for i, field in enumerate(HOURLY_FIELDS):
+                count, value_sum, high = row[1 + 3 * i: 4 + 3 * i]
+                if not count:
+                    continue
+                acc[field][0] += count
+                acc[field][1] += value_sum
+                acc[field][2] = high if acc[field][2] is None else max(acc[field][2], high)
+
+        for hour, severity, category, count in part["alerts"]:
+            alerts_total += count
+            if severity in by_severity:
+                by_severity[severity] += count
+            by_category[category] = by_category.get(category, 0) + count
+            counts = alerts_by_hour.setdefault(hour, [0, 0])
+            counts[0] += count
+            if severity == "critical":
+                counts[1] += count
+
+    if not total:
+        return {}
+
+    def summary(field, digits):
+        agg = overall[field]
+        if not agg["count"]:
+            return {"avg": 0, "min": 0, "max": 0}
+        return {
+            "avg": round(agg["sum"] / agg["count"], digits),
+            "min": round(agg["min"], digits),
+            "max": round(agg["max"], digits)
+        }
+
+    def mean(field):
+        agg = overall[field]
+        return round(agg["sum"] / agg["count"], 2) if agg["count"] else 0
+
+    hourly_stats = []
+    for hour in sorted(hours):
+        acc = hours[hour]
+        (temp_n, temp_sum, temp_max), (vib_n, vib_sum, vib_max), (rpm_n, rpm_sum, _) = (
+            acc[f] for f in HOURLY_FIELDS
+        )
+        if not (temp_n or vib_n):
+            continue
+        alert_count, critical_count = alerts_by_hour.get(hour, (0, 0))
+        hourly_stats.append({
+            'hour': hour,
+            'temperature_avg': round(temp_sum / temp_n, 2) if temp_n else 0,
+            'temperature_max': round(temp_max, 2) if temp_n else 0,
+            'vibration_avg': round(vib_sum / vib_n, 2) if vib_n else 0,
+            'vibration_max': round(vib_max, 2) if vib_n else 0,
+            'rpm_avg': round(rpm_sum / rpm_n, 0) if rpm_n else 0,
+            'alerts': alert_count,
+            'critical_alerts': critical_count
+        })
+
+    critical_hours = [
+        h for h in hourly_stats
+        if h['vibration_max'] > 8 or h['temperature_max'] > 70 or h['critical_alerts'] > 0
+    ]
+
+    return {
+        "total_readings": total,
+        "temperature": summary("temperature", 2),
+        "vibration": summary("vibration", 2),
+        "rpm": summary("rpm", 0),
+        "phase_a": {"voltage_avg": mean("voltage_a"), "current_avg": mean("current_a")},
+        "phase_b": {"voltage_avg": mean("voltage_b"), "current_avg": mean("current_b")},
+        "phase_c": {"voltage_avg": mean("voltage_c"), "current_avg": mean("current_c")},
+        "alerts": {
+            "total": alerts_total,
+            "by_severity": by_severity,
+            "by_category": by_category
+        },
+        "hourly_analysis": hourly_stats,
+        "critical_hours": critical_hours
+    }
+
+
+def _split(table_name: str, start, end):
+    """(cold range, hot range) for one table; either may be None"""
+    boundary = cold_archive.watermark(table_name)
+    if boundary is None:
+        return None, (start, end)
+    cold = (start, min(end, boundary)) if start < boundary else None
+    hot = (max(start, boundary), end) if max(start, boundary) <= end else None
+    return cold, hot
+
+
+async def sql_report_statistics(session, start, end):
+    """
+    Report statistics computed with SQL aggregation over both tiers
+    Returns None when the range needs the cold tier and DuckDB is not installed,
+    or overlaps compressed reading blocks (SQLite cannot aggregate inside them)
+    """
+    readings_cold, readings_hot = _split("motor_readings", start, end)
+    if readings_hot and settings.READING_BLOCKS_ENABLED and await has_blocks(session, *readings_hot):
+        return None
+    # Rango vacío (start > end) para el nivel que no aplica
+    empty = (end, start)
+    parts = []
+
+    if readings_cold:
+        if duckdb is None:
+            return None
+        ranges = {"overall": readings_cold, "hourly": readings_cold}
+        loop = asyncio.get_running_loop()
+        parts.append(await loop.run_in_executor(None, _cold_parts, ranges))
+
+    # Alertas: siempre en SQLite (alerts + alerts_archive), todo el rango
+    ranges = {"overall": readings_hot or empty, "hourly": readings_hot or empty, "alerts": (start, end)}
+    parts.append(await _hot_parts(session, ranges))
+
+    return _combine(parts)
+
+
+async def load_report_statistics(db, start_time: datetime, end_time: datetime) -> dict:
+    """
+    Estadísticas del período con el backend de ANALYTICS_BACKEND
+    "sql" agrega en SQLite (y DuckDB para el archivo frío); "numpy" carga las columnas y agrega en memoria
+    """
+    if settings.ANALYTICS_BACKEND == "sql":
+        stats = await sql_report_statistics(db, start_time, end_time)
+        if stats is not None:
+            return stats
+
+    readings = await load_columns(db, MotorReading, REPORT_READING_COLUMNS, start_time, end_time)
+    alerts = await load_columns(db, Alert, REPORT_ALERT_COLUMNS, start_time, end_time)
+    return calculate_statistics(readings, alerts)
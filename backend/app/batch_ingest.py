@@ -0,0 +1,290 @@
+"""
+Bulk ingestion for gateways and devices that buffer readings while offline.
+
+A batch (JSON or packed float64 records) goes through the same steps as one
+MQTT reading, but each step runs once per batch:
+
+1. Vectorized validation: finite values, timestamps inside the accepted
+   window (not in the future, not in days already archived or expired).
+2. Batched ML scoring: rolling windows advance reading by reading, then one
+   model call scores the whole batch.
+3. One writer job: multi-row insert, rollups, NumPy threshold evaluation and
+   a multi-row alert insert, in a single transaction.
+
+The response acknowledges the batch by sequence range (first_seq + index of
+each reading) and lists the rejected sequence numbers with the reason.
+"""
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from sqlalchemy import select, desc, insert
+
+from app.config import settings
+from app.database import Alert, ThresholdSettings as ThresholdSettingsDB, MotorReading, READING_FIELDS
+from app.db_writer import db_writer, write_log, PRIORITY_INGEST
+from app.partitions import insert_readings
+from app.rollups import apply_readings
+from app.hot_store import hot_store
+from app.cache import summary_cache
+from app.cold_archive import cold_archive
+from app.columnar import loads
+from app.mqtt_client import mqtt_handler
+from app.ws_hub import ws_hub
+from app.alert_index import alert_index
+
+# Registro binario: timestamp (segundos epoch UTC) + campos, float64 little-endian
+BINARY_COLUMNS = ["timestamp"] + READING_FIELDS
+BINARY_RECORD_SIZE = 8 * len(BINARY_COLUMNS)
+# Cota de bytes por lectura JSON (todos los campos con nombre, timestamp ISO y espacios)
+JSON_READING_MAX_BYTES = 1024
+
+# (campo, prefijo del umbral, etiqueta, formato, unidad) como en MQTTHandler.check_thresholds
+THRESHOLD_CHECKS = [
+    ("temperature", "temp", "Temperature", ".1f", "°C"),
+    ("vibration", "vibration", "Vibration", ".1f", " mm/s"),
+    ("rpm", "rpm", "RPM", ".0f", ""),
+]
+# Listado de rechazos en la respuesta (el total siempre se informa)
+MAX_REJECTED_LISTED = 100
+
+
+class BatchError(ValueError):
+    """Malformed batch (the route answers 400)"""
+
+
+class BatchTooLarge(BatchError):
+    """Body over the size that INGEST_BATCH_MAX_READINGS allows (the route answers 413)"""
+
+
+def max_body_bytes(binary: bool) -> int:
+    """Largest body a batch of INGEST_BATCH_MAX_READINGS readings can need"""
+    per_reading = BINARY_RECORD_SIZE if binary else JSON_READING_MAX_BYTES
+    return settings.INGEST_BATCH_MAX_READINGS * per_reading
+
+
+async def read_body(request, binary: bool) -> bytes:
+    """
+    Read the request body, refusing oversized batches before buffering them:
+    a Content-Length over the limit is rejected unread, and the stream is cut as soon as it passes the limit
+    """
+    limit = max_body_bytes(binary)
+    error = f"Body over {limit} bytes (at most {settings.INGEST_BATCH_MAX_READINGS} readings per batch)"
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > limit:
+        raise BatchTooLarge(error)
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > limit:
+            raise BatchTooLarge(error)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _timestamp(value):
+    """ISO string or epoch seconds -> naive UTC datetime, None if invalid"""
+    try:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return datetime.fromtimestamp(value, tz=timezone.utc).replace(tzinfo=None)
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
+    except (TypeError, ValueError, OverflowError, OSError):
+        return None
+
+
+def parse_json(body: bytes) -> tuple:
+    """
+    {"motor_id", "first_seq", "readings": [{"timestamp", field: value}]} or a bare list of readings
+    Returns: (motor_id, first_seq or None, timestamps as datetime64[us], values matrix)
+    """
+    try:
+        payload = loads(body)
+    except ValueError:
+        raise BatchError("Body is not valid JSON")
+    meta = payload if isinstance(payload, dict) else {}
+    readings = payload.get("readings") if isinstance(payload, dict) else payload
+    if not isinstance(readings, list) or not all(isinstance(r, dict) for r in readings):
+        raise BatchError("Expected a list of readings (objects)")
+
+    timestamps = np.array(
+        [_timestamp(r.get("timestamp")) or np.datetime64("NaT") for r in readings], dtype="datetime64[us]"
+    )
+    try:
+        # Campos ausentes valen 0 como en MQTT; null queda como NaN y se rechaza
+        values = np.array([[r.get(f, 0) for f in READING_FIELDS] for r in readings], dtype=np.float64)
+    except (TypeError, ValueError):
+        raise BatchError("Reading values must be numbers")
+    first_seq = meta.get("first_seq")
+    if first_seq is not None and (not isinstance(first_seq, int) or isinstance(first_seq, bool)):
+        raise BatchError("first_seq must be an integer")
+    return meta.get("motor_id"), first_seq, timestamps, values.reshape(len(readings), len(READING_FIELDS))
+
+
+def parse_binary(body: bytes) -> tuple:
+    """Packed little-endian float64 records of BINARY_COLUMNS -> (timestamps, values)"""
+    if len(body) % BINARY_RECORD_SIZE:
+        raise BatchError(f"Binary body must be a multiple of {BINARY_RECORD_SIZE} bytes")
+    records = np.frombuffer(body, dtype="<f8").reshape(-1, len(BINARY_COLUMNS))
+    seconds = records[:, 0]
+    timestamps = np.full(len(records), np.datetime64("NaT"), dtype="datetime64[us]")
+    finite = np.isfinite(seconds)
+    timestamps[finite] = (seconds[finite] * 1e6).astype(np.int64).astype("datetime64[us]")
+    return timestamps, records[:, 1:].astype(np.float64)
+
+
+def validate(timestamps: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Rejection reason per reading ("" = accepted), computed column-wise"""
+    now = datetime.utcnow()
+    newest = np.datetime64(now + timedelta(seconds=settings.INGEST_MAX_FUTURE_SECONDS), "us")
+    oldest = None
+    if settings.RETENTION_RAW_DAYS:
+        oldest = now - timedelta(days=settings.RETENTION_RAW_DAYS)
+    # Días ya exportados al archivo frío: una lectura cruda ahí se borraría sin archivarse
+    watermark = cold_archive.watermark(MotorReading.__tablename__) if settings.COLD_ARCHIVE_ENABLED else None
+    if watermark is not None and (oldest is None or watermark > oldest):
+        oldest = watermark
+
+    missing = np.isnat(timestamps)
+    stamps = np.where(missing, np.datetime64(now, "us"), timestamps)
+    conditions = [missing, ~np.isfinite(values).all(axis=1), stamps > newest]
+    reasons = ["invalid timestamp", "missing or non-finite values", "timestamp in the future"]
+    if oldest is not None:
+        conditions.append(stamps < np.datetime64(oldest, "us"))
+        reasons.append("timestamp older than the hot retention window")
+    return np.select(conditions, reasons, default="")
+
+
+def threshold_alerts(thresholds, values: np.ndarray, timestamps: list, scores, flags, attributions) -> list:
+    """Alert rows for the whole batch: threshold breaches, ML anomalies and failures, per reading"""
+    now = datetime.utcnow()
+    stale = now - timedelta(minutes=2)
+    alerts = []
+    critical_rows = np.zeros(len(values), dtype=bool)
+
+    def add(i, severity, category, message, value, threshold):
+        ts = timestamps[i]
+        # Lecturas de hace más de 2 minutos: la alerta nace resuelta (misma regla que la auto-resolución)
+        alerts.append({
+            "timestamp": ts, "severity": severity, "category": category, "message": message,
+            "value": value, "threshold": threshold, "resolved": ts < stale, "resolved_at": now if ts < stale else None,
+        })
+
+    for field, prefix, label, fmt, unit in THRESHOLD_CHECKS:
+        column = values[:, READING_FIELDS.index(field)]
+        critical_at = getattr(thresholds, f"{prefix}_critical")
+        warning_at = getattr(thresholds, f"{prefix}_warning")
+        critical = column >= critical_at
+        warning = ~critical & (column >= warning_at)
+        critical_rows |= critical
+        for severity, mask, threshold in (("critical", critical, critical_at), ("warning", warning, warning_at)):
+            for i in np.flatnonzero(mask):
+                value = float(column[i])
+                add(i, severity, field, f"{label} {severity}: {value:{fmt}}{unit}", value, threshold)
+
+    for i in np.flatnonzero(flags):
+        score, causes = float(scores[i]), attributions[i]
+        add(i, "warning", "ml_anomaly",
+            f"⚡ IA detectó comportamiento anómalo (score: {score:.2f})" + (f" - causas: {', '.join(causes)}" if causes else ""),
+            score, 0.0)
+
+    for i in np.flatnonzero(critical_rows | (flags & (scores >= 0.7))):
+        anomalous = bool(flags[i])
+        add(i, "critical", "failure",
+            f"🚨 Motor failure detected: anomaly_score={scores[i]:.2f}" if anomalous else "🚨 Motor failure detected: threshold breach",
+            float(scores[i]) if anomalous else None, None)
+    return alerts
+
+
+async def _store(session, timestamps: list, rows: list, values: np.ndarray, scores, flags, attributions):
+    """Writer job: readings, rollups and alerts in one transaction"""
+    ids = await insert_readings(session, [{"timestamp": ts, **row} for ts, row in zip(timestamps, rows)])
+    await apply_readings(session, list(zip(timestamps, rows)))
+
+    thresholds = (await session.execute(
+        select(ThresholdSettingsDB).order_by(desc(ThresholdSettingsDB.id)).limit(1)
+    )).scalar_one_or_none()
+    if not thresholds:
+        thresholds = ThresholdSettingsDB()
+        session.add(thresholds)
+        await session.flush()
+
+    alerts = threshold_alerts(thresholds, values, timestamps, scores, flags, attributions)
+    if alerts:
+        result = await session.execute(insert(Alert).returning(Alert.id, sort_by_parameter_order=True), alerts)
+        for alert, alert_id in zip(alerts, result.scalars().all()):
+            alert["id"] = alert_id
+            alert["phase"] = None
+    return ids, alerts
+
+
+async def ingest_batch(motor_id: str, first_seq: int, timestamps: np.ndarray, values: np.ndarray, timing: dict) -> dict:
+    """Validate, score and store one batch; returns the acknowledgement"""
+    started = time.perf_counter()
+    motor_id = motor_id or settings.DEFAULT_MOTOR_ID
+    n = len(values)
+
+    reasons = validate(timestamps, values)
+    accepted = np.flatnonzero(reasons == "")
+    # Más antiguas primero: las ventanas móviles del modelo avanzan en orden
+    accepted = accepted[np.argsort(timestamps[accepted], kind="stable")]
+    timing["validate_ms"] = (time.perf_counter() - started) * 1000
+
+    alerts = []
+    anomalies = 0
+    if len(accepted):
+        stamps = timestamps[accepted].astype(datetime).tolist()
+        matrix = values[accepted]
+        rows = [dict(zip(READING_FIELDS, row)) for row in matrix.tolist()]
+
+        started = time.perf_counter()
+        scores, flags, attributions = await mqtt_handler.ml_detector.detect_batch(rows, motor_id, stamps)
+        for row, score, flag, attribution in zip(rows, scores.tolist(), flags.tolist(), attributions):
+            row["anomaly_score"] = score
+            row["is_anomaly"] = flag
+            row["anomaly_attribution"] = json.dumps(attribution) if attribution else None
+        timing["score_ms"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        ids, alerts = await db_writer.submit(
+            lambda session: _store(session, stamps, rows, matrix, scores, flags, attributions),
+            PRIORITY_INGEST
+        )
+        timing["write_ms"] = (time.perf_counter() - started) * 1000
+
+        # Solo lecturas confirmadas llegan al hot store (las atrasadas quedan fuera de su cobertura)
+        for row_id, ts, row in zip(ids, stamps, rows):
+            hot_store.push(motor_id, {"id": row_id, "timestamp": ts, **row})
+        alert_index.add(alerts)
+        summary_cache.invalidate()
+        anomalies = int(np.count_nonzero(flags))
+        if anomalies:
+            await write_log(
+                "warning", "ml", f"{anomalies} anomalies detected in a batch of {len(rows)} readings",
+                {"first": stamps[0].isoformat(), "last": stamps[-1].isoformat()}
+            )
+
+        # WebSocket: la última lectura del lote y las alertas activas (el hub coalesce por clave)
+        ws_hub.publish("readings", {"id": ids[-1], "timestamp": stamps[-1], **rows[-1]}, motor_id)
+        for alert in alerts:
+            if not alert["resolved"]:
+                ws_hub.publish("alerts", alert, motor_id, alert["category"])
+
+    rejected = np.flatnonzero(reasons != "")
+    print(f"📦 Lote {motor_id}: {len(accepted)}/{n} lecturas, {anomalies} anomalías, {len(alerts)} alertas")
+    return {
+        "motor_id": motor_id,
+        "ack": {"first_seq": first_seq, "last_seq": first_seq + n - 1} if n else None,
+        "received": n,
+        "accepted": len(accepted),
+        "rejected": len(rejected),
+        "rejections": [
+            {"seq": first_seq + int(i), "reason": str(reasons[i])} for i in rejected[:MAX_REJECTED_LISTED]
+        ],
+        "anomalies": anomalies,
+        "alerts": len(alerts),
+        "timing_ms": {k: round(v, 2) for k, v in timing.items()},
+    }
@@ -0,0 +1,61 @@
+"""
+Short-lived cache for dashboard aggregates.
+
+Values live for SUMMARY_CACHE_TTL seconds or until a write that changes them
+calls invalidate() (ingestion, alert resolution). Concurrent misses for the
+same key share one computation (single flight): the first request computes
+and the rest await the same task, so N dashboards polling at once cost one
+set of queries.
+"""
+import asyncio
+import time
+
+from app.config import settings
+
+
+class TTLCache:
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.entries = {}
+        self.inflight = {}
+        # Sube con cada invalidación: un cálculo empezado antes no se guarda
+        self.generation = 0
+        self.stats = {"hits": 0, "misses": 0, "shared": 0, "invalidations": 0}
+
+    async def get(self, key: str, compute):
+        """Cached value for key, or the result of `await compute()` (shared by concurrent callers)"""
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.stats["hits"] += 1
+            return entry[1]
+
+        task = self.inflight.get(key)
+        if task is None:
+            self.stats["misses"] += 1
+            task = self.inflight[key] = asyncio.ensure_future(self._fill(key, compute))
+        else:
+            self.stats["shared"] += 1
+        # shield: si un cliente se desconecta, el cálculo sigue para los demás
+        return await asyncio.shield(task)
+
+    async def _fill(self, key: str, compute):
+        generation = self.generation
+        try:
+            value = await compute()
+        finally:
+            self.inflight.pop(key, None)
+        if self.ttl > 0 and generation == self.generation:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+        return value
+
+    def invalidate(self):
+        self.entries.clear()
+        self.generation += 1
+        self.stats["invalidations"] += 1
+
+    def status(self) -> dict:
+        return {**self.stats, "ttl": self.ttl, "entries": len(self.entries), "inflight": len(self.inflight)}
+
+
+# Global cache for /api/stats/summary
+summary_cache = TTLCache(settings.SUMMARY_CACHE_TTL)
@@ -0,0 +1,163 @@
+"""
+Cold tier: closed days of readings as compressed columnar files.
+
+    <table>/<YYYYMMDD>.npz   one member per column (np.savez_compressed)
+    watermark.json           {table: first day not yet exported}
+
+Members of an .npz are only decompressed when accessed, so a report over
+months reads just the columns it asks for, and the day in each file name
+prunes partitions outside the requested range.
+
+Alerts are not exported: they are mutable (resolved, resolved_at change after
+the fact) and stay in SQLite, in alerts and alerts_archive.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import select, func, Boolean, Integer, Float, DateTime
+
+from app.config import settings
+from app.database import read_session_maker, MotorReading
+from app.partitions import readings_table
+
+DAY = timedelta(days=1)
+
+# Tablas exportadas al nivel frío (las alertas son mutables: se quedan en SQLite)
+COLD_TABLES = (MotorReading.__table__,)
+COLD_TABLE_NAMES = {table.name for table in COLD_TABLES}
+
+
+def _day(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def to_array(column, values) -> np.ndarray:
+    """Column values as a typed array (NULL -> NaN / NaT / False / "")"""
+    if isinstance(column.type, Boolean):
+        return np.array([bool(v) for v in values], dtype=bool)
+    if isinstance(column.type, Integer):
+        return np.array([0 if v is None else v for v in values], dtype=np.int64)
+    if isinstance(column.type, Float):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+    if isinstance(column.type, DateTime):
+        return np.array([np.datetime64("NaT") if v is None else v for v in values], dtype="datetime64[us]")
+    return np.array(["" if v is None else v for v in values], dtype=str)
+
+
+class ColdArchive:
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def _watermarks(self) -> dict:
+        path = self.root / "watermark.json"
+        return json.loads(path.read_text()) if path.exists() else {}
+
+    def watermark(self, table_name: str):
+        """First day not yet exported (every earlier day lives in the cold tier), or None"""
+        if table_name not in COLD_TABLE_NAMES:
+            # p.ej. alerts de versiones anteriores: las copias frías están desactualizadas
+            return None
+        day = self._watermarks().get(table_name)
+        return datetime.strptime(day, "%Y-%m-%d") if day else None
+
+    def set_watermark(self, table_name: str, day: datetime):
+        marks = self._watermarks()
+        marks[table_name] = day.strftime("%Y-%m-%d")
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / "watermark.json.tmp"
+        tmp.write_text(json.dumps(marks))
+        os.replace(tmp, self.root / "watermark.json")
+
+    def write_day(self, table_name: str, day: datetime, arrays: dict):
+        """Write one day partition atomically"""
+        table_dir = self.root / table_name
+        table_dir.mkdir(parents=True, exist_ok=True)
+        path = table_dir / f"{day.strftime('%Y%m%d')}.npz"
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp, path)
+
+    def partitions(self, table_name: str, start: datetime, end: datetime) -> list:
+        """Day files overlapping [start, end], oldest first"""
+        table_dir = self.root / table_name
+        if not table_dir.exists():
+            return []
+        first, last = start.strftime("%Y%m%d"), end.strftime("%Y%m%d")
+        return sorted(p for p in table_dir.glob("*.npz") if first <= p.stem <= last)
+
+    def read(self, table_name: str, columns: list, start: datetime, end: datetime) -> list:
+        """
+        Requested columns for rows with start <= timestamp <= end
+        Returns: list of {column: array} chunks, one per partition with matches
+        """
+        lo, hi = np.datetime64(start, "us"), np.datetime64(end, "us")
+        chunks = []
+        for path in self.partitions(table_name, start, end):
+            with np.load(path) as partition:
+                ts = partition["timestamp"]
+                # Filas ordenadas por timestamp: solo los días del borde necesitan recorte
+                i, j = np.searchsorted(ts, lo, side="left"), np.searchsorted(ts, hi, side="right")
+                if i >= j:
+                    continue
+                chunks.append({c: partition[c][i:j] for c in columns})
+        return chunks
+
+
+def _source(table, start: datetime = None, end: datetime = None):
+    # Lecturas: solo las particiones diarias del rango (si están activadas)
+    return readings_table(start, end) if table is MotorReading.__table__ else table
+
+
+async def _next_day_with_rows(session, table, day: datetime):
+    source = _source(table, day)
+    first = (await session.execute(
+        select(func.min(source.c.timestamp)).where(source.c.timestamp >= day)
+    )).scalar()
+    return _day(first) if first else None
+
+
+async def export_closed_days(now: datetime = None) -> dict:
+    """
+    Export every closed day not yet in the cold tier, one partition per table and day
+    Returns: {table: days exported}
+    """
+    today = _day(now or datetime.utcnow())
+    loop = asyncio.get_running_loop()
+    report = {}
+
+    for table in COLD_TABLES:
+        exported = 0
+        async with read_session_maker() as session:
+            day = cold_archive.watermark(table.name) or datetime.min
+            day = await _next_day_with_rows(session, table, day) or today
+
+            while day < today:
+                source = _source(table, day, day)
+                ts_column = source.c.timestamp
+                query = select(*[source.c[c.name] for c in table.c]).where(
+                    ts_column >= day, ts_column < day + DAY
+                ).order_by(ts_column)
+                rows = (await session.execute(query)).all()
+                columns = list(zip(*rows))
+                arrays = {c.name: to_array(c, values) for c, values in zip(table.c, columns)}
+                # La compresión es CPU: fuera del event loop
+                await loop.run_in_executor(None, cold_archive.write_day, table.name, day, arrays)
+                exported += 1
+
+                cold_archive.set_watermark(table.name, day + DAY)
+                day = await _next_day_with_rows(session, table, day + DAY) or today
+
+        # Days without rows are closed too: everything before today is covered
+        cold_archive.set_watermark(table.name, today)
+        report[table.name] = exported
+
+    return report
+
+
+# Global cold archive instance
+cold_archive = ColdArchive(settings.COLD_ARCHIVE_DIR)
@@ -0,0 +1,56 @@
+"""
+Columnar JSON for field-projected reading queries.
+
+`/api/readings?fields=temperature` answers {"timestamps": [...], "ids": [...],
+"temperature": [...]} built from a Core select of just those columns: no ORM
+objects, no per-row pydantic validation and no repeated keys on the wire.
+The body is serialized with orjson when it is installed (optional), else
+with the standard json module.
+"""
+import json
+from datetime import datetime
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # Opcional: sin orjson se usa json estándar
+    orjson = None
+
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_default, separators=(",", ":")).encode()
+
+
+def loads(data: bytes):
+    """Parse a JSON body (orjson when installed); raises ValueError if invalid"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def to_columns(rows: list, fields: list) -> dict:
+    """Rows (Core rows or hot-store dicts) -> {"timestamps", "ids", field: [...]}"""
+    if rows and isinstance(rows[0], dict):
+        get = dict.get
+    else:
+        get = getattr
+    result = {
+        "timestamps": [get(row, "timestamp") for row in rows],
+        "ids": [get(row, "id") for row in rows],
+    }
+    for field in fields:
+        result[field] = [get(row, field) for row in rows]
+    return result
+
+
+def columnar_response(rows: list, fields: list, headers=None) -> Response:
+    return Response(content=dumps(to_columns(rows, fields)), media_type="application/json", headers=headers)
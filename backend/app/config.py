@@ -4,6 +4,21 @@ from functools import lru_cache
 class Settings(BaseSettings):
     # Database
     DATABASE_URL: str = "sqlite+aiosqlite:///./motor_monitoring.db"
+    SQL_ECHO: bool = False  # Log every SQL statement (very verbose)
+    SQLITE_MMAP_SIZE: int = 268435456  # 256 MB
+    SQLITE_CACHE_SIZE: int = -65536  # negativo = KB (64 MB)
+    SQLITE_BUSY_TIMEOUT: int = 5000  # ms
+    READ_POOL_SIZE: int = 5  # conexiones de solo lectura
+    WRITER_MAX_BATCH: int = 200  # jobs de escritura por commit
+    LOG_DATABASE_URL: str = ""  # system_logs en su propio archivo (vacío = misma base)
+    READINGS_PARTITIONED: bool = False  # una tabla de lecturas por día (motor_readings_pYYYYMMDD)
+    READING_BLOCKS_ENABLED: bool = False  # compactar lecturas antiguas en bloques comprimidos por minuto
+    READING_BLOCKS_AFTER_HOURS: int = 48
+    
+    # Hot store en memoria (~400 bytes por punto y motor; 0 puntos = desactivado)
+    HOT_STORE_MINUTES: int = 15
+    HOT_STORE_MAX_POINTS: int = 5000
+    SUMMARY_CACHE_TTL: float = 2.0  # segundos; la ingesta invalida antes (0 = solo single-flight)
     
     # MQTT (HiveMQ Cloud - cluster personal)
     MQTT_BROKER: str = "087ff76994dc4fd4b47546d2309632e3.s1.eu.hivemq.cloud"
@@ -24,6 +39,42 @@ class Settings(BaseSettings):
     # ML
     ML_MODEL_PATH: str = "./models/anomaly_detector.joblib"
     ML_RETRAIN_INTERVAL: int = 3600
+    ML_ROLLING_STATE_PATH: str = "./models/rolling_state.joblib"
+    ML_ROLLING_SNAPSHOT_EVERY: int = 300  # lecturas entre snapshots
+    ML_ATTRIBUTION_TOP_K: int = 3
+    ML_SPECTRAL_RETRAIN_ROWS: int = 100  # filas con espectro que disparan el reentrenamiento si el modelo no las vio
+    DIAGNOSIS_ANOMALY_WINDOW_MINUTES: int = 10
+    WARMUP_READINGS: int = 1000  # lecturas recientes cargadas al arrancar
+    WARMUP_RETRIES: int = 3  # reintentos si el warm-up falla (sin éxito el servicio no queda listo)
+    WARMUP_RETRY_DELAY: float = 5.0  # segundos entre reintentos
+    
+    # Retention (días, 0 = para siempre)
+    RETENTION_RAW_DAYS: int = 7
+    RETENTION_ROLLUP_1M_DAYS: int = 90
+    RETENTION_ROLLUP_1H_DAYS: int = 0
+    RETENTION_INTERVAL: int = 3600  # segundos
+    RETENTION_BATCH_SIZE: int = 2000
+    RETENTION_BATCH_PAUSE: float = 0.05  # segundos entre lotes
+    RETENTION_VACUUM_PAGES: int = 1000
+    ALERTS_ARCHIVE_DAYS: int = 30  # alertas resueltas hace más días pasan a alerts_archive (0 = nunca)
+    
+    # Cold tier (días cerrados en archivos columnares comprimidos)
+    COLD_ARCHIVE_ENABLED: bool = True
+    COLD_ARCHIVE_DIR: str = "./data/cold"
+    ANALYTICS_BACKEND: str = "numpy"  # numpy | sql (SQLite + DuckDB opcional para el nivel frío)
+    EXPORT_WINDOW_MINUTES: int = 60  # lecturas calientes por chunk de /api/readings/export
+    DOWNSAMPLE_MAX_SOURCE_ROWS: int = 50000  # filas leídas como máximo; rangos mayores usan rollups
+    INGEST_BATCH_MAX_READINGS: int = 20000  # lecturas por POST /api/readings/batch
+    INGEST_MAX_FUTURE_SECONDS: int = 300  # tolerancia de reloj de los dispositivos
+    WS_CLIENT_QUEUE: int = 256  # mensajes pendientes por cliente WebSocket (por clave, los lentos reciben el último)
+    WS_SEND_TIMEOUT: float = 5.0  # segundos; un cliente que no recibe en ese tiempo se desconecta
+    DEFAULT_MOTOR_ID: str = "motor_1"
+    
+    # Vibration spectral analysis
+    SPECTRAL_WORKERS: int = 2
+    SPECTRAL_MAX_BATCH: int = 32
+    SPECTRAL_BATCH_WINDOW: float = 0.05  # segundos
+    VIBRATION_ARCHIVE_DIR: str = "./data/vibration"
     
     # Thresholds
     TEMP_WARNING: float = 60.0
@@ -1,8 +1,10 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text
+from sqlalchemy import Column, Integer, Float, String, DateTime, Boolean, Text, LargeBinary, Table, Index, event, select, union_all, text
 from datetime import datetime
 from app.config import settings
+from app.migrations import run_migrations
+from app.spectral import spectral_feature_names
 
 Base = declarative_base()
 
@@ -44,6 +46,58 @@ class MotorReading(Base):
     # ML predictions
     anomaly_score = Column(Float, default=0.0)
     is_anomaly = Column(Boolean, default=False)
+    anomaly_attribution = Column(Text, nullable=True)  # JSON {feature: z-score}, solo anomalías
+    
+    __table_args__ = (
+        Index("ix_motor_readings_anomaly_timestamp", "is_anomaly", "timestamp"),
+    )
+
+# Sensor columns of MotorReading, in table order
+READING_FIELDS = [
+    "voltage_a", "current_a", "power_a", "energy_a", "frequency_a", "pf_a",
+    "voltage_b", "current_b", "power_b", "energy_b", "frequency_b", "pf_b",
+    "voltage_c", "current_c", "power_c", "energy_c", "frequency_c", "pf_c",
+    "temperature", "vibration", "rpm",
+]
+
+def _rollup_table(name: str) -> Table:
+    """Per-bucket aggregates of every reading field (count, sum, min, max, sum of squares)"""
+    columns = [
+        Column("bucket", DateTime, primary_key=True),
+        Column("count", Integer, nullable=False, default=0),
+        Column("anomaly_count", Integer, nullable=False, default=0),
+    ]
+    for field in READING_FIELDS:
+        columns += [
+            Column(f"{field}_sum", Float),
+            Column(f"{field}_min", Float),
+            Column(f"{field}_max", Float),
+            Column(f"{field}_sumsq", Float),
+        ]
+    return Table(name, Base.metadata, *columns)
+
+# Rollups maintained incrementally on ingestion (see app/rollups.py)
+reading_rollups_1m = _rollup_table("reading_rollups_1m")
+reading_rollups_1h = _rollup_table("reading_rollups_1h")
+
+# Compressed per-minute blocks of older raw readings (see app/reading_blocks.py)
+reading_blocks = Table(
+    "reading_blocks", Base.metadata,
+    Column("minute", DateTime, primary_key=True),
+    Column("count", Integer, nullable=False),
+    Column("data", LargeBinary, nullable=False),
+    Column("attributions", Text, nullable=True),  # JSON {id: anomaly_attribution} de las lecturas que la tienen
+)
+
+# Spectral features of every vibration waveform, so warm-up and training see real values (see app/spectral.py)
+spectral_features = Table(
+    "spectral_features", Base.metadata,
+    Column("id", Integer, primary_key=True),
+    Column("timestamp", DateTime, nullable=False, index=True),  # retención
+    Column("motor_id", String, nullable=False),
+    *[Column(name, Float) for name in spectral_feature_names()],
+    Index("ix_spectral_features_motor_timestamp", "motor_id", "timestamp"),
+)
 
 class Alert(Base):
     __tablename__ = "alerts"
@@ -58,6 +112,42 @@ class Alert(Base):
     threshold = Column(Float)
     resolved = Column(Boolean, default=False)
     resolved_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_alerts_severity_timestamp", "severity", "timestamp"),
+        # Partial index: only active alerts, matches `Alert.resolved == False` (resolved = 0)
+        # Replaces ix_alerts_resolved_timestamp; resolved-alert queries use the timestamp index
+        Index("ix_alerts_active_timestamp", "timestamp", sqlite_where=text("resolved = 0")),
+    )
+
+class AlertArchive(Base):
+    """Resolved alerts moved out of `alerts` after ALERTS_ARCHIVE_DAYS (see app/retention.py)"""
+    __tablename__ = "alerts_archive"
+    
+    id = Column(Integer, primary_key=True)  # same id it had in alerts
+    timestamp = Column(DateTime, index=True)
+    severity = Column(String(20))
+    category = Column(String(50))
+    phase = Column(String(10), nullable=True)
+    message = Column(Text)
+    value = Column(Float)
+    threshold = Column(Float)
+    resolved = Column(Boolean, default=True)
+    resolved_at = Column(DateTime, nullable=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+def alerts_history():
+    """Core selectable with every alert, active and archived (the alerts columns)"""
+    columns = [c.name for c in Alert.__table__.columns]
+    return union_all(
+        select(*[Alert.__table__.c[c] for c in columns]),
+        select(*[AlertArchive.__table__.c[c] for c in columns]),
+    ).subquery("alerts_history")
+
+def alerts_history_sql() -> str:
+    """FROM clause text for raw SQL over active and archived alerts"""
+    columns = ", ".join(c.name for c in Alert.__table__.columns)
+    return f"(SELECT {columns} FROM alerts UNION ALL SELECT {columns} FROM alerts_archive)"
 
 class SystemLog(Base):
     __tablename__ = "system_logs"
@@ -68,6 +158,10 @@ class SystemLog(Base):
     source = Column(String(50))  # mqtt, api, ml, database
     message = Column(Text)
     details = Column(Text, nullable=True)
+    
+    __table_args__ = (
+        Index("ix_system_logs_level_source_timestamp", "level", "source", "timestamp"),
+    )
 
 class ThresholdSettings(Base):
     __tablename__ = "threshold_settings"
@@ -112,20 +206,101 @@ class ThresholdSettings(Base):
 # Database engine and session
 engine = create_async_engine(
     settings.DATABASE_URL,
-    echo=settings.DEBUG,
+    echo=settings.SQL_ECHO,
     future=True
 )
 
+def sqlite_pragmas() -> list:
+    """Per-connection storage profile: WAL, relaxed fsync, mmap and a larger page cache"""
+    return [
+        # Must precede WAL: only takes effect on a new, empty file
+        # (existing files: run_retention.py --enable-incremental-vacuum)
+        "PRAGMA auto_vacuum=INCREMENTAL",
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA mmap_size={settings.SQLITE_MMAP_SIZE}",
+        f"PRAGMA cache_size={settings.SQLITE_CACHE_SIZE}",
+        f"PRAGMA busy_timeout={settings.SQLITE_BUSY_TIMEOUT}",
+        "PRAGMA temp_store=MEMORY",
+    ]
+
+# System logs: own database file (and write lock) when LOG_DATABASE_URL is set
+log_engine = create_async_engine(
+    settings.LOG_DATABASE_URL,
+    echo=settings.SQL_ECHO,
+    future=True
+) if settings.LOG_DATABASE_URL else engine
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in sqlite_pragmas():
+        cursor.execute(pragma)
+    cursor.close()
+
+for _engine in {engine, log_engine}:
+    if _engine.dialect.name == "sqlite":
+        event.listen(_engine.sync_engine, "connect", _set_sqlite_pragmas)
+
 async_session_maker = async_sessionmaker(
     engine,
     class_=AsyncSession,
-    expire_on_commit=False
+    expire_on_commit=False,
+    # SystemLog rows go to the log database; everything else to the main one
+    binds={SystemLog: log_engine}
+)
+
+# Log writer session (app.db_writer.log_writer): only system_logs, on the log database
+log_session_maker = async_sessionmaker(log_engine, class_=AsyncSession, expire_on_commit=False)
+
+# Read side: a separate pool of query_only connections (WAL readers never block the writer)
+def _read_engine(url: str):
+    read = create_async_engine(url, echo=settings.SQL_ECHO, future=True, pool_size=settings.READ_POOL_SIZE)
+    if read.dialect.name == "sqlite":
+        event.listen(read.sync_engine, "connect", _set_sqlite_pragmas)
+        event.listen(read.sync_engine, "connect", _set_query_only)
+    return read
+
+def _set_query_only(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA query_only=ON")
+    cursor.close()
+
+read_engine = _read_engine(settings.DATABASE_URL)
+log_read_engine = _read_engine(settings.LOG_DATABASE_URL) if settings.LOG_DATABASE_URL else read_engine
+
+read_session_maker = async_sessionmaker(
+    read_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+    binds={SystemLog: log_read_engine}
 )
 
+def _add_missing_columns(conn):
+    """Add columns declared in the models but missing from existing tables"""
+    for table in Base.metadata.sorted_tables:
+        existing = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table.name})")}
+        for column in table.columns:
+            if column.name not in existing:
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+                print(f"Added column {table.name}.{column.name}")
+
 async def init_db():
     """Initialize database tables"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
+    
+    # Versioned schema migrations (indexes on existing databases, etc.)
+    await run_migrations(engine)
+    
+    if log_engine is not engine:
+        async with log_engine.begin() as conn:
+            await conn.run_sync(SystemLog.__table__.create, checkfirst=True)
+    
+    # Registrar particiones diarias existentes (import local: partitions depende de este módulo)
+    from app.partitions import reading_partitions
+    await reading_partitions.load()
 
 async def get_db():
     """Dependency for getting async database sessions"""
@@ -134,3 +309,11 @@ async def get_db():
             yield session
         finally:
             await session.close()
+
+async def get_read_db():
+    """Dependency for read-only sessions (writes go through app.db_writer)"""
+    async with read_session_maker() as session:
+        try:
+            yield session
+        finally:
+            await session.close()
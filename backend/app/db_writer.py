@@ -0,0 +1,145 @@
+"""
+Single writer for the database.
+
+Every subsystem (ingestion, thresholds, alert resolution, AI actions,
+retention, logs) submits write jobs, `async def job(session) -> result`, to
+one task that owns the write side. Pending jobs are taken in priority order
+and run in one session with a single commit (group commit), so SQLite sees
+one writer and no "database is locked" retries. User-facing writes use
+PRIORITY_USER and jump ahead of queued ingestion and maintenance.
+
+Jobs must not commit themselves. If one job fails, the batch is rolled back
+and every job is retried in its own transaction so only the failing one
+gets the error.
+
+System logs (write_log) have their own writer when LOG_DATABASE_URL puts
+them in a separate file, so they never queue behind telemetry batches;
+with a single database they share db_writer (one writer per file).
+"""
+import asyncio
+import itertools
+import json
+import time
+
+from app.config import settings
+from app.database import async_session_maker, log_session_maker, engine, log_engine, SystemLog
+
+PRIORITY_USER = 0
+PRIORITY_INGEST = 1
+PRIORITY_BACKGROUND = 2
+_STOP = 99
+
+
+class _Job:
+    def __init__(self, fn, future):
+        self.fn = fn
+        self.future = future
+
+
+class DatabaseWriter:
+    def __init__(self, max_batch: int, session_maker=async_session_maker):
+        self.max_batch = max_batch
+        self.session_maker = session_maker
+        self.queue = None
+        self.task = None
+        self._seq = itertools.count()
+        self.stats = {"jobs": 0, "batches": 0, "max_batch": 0, "failed_jobs": 0, "retried_batches": 0, "commit_seconds": 0.0}
+
+    def start(self):
+        # A finished task belongs to a loop that already closed (e.g. a previous asyncio.run)
+        if self.task is None or self.task.done():
+            self.queue = asyncio.PriorityQueue()
+            self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Finish every queued job, then stop the writer task"""
+        if self.task is None or self.task.done():
+            return
+        await self.queue.put((_STOP, next(self._seq), None))
+        await self.task
+        self.task = None
+
+    async def submit(self, fn, priority: int = PRIORITY_INGEST):
+        """Queue a write job and wait for its result (raises the job's exception)"""
+        # Arranque perezoso: scripts y tareas sin lifespan también escriben por aquí
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((priority, next(self._seq), _Job(fn, future)))
+        return await future
+
+    async def _run(self):
+        stopping = False
+        while True:
+            _, _, job = await self.queue.get()
+            stopping = stopping or job is None
+            batch = [] if job is None else [job]
+            # Agrupar lo que ya está en cola (en orden de prioridad) en un solo commit
+            while len(batch) < self.max_batch and not self.queue.empty():
+                _, _, job = self.queue.get_nowait()
+                if job is None:
+                    stopping = True
+                    continue
+                batch.append(job)
+            if batch:
+                await self._commit(batch)
+            if stopping and self.queue.empty():
+                return
+
+    async def _commit(self, batch: list):
+        started = time.perf_counter()
+        try:
+            results = await self._execute(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                self.stats["failed_jobs"] += 1
+                if not batch[0].future.done():
+                    batch[0].future.set_exception(e)
+                return
+            # Un job falló: repetir cada uno en su propia transacción para aislar el error
+            self.stats["retried_batches"] += 1
+            for job in batch:
+                await self._commit([job])
+            return
+
+        self.stats["jobs"] += len(batch)
+        self.stats["batches"] += 1
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        self.stats["commit_seconds"] += time.perf_counter() - started
+        for job, result in zip(batch, results):
+            if not job.future.done():
+                job.future.set_result(result)
+
+    async def _execute(self, batch: list) -> list:
+        async with self.session_maker() as session:
+            results = []
+            for job in batch:
+                results.append(await job.fn(session))
+            await session.commit()
+            return results
+
+    def status(self) -> dict:
+        batches = self.stats["batches"]
+        return {
+            **self.stats,
+            "commit_seconds": round(self.stats["commit_seconds"], 3),
+            "avg_batch": round(self.stats["jobs"] / batches, 2) if batches else 0,
+            "queued": self.queue.qsize() if self.queue else 0,
+        }
+
+
+# Global writer (the task starts with the app or on the first submit)
+db_writer = DatabaseWriter(settings.WRITER_MAX_BATCH)
+
+# Writer de logs: propio si system_logs vive en otro archivo, si no el mismo db_writer
+log_writer = DatabaseWriter(settings.WRITER_MAX_BATCH, log_session_maker) if log_engine is not engine else db_writer
+
+
+async def write_log(level: str, source: str, message: str, details=None):
+    """Add a SystemLog row through the log writer (background priority)"""
+    if details is not None and not isinstance(details, str):
+        details = json.dumps(details)
+
+    async def job(session):
+        session.add(SystemLog(level=level, source=source, message=message, details=details))
+
+    await log_writer.submit(job, PRIORITY_BACKGROUND)
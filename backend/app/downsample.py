@@ -0,0 +1,149 @@
+"""
+Downsampled chart series: at most N points per field for any time range.
+
+Short ranges read raw readings as columns (app.history, every tier); longer
+ones read the 1-minute or 1-hour rollups, so the rows fetched never exceed
+DOWNSAMPLE_MAX_SOURCE_ROWS whatever the range. Two reductions, both NumPy:
+
+- "lttb": Largest-Triangle-Three-Buckets keeps the points that preserve the
+  visual shape of the line (peaks and dips survive).
+- "minmax": N time buckets with avg/min/max each, for band charts; min and
+  max stay exact because rollup minima and maxima are merged, not averaged.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, and_
+
+from app.config import settings
+from app.database import MotorReading
+from app.history import load_columns
+from app.rollups import ROLLUP_TABLES
+
+def lttb(x: np.ndarray, y: np.ndarray, n: int) -> np.ndarray:
+    """Indices of the n points of (x, y) that LTTB keeps (first and last always included)"""
+    m = len(x)
+    if n >= m or n < 3:
+        return np.arange(m)
+    # n - 2 buckets between the first and the last point
+    edges = np.linspace(1, m - 1, n - 1).astype(np.int64)
+    selected = np.empty(n, dtype=np.int64)
+    selected[0], selected[-1] = 0, m - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i < n - 3:
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        # Área del triángulo (punto elegido anterior, candidato, promedio del siguiente bucket)
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+
+def bucket_minmax(x: np.ndarray, count, total, low, high, n: int) -> dict:
+    """
+    Merge rows into n equal time buckets
+    count/total/low/high: per-row aggregates (raw rows: 1, value, value, value)
+    Returns: {"x": bucket start, "avg", "min", "max"} for the non-empty buckets
+    """
+    if not len(x):
+        return {"x": x, "avg": x.astype(np.float64), "min": x.astype(np.float64), "max": x.astype(np.float64)}
+    x0, span = x[0], x[-1] - x[0] + 1
+    index = ((x - x0) * n // span).astype(np.int64)
+    counts = np.bincount(index, weights=count, minlength=n)
+    sums = np.bincount(index, weights=total, minlength=n)
+    minima = np.full(n, np.inf)
+    maxima = np.full(n, -np.inf)
+    # Filas sin valor (NaN) no deben contaminar el mínimo / máximo del bucket
+    np.minimum.at(minima, index, np.where(count > 0, low, np.inf))
+    np.maximum.at(maxima, index, np.where(count > 0, high, -np.inf))
+    used = counts > 0
+    return {
+        "x": x0 + (np.flatnonzero(used) * span) // n,
+        "avg": sums[used] / counts[used],
+        "min": minima[used],
+        "max": maxima[used],
+    }
+
+
+def _source(start: datetime, end: datetime) -> str:
+    """Finest resolution whose row count for the range stays under DOWNSAMPLE_MAX_SOURCE_ROWS"""
+    limit = settings.DOWNSAMPLE_MAX_SOURCE_ROWS
+    span = end - start
+    # Lecturas a ~1 Hz
+    if span.total_seconds() <= limit:
+        return "raw"
+    minute_days = settings.RETENTION_ROLLUP_1M_DAYS
+    minute_kept = not minute_days or start >= datetime.utcnow() - timedelta(days=minute_days)
+    if span / ROLLUP_TABLES["1m"][1] <= limit and minute_kept:
+        return "1m"
+    return "1h"
+
+
+async def _load(session, fields: list, start: datetime, end: datetime, source: str) -> dict:
+    """{"x": µs since epoch, field: (count, sum, min, max)} for every source row"""
+    if source == "raw":
+        arrays = await load_columns(session, MotorReading, ["timestamp"] + fields, start, end)
+        result = {"x": arrays["timestamp"].astype("datetime64[us]").astype(np.int64)}
+        for field in fields:
+            values = arrays[field]
+            valid = ~np.isnan(values)
+            result[field] = (valid.astype(np.float64), np.where(valid, values, 0.0), values, values)
+        return result
+
+    table, step = ROLLUP_TABLES[source]
+    columns = [table.c.bucket, table.c.count]
+    for field in fields:
+        columns += [table.c[f"{field}_sum"], table.c[f"{field}_min"], table.c[f"{field}_max"]]
+    rows = (await session.execute(
+        select(*columns).where(and_(table.c.bucket >= start - step, table.c.bucket <= end)).order_by(table.c.bucket)
+    )).all()
+    values = list(zip(*rows)) or [[] for _ in columns]
+    result = {"x": np.array(values[0], dtype="datetime64[us]").astype(np.int64)}
+    counts = np.array(values[1], dtype=np.float64)
+    for i, field in enumerate(fields):
+        total, low, high = (np.array(v, dtype=np.float64) for v in values[2 + 3 * i: 5 + 3 * i])
+        # Buckets sin el campo: suma NULL (NaN) y no cuentan
+        valid = ~np.isnan(total)
+        result[field] = (np.where(valid, counts, 0.0), np.where(valid, total, 0.0), low, high)
+    return result
+
+
+def _timestamps(x: np.ndarray) -> list:
+    return np.datetime_as_string(x.astype("datetime64[us]"), unit="us").tolist()
+
+
+def _values(values: np.ndarray) -> list:
+    return [None if np.isnan(v) else v for v in values.tolist()]
+
+
+async def downsample(session, fields: list, start: datetime, end: datetime, points: int, method: str) -> dict:
+    """At most `points` points per field in [start, end]"""
+    source = _source(start, end)
+    data = await _load(session, fields, start, end, source)
+    x = data["x"]
+    series = {}
+    for field in fields:
+        count, total, low, high = data[field]
+        if method == "lttb":
+            valid = count > 0
+            fx, fy = x[valid], total[valid] / count[valid]
+            keep = lttb(fx.astype(np.float64), fy, points)
+            series[field] = {"timestamp": _timestamps(fx[keep]), "value": _values(fy[keep])}
+        else:
+            buckets = bucket_minmax(x, count, total, low, high, points)
+            series[field] = {
+                "timestamp": _timestamps(buckets["x"]),
+                "avg": _values(buckets["avg"]),
+                "min": _values(buckets["min"]),
+                "max": _values(buckets["max"]),
+            }
+    return {
+        "method": method,
+        "source": source,
+        "source_rows": len(x),
+        "series": series,
+    }
@@ -0,0 +1,158 @@
+"""
+Streaming export of readings (CSV, NDJSON or Arrow IPC, optionally gzip).
+
+The range is walked in windows through app.history.load_columns, so the
+export covers the cold archive, compressed blocks and raw rows alike, and
+only one window of column arrays is in memory at a time: one day inside the
+cold tier, EXPORT_WINDOW_MINUTES in the hot database. Each window is encoded
+(and compressed) in a worker thread and sent as its own chunk; memory does
+not grow with the size of the range.
+"""
+import asyncio
+import csv
+import io
+import json
+import math
+import time
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.config import settings
+from app.database import MotorReading, read_session_maker
+from app.cold_archive import cold_archive
+from app.history import load_columns
+from app.reading_blocks import BLOCK_COLUMNS
+from app.db_writer import write_log
+
+try:
+    import pyarrow as pa
+except ImportError:  # Opcional: sin pyarrow solo CSV y NDJSON
+    pa = None
+
+# Columnas exportables: las que existen en todos los niveles (crudo, bloques, frío)
+EXPORT_COLUMNS = list(BLOCK_COLUMNS)
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+}
+if pa is not None:
+    FORMATS["arrow"] = ("application/vnd.apache.arrow.stream", "arrow")
+_STEP = timedelta(microseconds=1)
+
+
+def _windows(start: datetime, end: datetime):
+    """[start, end] as consecutive inclusive windows: whole days before the cold watermark"""
+    boundary = cold_archive.watermark(MotorReading.__tablename__)
+    hot_step = timedelta(minutes=settings.EXPORT_WINDOW_MINUTES)
+    current = start
+    while current <= end:
+        if boundary is not None and current < boundary:
+            stop = min(datetime.combine(current.date(), datetime.min.time()) + timedelta(days=1), boundary)
+        else:
+            stop = current + hot_step
+        yield current, min(stop - _STEP, end)
+        current = stop
+
+
+class _Encoder:
+    """Column arrays -> bytes of one format; header once, optional gzip framing"""
+
+    def __init__(self, fmt: str, columns: list, compress: bool):
+        self.fmt = fmt
+        self.columns = columns
+        self.started = False
+        self.sink = self.buffer = None
+        self.compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    def _csv(self, arrays: dict) -> bytes:
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator="\n")
+        if not self.started:
+            writer.writerow(self.columns)
+        writer.writerows(zip(*[_plain(arrays[c], c, "csv") for c in self.columns]))
+        return out.getvalue().encode()
+
+    def _ndjson(self, arrays: dict) -> bytes:
+        values = [_plain(arrays[c], c, "ndjson") for c in self.columns]
+        lines = [json.dumps(dict(zip(self.columns, row))) for row in zip(*values)]
+        return ("\n".join(lines) + "\n").encode() if lines else b""
+
+    def _arrow(self, arrays: dict) -> bytes:
+        batch = pa.record_batch([pa.array(arrays[c], from_pandas=True) for c in self.columns], names=self.columns)
+        if self.sink is None:
+            # El stream IPC lleva el esquema al principio y un marcador de fin al cerrar
+            self.buffer = io.BytesIO()
+            self.sink = pa.ipc.new_stream(self.buffer, batch.schema)
+        if batch.num_rows:
+            self.sink.write_batch(batch)
+        return self._drain()
+
+    def _drain(self) -> bytes:
+        data = self.buffer.getvalue()
+        self.buffer.seek(0)
+        self.buffer.truncate()
+        return data
+
+    def encode(self, arrays: dict) -> bytes:
+        if self.started and not len(arrays[self.columns[0]]):
+            return b""
+        data = getattr(self, f"_{self.fmt}")(arrays)
+        self.started = True
+        return self.compressor.compress(data) if self.compressor else data
+
+    def finish(self) -> bytes:
+        data = b""
+        if self.sink is not None:
+            self.sink.close()
+            data = self._drain()
+        if self.compressor:
+            return self.compressor.compress(data) + self.compressor.flush()
+        return data
+
+
+def _plain(values: np.ndarray, column: str, fmt: str) -> list:
+    """Array -> Python values for text formats (ISO timestamps, NaN -> empty / null)"""
+    if column == "timestamp":
+        return np.datetime_as_string(values, unit="us").tolist()
+    values = values.tolist()
+    if values and isinstance(values[0], float):
+        empty = "" if fmt == "csv" else None
+        return [empty if math.isnan(v) else v for v in values]
+    return values
+
+
+async def stream_readings(start: datetime, end: datetime, columns: list, fmt: str, compress: bool):
+    """Async generator of export chunks; logs rows, bytes and throughput when it finishes"""
+    encoder = _Encoder(fmt, columns, compress)
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    rows = sent = 0
+
+    async with read_session_maker() as session:
+        for window_start, window_end in _windows(start, end):
+            arrays = await load_columns(session, MotorReading, columns, window_start, window_end)
+            # Formatear y comprimir es CPU: fuera del event loop
+            chunk = await loop.run_in_executor(None, encoder.encode, arrays)
+            rows += len(arrays[columns[0]])
+            if chunk:
+                sent += len(chunk)
+                yield chunk
+
+    chunk = encoder.finish()
+    sent += len(chunk)
+    if chunk:
+        yield chunk
+
+    elapsed = time.perf_counter() - started
+    stats = {
+        "format": fmt, "gzip": compress, "rows": rows, "bytes": sent,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(rows / elapsed) if elapsed else rows,
+        "mb_per_second": round(sent / elapsed / 1e6, 2) if elapsed else 0,
+    }
+    print(f"📤 Export {fmt}{'.gz' if compress else ''}: {rows} lecturas, {sent / 1e6:.2f} MB en {elapsed:.2f}s "
+          f"({stats['rows_per_second']} lecturas/s)")
+    await write_log("info", "export", f"Exported {rows} readings as {fmt}", stats)
+
@@ -0,0 +1,100 @@
+"""
+Unified history queries over the hot database and the cold archive.
+
+Reading days before the cold-tier watermark are read from the day
+partitions; the rest comes from SQLite (raw rows plus compacted reading
+blocks). Alerts always come from SQLite (alerts plus alerts_archive). Callers get
+one dict of column arrays either way, or (load_rows) a newest-first page of
+reading rows from raw rows and blocks, for listings and cursors.
+"""
+import asyncio
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import select, and_, or_, desc
+
+from app.config import settings
+from app.database import MotorReading, Alert, alerts_history
+from app.cold_archive import cold_archive, to_array
+from app.partitions import readings_table
+from app.reading_blocks import read_blocks, read_rows
+
+
+async def load_columns(session, model, columns: list, start: datetime, end: datetime) -> dict:
+    """
+    Columns of `model` for start <= timestamp <= end, ordered by timestamp
+    Returns: {column: np.ndarray}
+    """
+    table = model.__table__
+    boundary = cold_archive.watermark(table.name)
+    chunks = []
+
+    if boundary is not None and start < boundary:
+        loop = asyncio.get_running_loop()
+        chunks += await loop.run_in_executor(None, cold_archive.read, table.name, columns, start, end)
+
+    hot_start = max(start, boundary) if boundary is not None else start
+    if hot_start <= end and table is MotorReading.__table__ and settings.READING_BLOCKS_ENABLED:
+        blocks = await read_blocks(session, columns, hot_start, end)
+        if blocks is not None:
+            chunks.append(blocks)
+
+    if hot_start <= end:
+        # Lecturas: solo las particiones diarias del rango (si están activadas); alertas: también las archivadas
+        if table is MotorReading.__table__:
+            source = readings_table(hot_start, end)
+        else:
+            source = alerts_history() if table is Alert.__table__ else table
+        query = select(*[source.c[c] for c in columns]).where(
+            source.c.timestamp >= hot_start, source.c.timestamp <= end
+        ).order_by(source.c.timestamp)
+        rows = (await session.execute(query)).all()
+        values = list(zip(*rows)) or [[] for _ in columns]
+        chunks.append({c: to_array(table.c[c], v) for c, v in zip(columns, values)})
+
+    if not chunks:
+        # Rango solo en el nivel frío y sin días exportados
+        chunks.append({c: to_array(table.c[c], []) for c in columns})
+    result = {c: np.concatenate([chunk[c] for chunk in chunks]) for c in columns}
+    if "timestamp" in result and len(chunks) > 1:
+        # Lecturas tardías pueden quedar en la tabla cruda con timestamps ya compactados
+        ts = result["timestamp"]
+        if (ts[1:] < ts[:-1]).any():
+            order = np.argsort(ts, kind="stable")
+            result = {c: values[order] for c, values in result.items()}
+    return result
+
+
+async def load_rows(session, columns: list, start: datetime = None, end: datetime = None, before=None,
+                    limit: int = 100, anomalies_only: bool = False) -> list:
+    """
+    Newest-first reading dicts (raw rows and compacted blocks) with start <= timestamp <= end
+    columns: raw columns to select ("id" and "timestamp" are always included)
+    before: (timestamp, id) of a cursor, anomalies_only: anomalous readings with attribution
+    """
+    columns = ["id", "timestamp"] + [c for c in columns if c not in ("id", "timestamp")]
+    source = readings_table(start, end)
+    ts, row_id = source.c.timestamp, source.c.id
+    conditions = []
+    if start:
+        conditions.append(ts >= start)
+    if end:
+        conditions.append(ts <= end)
+    if before is not None:
+        # timestamp <= ts acota el rango del índice; el id desempata lecturas con el mismo instante
+        conditions.append(and_(ts <= before[0], or_(ts < before[0], row_id < before[1])))
+    if anomalies_only:
+        conditions += [source.c.is_anomaly == True, source.c.anomaly_attribution.isnot(None)]
+    query = select(*[source.c[c] for c in columns]).where(*conditions).order_by(desc(ts), desc(row_id)).limit(limit)
+    rows = [dict(zip(columns, row)) for row in (await session.execute(query)).all()]
+
+    if settings.READING_BLOCKS_ENABLED:
+        compacted = await read_rows(
+            session, start or datetime.min, end or datetime.max, before, limit, anomalies_only
+        )
+        if compacted:
+            rows = sorted(
+                rows + [{c: row[c] for c in columns} for row in compacted],
+                key=lambda r: (r["timestamp"], r["id"]), reverse=True
+            )[:limit]
+    return rows
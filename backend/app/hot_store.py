@@ -0,0 +1,204 @@
+"""
+In-memory hot tier: the last HOT_STORE_MINUTES of readings per motor.
+
+Each motor keeps contiguous NumPy columns (timestamps, sensor values, ids,
+anomaly flags) in a ring of at most HOT_STORE_MAX_POINTS rows, so latest
+values and short windows are answered with a searchsorted and a slice.
+Ingestion pushes every committed reading; warm-up fills the store from the
+database. Queries return None when the range is not fully covered and the
+caller falls back to SQL.
+"""
+from datetime import datetime
+
+import numpy as np
+
+from app.config import settings
+from app.database import READING_FIELDS
+
+VALUE_FIELDS = READING_FIELDS + ["anomaly_score"]
+
+
+def _us(ts: datetime) -> int:
+    return int(np.datetime64(ts, "us").astype(np.int64))
+
+
+def _dt(us: int) -> datetime:
+    return np.datetime64(int(us), "us").astype(datetime)
+
+
+def _values(reading: dict) -> list:
+    # NULL -> NaN (0.0 sería un valor medido)
+    return [np.nan if reading.get(f) is None else reading[f] for f in VALUE_FIELDS]
+
+
+class _Ring:
+    """Columns for one motor; rows live in [lo, hi) of buffers twice the capacity"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        size = 2 * capacity
+        self.ts = np.zeros(size, dtype=np.int64)
+        self.values = np.zeros((size, len(VALUE_FIELDS)), dtype=np.float64)
+        self.ids = np.zeros(size, dtype=np.int64)
+        self.anomaly = np.zeros(size, dtype=bool)
+        self.attribution = np.empty(size, dtype=object)
+        self.lo = self.hi = 0
+        # Every reading at or after this instant is in the ring (None = empty, waiting for push or fill)
+        self.covered_from = None
+
+    def _compact(self):
+        n = self.hi - self.lo
+        for column in (self.ts, self.values, self.ids, self.anomaly, self.attribution):
+            column[:n] = column[self.lo:self.hi]
+        self.lo, self.hi = 0, n
+
+    def push(self, ts_us: int, values, row_id: int, is_anomaly: bool, attribution):
+        if self.hi == len(self.ts):
+            self._compact()
+        i = self.hi
+        self.ts[i] = ts_us
+        self.values[i] = values
+        self.ids[i] = row_id
+        self.anomaly[i] = is_anomaly
+        self.attribution[i] = attribution
+        self.hi += 1
+        if self.hi - self.lo > self.capacity:
+            self.lo += 1
+            self._advance_coverage(self.ts[self.lo])
+
+    def evict_before(self, ts_us: int):
+        cut = self.lo + int(np.searchsorted(self.ts[self.lo:self.hi], ts_us, side="left"))
+        if cut > self.lo:
+            self.attribution[self.lo:cut] = None
+            self.lo = cut
+        self._advance_coverage(ts_us)
+
+    def _advance_coverage(self, ts_us: int):
+        if self.covered_from is not None and ts_us > self.covered_from:
+            self.covered_from = int(ts_us)
+
+    def slice(self, start_us: int = None, end_us: int = None):
+        ts = self.ts[self.lo:self.hi]
+        i = 0 if start_us is None else int(np.searchsorted(ts, start_us, side="left"))
+        j = len(ts) if end_us is None else int(np.searchsorted(ts, end_us, side="right"))
+        return self.lo + i, self.lo + j
+
+    def row(self, i: int) -> dict:
+        row = {"id": int(self.ids[i]), "timestamp": _dt(self.ts[i])}
+        row.update((f, None if np.isnan(v) else v) for f, v in zip(VALUE_FIELDS, self.values[i].tolist()))
+        row["is_anomaly"] = bool(self.anomaly[i])
+        row["anomaly_attribution"] = self.attribution[i]
+        return row
+
+    def nbytes(self) -> int:
+        return self.ts.nbytes + self.values.nbytes + self.ids.nbytes + self.anomaly.nbytes + self.attribution.nbytes
+
+
+class HotStore:
+    def __init__(self, horizon_minutes: int, max_points: int):
+        self.horizon_us = int(horizon_minutes * 60 * 1e6)
+        self.max_points = max_points
+        self.motors = {}
+
+    def _ring(self, motor_id: str) -> _Ring:
+        ring = self.motors.get(motor_id)
+        if ring is None:
+            ring = self.motors[motor_id] = _Ring(self.max_points)
+        return ring
+
+    def push(self, motor_id: str, reading: dict):
+        """Add one committed reading (dict with id, timestamp, fields, anomaly data)"""
+        if not self.max_points:
+            return
+        ring = self._ring(motor_id)
+        ts_us = _us(reading["timestamp"])
+        if ring.hi > ring.lo and ts_us < ring.ts[ring.hi - 1]:
+            # Fuera de orden: no se puede insertar sin romper el orden, la cobertura empieza después
+            ring._advance_coverage(ts_us + 1)
+            return
+        ring.push(
+            ts_us, _values(reading), reading["id"],
+            bool(reading.get("is_anomaly")), reading.get("anomaly_attribution")
+        )
+        if ring.covered_from is None:
+            # Motor nuevo: desde su primera lectura, todas pasan por push
+            ring.covered_from = ts_us
+        ring.evict_before(ts_us - self.horizon_us)
+
+    def fill(self, motor_id: str, readings: list, since: datetime):
+        """
+        Seed a motor from the database: readings must hold every row since `since`, oldest first
+        Rows pushed meanwhile by ingestion are kept
+        """
+        if not self.max_points:
+            return
+        ring = self._ring(motor_id)
+        pushed = [ring.row(i) for i in range(ring.lo, ring.hi)]
+        known = {r["id"] for r in readings}
+        fresh = _Ring(self.max_points)
+        fresh.covered_from = _us(since)
+        for reading in sorted(readings + [r for r in pushed if r["id"] not in known], key=lambda r: r["timestamp"]):
+            fresh.push(
+                _us(reading["timestamp"]), _values(reading), reading["id"],
+                bool(reading.get("is_anomaly")), reading.get("anomaly_attribution")
+            )
+        self.motors[motor_id] = fresh
+
+    def covered_from(self):
+        """Instant since which every motor's readings are all in memory, or None"""
+        if not self.motors or any(r.covered_from is None for r in self.motors.values()):
+            return None
+        return _dt(max(r.covered_from for r in self.motors.values()))
+
+    def latest(self):
+        """Most recent reading across motors, or None"""
+        best = None
+        for ring in self.motors.values():
+            if ring.covered_from is None or ring.hi == ring.lo:
+                continue
+            if best is None or ring.ts[ring.hi - 1] > best.ts[best.hi - 1]:
+                best = ring
+        return best.row(best.hi - 1) if best else None
+
+    def window(self, start: datetime = None, end: datetime = None, limit: int = None):
+        """
+        Readings in [start, end], newest first, at most `limit`
+        Returns None when memory cannot answer exactly (caller falls back to SQL)
+        """
+        covered = self.covered_from()
+        if covered is None or (start is not None and start < covered):
+            return None
+        start_us = _us(start) if start else None
+        end_us = _us(end) if end else None
+
+        if start_us is None and limit is not None:
+            # Solo filas dentro de la cobertura común a todos los motores
+            start_us = _us(covered)
+
+        parts = []
+        for ring in self.motors.values():
+            i, j = ring.slice(start_us, end_us)
+            if limit is not None:
+                i = max(i, j - limit)
+            parts += [(ring.ts[k], ring, k) for k in range(i, j)]
+        # Mismo orden que la paginación por cursor: (timestamp, id) descendente
+        parts.sort(key=lambda p: (p[0], p[1].ids[p[2]]), reverse=True)
+        if limit is not None:
+            if start is None and len(parts) < limit:
+                # Sin inicio: solo si la memoria tiene al menos `limit` lecturas cubiertas
+                return None
+            parts = parts[:limit]
+        return [ring.row(k) for _, ring, k in parts]
+
+    def status(self) -> dict:
+        covered = self.covered_from()
+        return {
+            "motors": len(self.motors),
+            "readings": sum(r.hi - r.lo for r in self.motors.values()),
+            "covered_from": covered.isoformat() if covered else None,
+            "memory_bytes": sum(r.nbytes() for r in self.motors.values()),
+        }
+
+
+# Global hot store (the ring buffers are allocated per motor on first use)
+hot_store = HotStore(settings.HOT_STORE_MINUTES, settings.HOT_STORE_MAX_POINTS)
@@ -0,0 +1,64 @@
+"""
+Versioned schema migrations.
+
+The applied version is tracked in SQLite's `PRAGMA user_version`. Each
+migration runs once, in order, inside its own transaction. New databases
+get the same objects from `create_all`, so every step must be idempotent.
+"""
+import time
+
+
+# Composite indexes for the hot query predicates
+COMPOSITE_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS ix_motor_readings_anomaly_timestamp ON motor_readings (is_anomaly, timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_alerts_resolved_timestamp ON alerts (resolved, timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_alerts_severity_timestamp ON alerts (severity, timestamp)",
+    "CREATE INDEX IF NOT EXISTS ix_system_logs_level_source_timestamp ON system_logs (level, source, timestamp)",
+]
+
+
+def _composite_indexes(conn):
+    for statement in COMPOSITE_INDEXES + ["ANALYZE"]:
+        conn.exec_driver_sql(statement)
+
+
+def _active_alerts_index(conn):
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_alerts_active_timestamp ON alerts (timestamp) WHERE resolved = 0"
+    )
+    # El índice parcial cubre las consultas de alertas activas con una fracción del tamaño
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_alerts_resolved_timestamp")
+    conn.exec_driver_sql("ANALYZE alerts")
+
+
+# (version, description, function(sync_connection))
+MIGRATIONS = [
+    (1, "composite indexes for hot predicates", _composite_indexes),
+    (2, "partial index for active alerts", _active_alerts_index),
+]
+
+
+def _current_version(conn) -> int:
+    return conn.exec_driver_sql("PRAGMA user_version").scalar()
+
+
+def _apply(conn):
+    applied = []
+    current = _current_version(conn)
+    for version, description, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        started = time.perf_counter()
+        migrate(conn)
+        conn.exec_driver_sql(f"PRAGMA user_version={version}")
+        applied.append(version)
+        print(f"🗄️  Migration {version} applied ({description}) in {time.perf_counter() - started:.2f}s")
+    return applied
+
+
+async def run_migrations(engine) -> list:
+    """Apply pending migrations; returns the versions applied"""
+    if engine.dialect.name != "sqlite":
+        return []
+    async with engine.begin() as conn:
+        return await conn.run_sync(_apply)
@@ -3,8 +3,24 @@ import joblib
 from sklearn.ensemble import IsolationForest
 from sklearn.preprocessing import StandardScaler
 from pathlib import Path
+from datetime import datetime
+from typing import Optional
 from app.config import settings
+from app.rolling_features import RollingFeatureTracker, feature_names as rolling_feature_names
+from app.spectral import spectrum_store, spectral_feature_names
 import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+# Snapshot features (averages, motor metrics and phase imbalance)
+BASE_FEATURE_NAMES = [
+    "voltage_avg", "current_avg", "power_avg", "frequency_avg", "pf_avg",
+    "temperature", "vibration", "rpm",
+    "voltage_ab_diff", "voltage_bc_diff", "voltage_ca_diff",
+    "current_ab_diff", "current_bc_diff", "current_ca_diff",
+]
+FEATURE_NAMES = BASE_FEATURE_NAMES + rolling_feature_names() + spectral_feature_names()
+# Spectral columns (last in the vector)
+SPECTRAL_COLUMNS = slice(len(FEATURE_NAMES) - len(spectral_feature_names()), None)
 
 class AnomalyDetector:
     def __init__(self):
@@ -14,6 +30,13 @@ class AnomalyDetector:
         self.max_buffer_size = 1000
         self.is_trained = False
         self.model_path = Path(settings.ML_MODEL_PATH)
+        self.rolling = RollingFeatureTracker(settings.ML_ROLLING_STATE_PATH)
+        self.rolling.load(now=datetime.utcnow().timestamp())
+        self.readings_since_snapshot = 0
+        # Feature extraction and snapshots mutate the rolling state: one thread, off the event loop, in order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ml-features")
+        # Rows with spectral data buffered since the last fit (retrain once the model can use them)
+        self.spectral_rows = 0
         
         # Try to load existing model
         self.load_model()
@@ -26,8 +49,14 @@ class AnomalyDetector:
                 n_estimators=100
             )
     
-    def extract_features(self, data: dict) -> np.ndarray:
-        """Extract features from motor reading data"""
+    def extract_features(self, data: dict, motor_id: str = None, timestamp: datetime = None,
+                         spectral: list = None) -> np.ndarray:
+        """
+        Extract snapshot, rolling and spectral features for a motor (updates window state)
+        spectral: spectral features in effect at `timestamp` (default: the motor's latest waveform)
+        """
+        motor_id = motor_id or settings.DEFAULT_MOTOR_ID
+        timestamp = timestamp or datetime.utcnow()
         features = [
             # Average voltage across phases
             (data["voltage_a"] + data["voltage_b"] + data["voltage_c"]) / 3,
@@ -51,50 +80,153 @@ class AnomalyDetector:
             abs(data["current_b"] - data["current_c"]),
             abs(data["current_c"] - data["current_a"]),
         ]
+        features.extend(self.rolling.update(motor_id, timestamp.timestamp(), data))
+        # Latest vibration spectrum for this motor (zeros until a waveform arrives)
+        features.extend(spectral if spectral is not None else spectrum_store.latest_features(motor_id))
+        
         return np.array(features).reshape(1, -1)
     
-    async def detect_anomaly(self, data: dict) -> tuple[float, bool]:
+    def score_batch(self, features: np.ndarray) -> tuple[np.ndarray, np.ndarray, list]:
+        """
+        Score a batch of feature rows with the trained model
+        Returns: (normalized scores, anomaly flags, attribution per row or None)
+        """
+        # Scale features (scaled values are z-scores against the training data)
+        features_scaled = self.scaler.transform(features)
+        
+        # Predict (-1 for anomaly, 1 for normal)
+        predictions = self.model.predict(features_scaled)
+        
+        # Get anomaly score (lower is more anomalous)
+        scores = self.model.score_samples(features_scaled)
+        
+        # Convert score to 0-1 range (higher means more anomalous)
+        # Typical scores range from -0.5 to 0.5
+        normalized_scores = np.clip(-scores + 0.5, 0, 1)
+        
+        is_anomaly = predictions == -1
+        
+        # Attribution only for anomalous rows: features furthest from the training mean
+        attributions = [None] * len(features)
+        top_k = settings.ML_ATTRIBUTION_TOP_K
+        # Constant columns at fit time have scale_ = 1: their "z-score" is the raw value, not a deviation
+        candidates = np.flatnonzero(self.scaler.var_ > 0)
+        for row in np.flatnonzero(is_anomaly):
+            z = features_scaled[row]
+            top = candidates[np.argsort(-np.abs(z[candidates]))[:top_k]]
+            attributions[row] = {FEATURE_NAMES[i]: round(float(z[i]), 2) for i in top}
+        
+        return normalized_scores, is_anomaly, attributions
+    
+    def extract_rows(self, rows: list, motor_id: str, timestamps: list, spectral: list = None) -> np.ndarray:
+        """Feature matrix for many readings of one motor (oldest first); spectral: per-row override"""
+        spectral = spectral or [None] * len(rows)
+        return np.vstack([
+            self.extract_features(data, motor_id, ts, spec) for data, ts, spec in zip(rows, timestamps, spectral)
+        ])
+    
+    async def save_rolling(self):
+        """Snapshot the rolling state on the feature thread (never while a batch is mid-extraction)"""
+        await asyncio.get_running_loop().run_in_executor(self.executor, self.rolling.save)
+    
+    def spectral_fitted(self) -> bool:
+        """Whether the trained model saw varying spectral features (otherwise it cannot split on them)"""
+        return self.is_trained and bool(np.any(self.scaler.var_[SPECTRAL_COLUMNS] > 0))
+    
+    async def buffer_features(self, features: np.ndarray):
+        """Add feature rows to the training buffer; train on first fill or once spectral data is available"""
+        self.feature_buffer.extend(features)
+        del self.feature_buffer[:-self.max_buffer_size]
+        self.spectral_rows += int(np.count_nonzero(features[:, SPECTRAL_COLUMNS].any(axis=1)))
+        
+        # Persist window state periodically so trends survive restarts (at most once per call, not per row)
+        self.readings_since_snapshot += len(features)
+        if self.readings_since_snapshot >= settings.ML_ROLLING_SNAPSHOT_EVERY:
+            await self.save_rolling()
+            self.readings_since_snapshot = 0
+        
+        if not self.is_trained and len(self.feature_buffer) >= 100:
+            await self.train_model()
+        elif self.is_trained and self.spectral_rows >= settings.ML_SPECTRAL_RETRAIN_ROWS and not self.spectral_fitted():
+            # El modelo se entrenó con espectros en cero: reentrenar con datos de forma de onda reales
+            print(f"Retraining with {self.spectral_rows} spectral rows in the buffer")
+            await self.train_model()
+    
+    async def detect_anomaly(self, data: dict, motor_id: str = None, timestamp: datetime = None) -> tuple[float, bool, Optional[dict]]:
         """
         Detect if the current reading is anomalous
-        Returns: (anomaly_score, is_anomaly)
+        Returns: (anomaly_score, is_anomaly, attribution)
+        attribution maps the most deviating features to their z-score, None if normal
         """
         try:
-            features = self.extract_features(data)
-            
-            # Add to buffer for future training
-            self.feature_buffer.append(features[0])
-            if len(self.feature_buffer) > self.max_buffer_size:
-                self.feature_buffer.pop(0)
+            loop = asyncio.get_running_loop()
+            features = await loop.run_in_executor(self.executor, self.extract_features, data, motor_id, timestamp)
             
-            # If model is not trained and we have enough data, train it
-            if not self.is_trained and len(self.feature_buffer) >= 100:
-                await self.train_model()
+            # Add to buffer for future training (trains when there is enough data)
+            await self.buffer_features(features)
             
             # If model is trained, make prediction
             if self.is_trained:
-                # Scale features
-                features_scaled = self.scaler.transform(features)
-                
-                # Predict (-1 for anomaly, 1 for normal)
-                prediction = self.model.predict(features_scaled)[0]
-                
-                # Get anomaly score (lower is more anomalous)
-                score = self.model.score_samples(features_scaled)[0]
-                
-                # Convert score to 0-1 range (higher means more anomalous)
-                # Typical scores range from -0.5 to 0.5
-                normalized_score = max(0, min(1, (-score + 0.5)))
-                
-                is_anomaly = prediction == -1
-                
-                return normalized_score, is_anomaly
+                scores, flags, attributions = self.score_batch(features)
+                return float(scores[0]), bool(flags[0]), attributions[0]
             else:
                 # Not enough data to make prediction yet
-                return 0.0, False
+                return 0.0, False, None
                 
         except Exception as e:
             print(f"Error in anomaly detection: {e}")
-            return 0.0, False
+            return 0.0, False, None
+    
+    async def detect_batch(self, rows: list, motor_id: str, timestamps: list) -> tuple[np.ndarray, np.ndarray, list]:
+        """
+        Score many readings of one motor (oldest first) with a single model call
+        Rolling windows still advance reading by reading; returns (scores, flags, attributions)
+        """
+        n = len(rows)
+        try:
+            # Ventanas lectura a lectura en el hilo de características: el event loop sigue libre
+            loop = asyncio.get_running_loop()
+            features = await loop.run_in_executor(self.executor, self.extract_rows, rows, motor_id, timestamps)
+            
+            await self.buffer_features(features)
+            
+            if self.is_trained:
+                # Un solo predict para todo el lote, fuera del event loop
+                return await loop.run_in_executor(None, self.score_batch, features)
+        except Exception as e:
+            print(f"Error in batch anomaly detection: {e}")
+        return np.zeros(n), np.zeros(n, dtype=bool), [None] * n
+    
+    async def warm_start(self, timestamps: list, rows: list, motor_id: str = None,
+                         spectral_timestamps: list = (), spectral_rows: np.ndarray = None):
+        """
+        Rebuild the training buffer and rolling state from recent readings (oldest first)
+        and retrain so scoring works right after a restart
+        spectral_timestamps / spectral_rows: stored spectral features (oldest first); each reading
+        gets the ones of the latest waveform at or before it, as it did live
+        """
+        motor_id = motor_id or settings.DEFAULT_MOTOR_ID
+        zeros = [0.0] * len(spectral_feature_names())
+        positions = np.searchsorted(
+            np.array(spectral_timestamps, dtype="datetime64[us]"),
+            np.array(timestamps, dtype="datetime64[us]"), side="right"
+        ) - 1
+        
+        spectral = [spectral_rows[i].tolist() if i >= 0 else zeros for i in positions]
+        
+        def replay():
+            # The database is authoritative over the on-disk snapshot for this motor
+            self.rolling.reset(motor_id)
+            return self.extract_rows(rows, motor_id, timestamps, spectral) if rows else []
+        
+        buffer = await asyncio.get_running_loop().run_in_executor(self.executor, replay)
+        self.feature_buffer = list(buffer[-self.max_buffer_size:])
+        if len(spectral_timestamps) and motor_id not in spectrum_store.features:
+            # Hasta la próxima forma de onda, las lecturas en vivo usan la última guardada
+            spectrum_store.add(motor_id, spectral_rows[-1])
+        
+        if len(self.feature_buffer) >= 100:
+            await self.train_model()
     
     async def train_model(self):
         """Train the anomaly detection model with buffered data"""
@@ -115,9 +247,11 @@ class AnomalyDetector:
             # Train model
             self.model.fit(X_scaled)
             self.is_trained = True
+            self.spectral_rows = 0
             
-            # Save model
+            # Save model (and the window state it was trained with)
             self.save_model()
+            await self.save_rolling()
             
             print("Model training complete")
             
@@ -142,6 +276,11 @@ class AnomalyDetector:
         try:
             if self.model_path.exists():
                 data = joblib.load(self.model_path)
+                # Discard models trained on a different feature layout
+                n_features = getattr(data['scaler'], 'n_features_in_', None)
+                if n_features is not None and n_features != len(FEATURE_NAMES):
+                    print(f"Saved model uses {n_features} features, expected {len(FEATURE_NAMES)}; retraining")
+                    return
                 self.model = data['model']
                 self.scaler = data['scaler']
                 self.is_trained = data['is_trained']
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Dict
+import json
 
 class MotorReadingBase(BaseModel):
     # Phase A
@@ -40,6 +41,15 @@ class MotorReading(MotorReadingBase):
     timestamp: datetime
     anomaly_score: float
     is_anomaly: bool
+    anomaly_attribution: Optional[Dict[str, float]] = None
+    
+    @field_validator("anomaly_attribution", mode="before")
+    @classmethod
+    def parse_attribution(cls, value):
+        # Stored as compact JSON text in the database
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
     
     class Config:
         from_attributes = True
@@ -93,6 +103,15 @@ class AlertQuery(BaseModel):
     resolved: Optional[bool] = None
     limit: int = 50
 
+class AlertBulkFilter(BaseModel):
+    """Alerts matched by a bulk resolve / delete / archive (every field optional, combined with AND)"""
+    category: Optional[str] = None
+    severity: Optional[str] = None
+    phase: Optional[str] = None
+    start_time: Optional[datetime] = None
+    end_time: Optional[datetime] = None
+    resolved: Optional[bool] = None  # solo delete / archive; resolve siempre toma las activas
+
 class ThresholdSettingsBase(BaseModel):
     # Voltage thresholds (V)
     voltage_min: float = 200.0
@@ -4,10 +4,19 @@ import asyncio
 import ssl
 from datetime import datetime, timedelta
 from app.config import settings
-from app.database import async_session_maker
-from app.database import MotorReading, Alert, SystemLog, ThresholdSettings as ThresholdSettingsDB
+from app.database import Alert, ThresholdSettings as ThresholdSettingsDB, spectral_features
+from app.db_writer import db_writer, write_log, PRIORITY_INGEST, PRIORITY_USER
 from app.ml_detector import AnomalyDetector
-from sqlalchemy import select, desc, and_
+from app.rollups import apply_readings
+from app.partitions import insert_readings
+from app.hot_store import hot_store
+from app.cache import summary_cache
+from app.ws_hub import ws_hub
+from app.alert_index import alert_index, alert_row
+from app.models import ThresholdSettings as ThresholdSettingsSchema
+from app.spectral import unpack_waveform, spectral_analyzer
+from app.waveform_archive import waveform_archive, validate_motor_id
+from sqlalchemy import select, desc, and_, insert
 
 class MQTTHandler:
     def __init__(self):
@@ -27,7 +36,8 @@ class MQTTHandler:
                 f"{settings.MQTT_TOPIC_PREFIX}phase_b",
                 f"{settings.MQTT_TOPIC_PREFIX}phase_c",
                 f"{settings.MQTT_TOPIC_PREFIX}motor_metrics",
-                f"{settings.MQTT_TOPIC_PREFIX}thresholds/update"  # Nuevo: recibir umbrales
+                f"{settings.MQTT_TOPIC_PREFIX}thresholds/update",  # Nuevo: recibir umbrales
+                f"{settings.MQTT_TOPIC_PREFIX}vibracion/waveform/#"  # Bloques crudos int16
             ]
             for topic in topics:
                 client.subscribe(topic)
@@ -44,9 +54,19 @@ class MQTTHandler:
     def on_message(self, client, userdata, msg):
         """Callback when message received"""
         try:
-            payload = json.loads(msg.payload.decode())
             topic = msg.topic
             
+            # Waveform blocks are binary, not JSON
+            if f"{settings.MQTT_TOPIC_PREFIX}vibracion/waveform" in topic:
+                if self.loop:
+                    asyncio.run_coroutine_threadsafe(
+                        self.process_waveform(topic, msg.payload),
+                        self.loop
+                    )
+                return
+            
+            payload = json.loads(msg.payload.decode())
+            
             # Process message in event loop
             if self.loop:
                 asyncio.run_coroutine_threadsafe(
@@ -59,150 +79,192 @@ class MQTTHandler:
     async def process_message(self, topic, payload):
         """Process incoming MQTT messages and store to database"""
         try:
-            async with async_session_maker() as session:
-                # Check if this is a threshold update message
-                if topic.endswith("thresholds/update"):
-                    await self.update_thresholds_from_mqtt(payload, session)
-                    return
+            # Check if this is a threshold update message
+            if topic.endswith("thresholds/update"):
+                await self.update_thresholds_from_mqtt(payload)
+                return
+            
+            # Check if we have a complete reading (all phases + motor metrics)
+            if "complete_reading" in payload and payload["complete_reading"]:
+                motor_id = payload.get("motor_id", settings.DEFAULT_MOTOR_ID)
+                timestamp = datetime.utcnow()
                 
-                # Check if we have a complete reading (all phases + motor metrics)
-                if "complete_reading" in payload and payload["complete_reading"]:
-                    # Create motor reading
-                    reading_data = {
-                        "voltage_a": payload.get("voltage_a", 0),
-                        "current_a": payload.get("current_a", 0),
-                        "power_a": payload.get("power_a", 0),
-                        "energy_a": payload.get("energy_a", 0),
-                        "frequency_a": payload.get("frequency_a", 0),
-                        "pf_a": payload.get("pf_a", 0),
-                        "voltage_b": payload.get("voltage_b", 0),
-                        "current_b": payload.get("current_b", 0),
-                        "power_b": payload.get("power_b", 0),
-                        "energy_b": payload.get("energy_b", 0),
-                        "frequency_b": payload.get("frequency_b", 0),
-                        "pf_b": payload.get("pf_b", 0),
-                        "voltage_c": payload.get("voltage_c", 0),
-                        "current_c": payload.get("current_c", 0),
-                        "power_c": payload.get("power_c", 0),
-                        "energy_c": payload.get("energy_c", 0),
-                        "frequency_c": payload.get("frequency_c", 0),
-                        "pf_c": payload.get("pf_c", 0),
-                        "temperature": payload.get("temperature", 0),
-                        "vibration": payload.get("vibration", 0),
-                        "rpm": payload.get("rpm", 0),
-                    }
-                    
-                    # Run anomaly detection
-                    anomaly_score, is_anomaly = await self.ml_detector.detect_anomaly(reading_data)
-                    reading_data["anomaly_score"] = anomaly_score
-                    reading_data["is_anomaly"] = is_anomaly
-                    
-                    # Save reading to database
-                    reading = MotorReading(**reading_data)
-                    session.add(reading)
-                    
-                    # Check thresholds and create alerts
-                    alerts = await self.check_thresholds(reading_data, session)
-                    
-                    # Si la IA detecta anomalía, agregar alerta de ML
-                    if is_anomaly:
-                        ml_alert = {
-                            "severity": "warning",
-                            "category": "ml_anomaly",
-                            "message": f"⚡ IA detectó comportamiento anómalo (score: {anomaly_score:.2f})",
-                            "value": anomaly_score,
-                            "threshold": 0.0
-                        }
-                        alerts.append(ml_alert)
-                        print(f"🤖 IA DETECTÓ ANOMALÍA - Score: {anomaly_score:.2f}")
-                    
-                    if alerts:
-                        print(f"🚨 Se detectaron {len(alerts)} alertas:")
-
-                    # Si hay alertas críticas o la IA detectó una anomalía fuerte, generar una alerta de 'failure' y publicar MQTT
-                    try:
-                        critical_exists = any(a.get('severity') == 'critical' for a in alerts)
-                        strong_ml_failure = is_anomaly and anomaly_score >= 0.7
-
-                        if critical_exists or strong_ml_failure:
-                            # Evitar duplicados
-                            if not any(a.get('category') == 'failure' for a in alerts):
-                                failure_alert = {
-                                    "severity": "critical",
-                                    "category": "failure",
-                                    "message": f"🚨 Motor failure detected: anomaly_score={anomaly_score:.2f}" if is_anomaly else "🚨 Motor failure detected: threshold breach",
-                                    "value": anomaly_score if is_anomaly else None,
-                                    "threshold": None
-                                }
-                                alerts.append(failure_alert)
-                                print("🔥 FAILURE alert appended due to critical condition or strong ML anomaly")
-
-                                # Publicar un mensaje MQTT para que frontends y sistemas externos reaccionen
-                                try:
-                                    if self.client:
-                                        pub_payload = {
-                                            "type": "failure",
-                                            "message": failure_alert["message"],
-                                            "reading": reading_data,
-                                            "timestamp": datetime.now().isoformat()
-                                        }
-                                        self.client.publish('motor/failure', json.dumps(pub_payload), qos=1)
-                                        print("📡 Published motor/failure to MQTT")
-                                except Exception as e:
-                                    print(f"Error publishing failure MQTT: {e}")
-                    except Exception as e:
-                        print(f"Error generating failure alert: {e}")
-                    
+                # Create motor reading
+                reading_data = {
+                    "voltage_a": payload.get("voltage_a", 0),
+                    "current_a": payload.get("current_a", 0),
+                    "power_a": payload.get("power_a", 0),
+                    "energy_a": payload.get("energy_a", 0),
+                    "frequency_a": payload.get("frequency_a", 0),
+                    "pf_a": payload.get("pf_a", 0),
+                    "voltage_b": payload.get("voltage_b", 0),
+                    "current_b": payload.get("current_b", 0),
+                    "power_b": payload.get("power_b", 0),
+                    "energy_b": payload.get("energy_b", 0),
+                    "frequency_b": payload.get("frequency_b", 0),
+                    "pf_b": payload.get("pf_b", 0),
+                    "voltage_c": payload.get("voltage_c", 0),
+                    "current_c": payload.get("current_c", 0),
+                    "power_c": payload.get("power_c", 0),
+                    "energy_c": payload.get("energy_c", 0),
+                    "frequency_c": payload.get("frequency_c", 0),
+                    "pf_c": payload.get("pf_c", 0),
+                    "temperature": payload.get("temperature", 0),
+                    "vibration": payload.get("vibration", 0),
+                    "rpm": payload.get("rpm", 0),
+                }
+                
+                # Run anomaly detection
+                anomaly_score, is_anomaly, attribution = await self.ml_detector.detect_anomaly(reading_data, motor_id, timestamp)
+                reading_data["anomaly_score"] = anomaly_score
+                reading_data["is_anomaly"] = is_anomaly
+                reading_data["anomaly_attribution"] = json.dumps(attribution) if attribution else None
+                
+                if is_anomaly:
+                    print(f"🤖 IA DETECTÓ ANOMALÍA - Score: {anomaly_score:.2f}")
+                
+                # Todas las escrituras pasan por el writer único (group commit con otras ingestas)
+                reading_row, alerts, failure_alert, resolved_ids = await db_writer.submit(
+                    lambda session: self.store_reading(session, timestamp, reading_data, attribution),
+                    PRIORITY_INGEST
+                )
+                
+                # Log de la anomalía en el writer de logs, fuera de la transacción de telemetría
+                if is_anomaly:
+                    await write_log("warning", "ml", f"Anomaly detected with score {anomaly_score:.2f}", json.dumps(reading_data))
+                
+                # Solo lecturas confirmadas llegan al hot store en memoria
+                hot_store.push(motor_id, reading_row)
+                alert_index.add(alerts)
+                alert_index.resolve(resolved_ids)
+                summary_cache.invalidate()
+                
+                # Difusión en tiempo real a los clientes WebSocket suscritos
+                ws_hub.publish("readings", reading_row, motor_id)
+                for alert_data in alerts:
+                    ws_hub.publish("alerts", alert_data, motor_id, alert_data["category"])
+                
+                if alerts:
+                    print(f"🚨 Se detectaron {len(alerts)} alertas:")
                     for alert_data in alerts:
                         print(f"   - Severidad: {alert_data['severity']} | Categoría: {alert_data['category']} | Mensaje: {alert_data['message']}")
-                        alert = Alert(**alert_data)
-                        session.add(alert)
-                        print(f"   ✅ Alerta agregada a la sesión: ID pendiente hasta commit")
-                    
-                    # Auto-resolve old alerts (older than 2 minutes)
-                    two_minutes_ago = datetime.now() - timedelta(minutes=2)
-                    old_alerts_query = select(Alert).where(
-                        and_(
-                            Alert.resolved == False,
-                            Alert.timestamp < two_minutes_ago
-                        )
-                    )
-                    old_alerts_result = await session.execute(old_alerts_query)
-                    old_alerts = old_alerts_result.scalars().all()
-                    
-                    for old_alert in old_alerts:
-                        old_alert.resolved = True
-                        old_alert.resolved_at = datetime.now()
-                    
-                    if old_alerts:
-                        print(f"🔄 Auto-resolved {len(old_alerts)} old alerts")
-                    
-                    # Log if anomaly detected
-                    if is_anomaly:
-                        log = SystemLog(
-                            level="warning",
-                            source="ml",
-                            message=f"Anomaly detected with score {anomaly_score:.2f}",
-                            details=json.dumps(reading_data)
-                        )
-                        session.add(log)
-                    
-                    await session.commit()
-                    
-                    if alerts:
-                        print(f"💾 Commit exitoso - {len(alerts)} alertas guardadas en la base de datos")
+                    print(f"💾 Commit exitoso - {len(alerts)} alertas guardadas en la base de datos")
+                
+                # Publicar un mensaje MQTT para que frontends y sistemas externos reaccionen
+                if failure_alert:
+                    try:
+                        if self.client:
+                            pub_payload = {
+                                "type": "failure",
+                                "message": failure_alert["message"],
+                                "reading": reading_data,
+                                "timestamp": datetime.now().isoformat()
+                            }
+                            self.client.publish('motor/failure', json.dumps(pub_payload), qos=1)
+                            print("📡 Published motor/failure to MQTT")
+                    except Exception as e:
+                        print(f"Error publishing failure MQTT: {e}")
                     
         except Exception as e:
             print(f"Error processing message: {e}")
-            async with async_session_maker() as session:
-                log = SystemLog(
-                    level="error",
-                    source="mqtt",
-                    message="Error processing MQTT message",
-                    details=str(e)
-                )
-                session.add(log)
-                await session.commit()
+            await write_log("error", "mqtt", "Error processing MQTT message", str(e))
+    
+    async def store_reading(self, session, timestamp, reading_data, attribution):
+        """
+        Writer job: reading, rollups, alerts and auto-resolution in one transaction
+        Returns: (reading row with id, alert rows created, failure alert or None, ids auto-resolved)
+        """
+        anomaly_score = reading_data["anomaly_score"]
+        is_anomaly = reading_data["is_anomaly"]
+        
+        # Save reading to database (daily partition when enabled)
+        reading_row = {"timestamp": timestamp, **reading_data}
+        reading_row["id"], = await insert_readings(session, [reading_row])
+        
+        # Fold into 1-minute / 1-hour rollups in the same transaction
+        await apply_readings(session, [(timestamp, reading_data)])
+        
+        # Check thresholds and create alerts
+        alerts = await self.check_thresholds(reading_data, session)
+        
+        # Si la IA detecta anomalía, agregar alerta de ML
+        if is_anomaly:
+            ml_alert = {
+                "severity": "warning",
+                "category": "ml_anomaly",
+                "message": f"⚡ IA detectó comportamiento anómalo (score: {anomaly_score:.2f})" + (f" - causas: {', '.join(attribution)}" if attribution else ""),
+                "value": anomaly_score,
+                "threshold": 0.0
+            }
+            alerts.append(ml_alert)
+        
+        # Si hay alertas críticas o la IA detectó una anomalía fuerte, generar una alerta de 'failure'
+        # (se publica por MQTT tras el commit)
+        failure_alert = None
+        critical_exists = any(a.get('severity') == 'critical' for a in alerts)
+        strong_ml_failure = is_anomaly and anomaly_score >= 0.7
+        
+        if (critical_exists or strong_ml_failure) and not any(a.get('category') == 'failure' for a in alerts):
+            failure_alert = {
+                "severity": "critical",
+                "category": "failure",
+                "message": f"🚨 Motor failure detected: anomaly_score={anomaly_score:.2f}" if is_anomaly else "🚨 Motor failure detected: threshold breach",
+                "value": anomaly_score if is_anomaly else None,
+                "threshold": None
+            }
+            alerts.append(failure_alert)
+            print("🔥 FAILURE alert appended due to critical condition or strong ML anomaly")
+        
+        alert_objects = [Alert(**alert_data) for alert_data in alerts]
+        session.add_all(alert_objects)
+        await session.flush()  # ids para el índice de alertas activas
+        
+        # Auto-resolve old alerts (older than 2 minutes)
+        two_minutes_ago = datetime.now() - timedelta(minutes=2)
+        old_alerts_query = select(Alert).where(
+            and_(
+                Alert.resolved == False,
+                Alert.timestamp < two_minutes_ago
+            )
+        )
+        old_alerts_result = await session.execute(old_alerts_query)
+        old_alerts = old_alerts_result.scalars().all()
+        
+        for old_alert in old_alerts:
+            old_alert.resolved = True
+            old_alert.resolved_at = datetime.now()
+        
+        if old_alerts:
+            print(f"🔄 Auto-resolved {len(old_alerts)} old alerts")
+        
+        return reading_row, [alert_row(a) for a in alert_objects], failure_alert, [a.id for a in old_alerts]
+    
+    async def process_waveform(self, topic, payload):
+        """Decode a raw vibration block and compute its spectral features"""
+        try:
+            # motor/vibracion/waveform[/<motor_id>]
+            suffix = topic.split("vibracion/waveform", 1)[1].strip("/")
+            motor_id = validate_motor_id(suffix or settings.DEFAULT_MOTOR_ID)
+            
+            timestamp = datetime.utcnow()
+            sample_rate, scale, rpm, raw = unpack_waveform(payload)
+            samples = raw.astype("float32") * scale
+            features, spectrum = await spectral_analyzer.submit(motor_id, timestamp, sample_rate, rpm, samples)
+            
+            # Persistir las características: el warm-up y el reentrenamiento las necesitan
+            row = {"timestamp": timestamp, "motor_id": motor_id, **features}
+            await db_writer.submit(
+                lambda session: session.execute(insert(spectral_features).values(row)),
+                PRIORITY_INGEST
+            )
+            
+            # Archive raw block and spectrum off the event loop (single writer thread, in order)
+            await self.loop.run_in_executor(
+                waveform_archive.writer, waveform_archive.append,
+                motor_id, timestamp, sample_rate, scale, raw, spectrum
+            )
+        except Exception as e:
+            print(f"Error processing waveform: {e}")
     
     async def check_thresholds(self, data, session):
         """Check if any values exceed thresholds and create alerts"""
@@ -304,85 +366,66 @@ class MQTTHandler:
             print("MQTT client started")
             
             # Log startup
-            async with async_session_maker() as session:
-                log = SystemLog(
-                    level="info",
-                    source="mqtt",
-                    message="MQTT client started successfully"
-                )
-                session.add(log)
-                await session.commit()
+            await write_log("info", "mqtt", "MQTT client started successfully")
                 
         except Exception as e:
             print(f"Error starting MQTT client: {e}")
-            async with async_session_maker() as session:
-                log = SystemLog(
-                    level="error",
-                    source="mqtt",
-                    message="Failed to start MQTT client",
-                    details=str(e)
-                )
-                session.add(log)
-                await session.commit()
+            await write_log("error", "mqtt", "Failed to start MQTT client", str(e))
     
-    async def update_thresholds_from_mqtt(self, payload, session):
+    async def update_thresholds_from_mqtt(self, payload):
         """Update thresholds in database when received from MQTT"""
         try:
             print(f"📥 Received threshold update from MQTT")
             print(f"   Topic detected: motor/thresholds/update")
             print(f"   Payload: {payload}")
             
-            # Get current thresholds or create new
-            query = select(ThresholdSettingsDB).order_by(desc(ThresholdSettingsDB.id)).limit(1)
-            result = await session.execute(query)
-            thresholds = result.scalar_one_or_none()
-            
-            if not thresholds:
-                print("   Creating new threshold record...")
-                thresholds = ThresholdSettingsDB()
-                session.add(thresholds)
-            else:
-                print(f"   Updating existing threshold record (ID: {thresholds.id})...")
-            
-            # Update threshold values
-            if "voltage_min" in payload: thresholds.voltage_min = payload["voltage_min"]
-            if "voltage_max" in payload: thresholds.voltage_max = payload["voltage_max"]
-            if "current_warning" in payload: thresholds.current_warning = payload["current_warning"]
-            if "current_critical" in payload: thresholds.current_critical = payload["current_critical"]
-            if "temp_warning" in payload: thresholds.temp_warning = payload["temp_warning"]
-            if "temp_critical" in payload: thresholds.temp_critical = payload["temp_critical"]
-            if "vibration_warning" in payload: thresholds.vibration_warning = payload["vibration_warning"]
-            if "vibration_critical" in payload: thresholds.vibration_critical = payload["vibration_critical"]
-            if "rpm_warning" in payload: thresholds.rpm_warning = payload["rpm_warning"]
-            if "rpm_critical" in payload: thresholds.rpm_critical = payload["rpm_critical"]
-            if "power_warning" in payload: thresholds.power_warning = payload["power_warning"]
-            if "power_critical" in payload: thresholds.power_critical = payload["power_critical"]
-            if "frequency_min" in payload: thresholds.frequency_min = payload["frequency_min"]
-            if "frequency_max" in payload: thresholds.frequency_max = payload["frequency_max"]
-            if "pf_min" in payload: thresholds.pf_min = payload["pf_min"]
-            if "energy_warning" in payload: thresholds.energy_warning = payload["energy_warning"]
-            
-            await session.commit()
-            print(f"   ✅ Database committed successfully")
-            
-            # Log the update
-            log = SystemLog(
-                level="info",
-                source="mqtt",
-                message="Thresholds updated via MQTT",
-                details=json.dumps(payload)
+            # Cambio de usuario: prioridad sobre la ingesta en la cola del writer
+            thresholds = await db_writer.submit(
+                lambda session: self._apply_thresholds(session, payload), PRIORITY_USER
             )
-            session.add(log)
-            await session.commit()
-            
+            print(f"   ✅ Database committed successfully")
+            await write_log("info", "mqtt", "Thresholds updated via MQTT", json.dumps(payload))
             print(f"✅ Thresholds updated successfully from MQTT!")
             print(f"   Example: temp_critical = {thresholds.temp_critical}")
+            ws_hub.publish("thresholds", ThresholdSettingsSchema.model_validate(thresholds).model_dump())
             
         except Exception as e:
             print(f"❌ Error updating thresholds from MQTT: {e}")
             import traceback
             traceback.print_exc()
-            await session.rollback()
+    
+    async def _apply_thresholds(self, session, payload):
+        """Writer job: update (or create) the threshold record"""
+        # Get current thresholds or create new
+        query = select(ThresholdSettingsDB).order_by(desc(ThresholdSettingsDB.id)).limit(1)
+        result = await session.execute(query)
+        thresholds = result.scalar_one_or_none()
+        
+        if not thresholds:
+            print("   Creating new threshold record...")
+            thresholds = ThresholdSettingsDB()
+            session.add(thresholds)
+        else:
+            print(f"   Updating existing threshold record (ID: {thresholds.id})...")
+        
+        # Update threshold values
+        if "voltage_min" in payload: thresholds.voltage_min = payload["voltage_min"]
+        if "voltage_max" in payload: thresholds.voltage_max = payload["voltage_max"]
+        if "current_warning" in payload: thresholds.current_warning = payload["current_warning"]
+        if "current_critical" in payload: thresholds.current_critical = payload["current_critical"]
+        if "temp_warning" in payload: thresholds.temp_warning = payload["temp_warning"]
+        if "temp_critical" in payload: thresholds.temp_critical = payload["temp_critical"]
+        if "vibration_warning" in payload: thresholds.vibration_warning = payload["vibration_warning"]
+        if "vibration_critical" in payload: thresholds.vibration_critical = payload["vibration_critical"]
+        if "rpm_warning" in payload: thresholds.rpm_warning = payload["rpm_warning"]
+        if "rpm_critical" in payload: thresholds.rpm_critical = payload["rpm_critical"]
+        if "power_warning" in payload: thresholds.power_warning = payload["power_warning"]
+        if "power_critical" in payload: thresholds.power_critical = payload["power_critical"]
+        if "frequency_min" in payload: thresholds.frequency_min = payload["frequency_min"]
+        if "frequency_max" in payload: thresholds.frequency_max = payload["frequency_max"]
+        if "pf_min" in payload: thresholds.pf_min = payload["pf_min"]
+        if "energy_warning" in payload: thresholds.energy_warning = payload["energy_warning"]
+        return thresholds
     
     async def stop(self):
         """Stop MQTT client"""
@@ -391,14 +434,7 @@ class MQTTHandler:
             self.client.disconnect()
             print("MQTT client stopped")
             
-            async with async_session_maker() as session:
-                log = SystemLog(
-                    level="info",
-                    source="mqtt",
-                    message="MQTT client stopped"
-                )
-                session.add(log)
-                await session.commit()
+            await write_log("info", "mqtt", "MQTT client stopped")
 
 # Global MQTT handler instance
 mqtt_handler = MQTTHandler()
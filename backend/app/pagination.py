@@ -0,0 +1,54 @@
+"""
+Keyset (cursor) pagination for newest-first listings.
+
+Pages are ordered by (timestamp DESC, id DESC) and the next page starts
+strictly after the last row of the previous one, so every page is an index
+range scan: page 10,000 costs the same as page 1 (no OFFSET). The cursor is
+an opaque URL-safe token; clients only pass back what X-Next-Cursor gave them.
+"""
+import base64
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, desc
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    """(timestamp, id) of a cursor token; HTTP 400 if it is not one of ours"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def paginate(query, timestamp_col, id_col, cursor: str, limit: int):
+    """Order newest first and start after `cursor`; fetches limit + 1 rows to detect a next page"""
+    if cursor:
+        ts, row_id = decode_cursor(cursor)
+        # timestamp <= ts acota el rango del índice; el id desempata lecturas con el mismo instante
+        query = query.where(and_(
+            timestamp_col <= ts,
+            or_(timestamp_col < ts, id_col < row_id)
+        ))
+    return query.order_by(desc(timestamp_col), desc(id_col)).limit(limit + 1)
+
+
+def page(rows: list, limit: int, response):
+    """Trim the look-ahead row and set X-Next-Cursor when there is another page"""
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        if isinstance(last, dict):
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last["timestamp"], last["id"])
+        else:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(last.timestamp, last.id)
+    return rows
@@ -0,0 +1,171 @@
+"""
+Day-partitioned storage for motor readings (READINGS_PARTITIONED).
+
+Each UTC day lives in its own table, motor_readings_pYYYYMMDD, with the
+columns and indexes of motor_readings. Partitions are created on first
+write, inside the writer's transaction. readings_source(start, end)
+returns an ORM entity over only the partitions a range overlaps, so callers
+keep writing select(R).where(R.timestamp >= ...) and get MotorReading rows.
+Retention drops whole partitions instead of deleting rows.
+
+The original motor_readings table stays in every source so rows written
+before partitioning was enabled remain visible. Row ids stay unique across
+partitions because each partition's AUTOINCREMENT sequence starts at
+day.toordinal() * ID_STRIDE.
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import MetaData, Table, Index, select, insert, union_all, text, event
+from sqlalchemy.orm import aliased
+
+from app.config import settings
+from app.database import engine, MotorReading
+from app.db_writer import db_writer, PRIORITY_BACKGROUND
+
+PARTITION_PREFIX = "motor_readings_p"
+ID_STRIDE = 10 ** 9
+DAY = timedelta(days=1)
+
+_metadata = MetaData()
+
+
+def _day(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _partition_table(day: datetime) -> Table:
+    name = f"{PARTITION_PREFIX}{day.strftime('%Y%m%d')}"
+    if name in _metadata.tables:
+        return _metadata.tables[name]
+    columns = [column._copy() for column in MotorReading.__table__.columns]
+    return Table(
+        name, _metadata, *columns,
+        Index(f"ix_{name}_anomaly_timestamp", "is_anomaly", "timestamp"),
+        sqlite_autoincrement=True
+    )
+
+
+class ReadingPartitions:
+    def __init__(self):
+        # day -> Table, only for partitions that exist in the database
+        self.days = {}
+
+    async def load(self):
+        """Register the partitions already present in the database"""
+        async with engine.connect() as conn:
+            names = (await conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :prefix"
+            ), {"prefix": f"{PARTITION_PREFIX}%"})).scalars().all()
+        self.days = {}
+        for name in names:
+            day = datetime.strptime(name[len(PARTITION_PREFIX):], "%Y%m%d")
+            self.days[day] = _partition_table(day)
+
+    async def ensure(self, session, day: datetime) -> Table:
+        """
+        Partition for a day, created inside the caller's transaction if missing
+        It becomes visible to queries once that transaction commits
+        """
+        table = self.days.get(day)
+        if table is not None:
+            return table
+        table = _partition_table(day)
+        await session.run_sync(lambda sync_session: table.create(sync_session.connection(), checkfirst=True))
+        await session.execute(text(
+            "INSERT INTO sqlite_sequence (name, seq) "
+            "SELECT :name, :seq WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = :name)"
+        ), {"name": table.name, "seq": day.toordinal() * ID_STRIDE})
+        # Registrar solo tras el commit: un rollback también deshace el CREATE TABLE
+        event.listen(
+            session.sync_session, "after_commit",
+            lambda _: self.days.setdefault(day, table), once=True
+        )
+        return table
+
+    def tables(self, start: datetime = None, end: datetime = None) -> list:
+        """Partitions overlapping [start, end] (open ends allowed), oldest first"""
+        first = _day(start) if start else None
+        last = _day(end) if end else None
+        return [
+            table for day, table in sorted(self.days.items())
+            if (first is None or day >= first) and (last is None or day <= last)
+        ]
+
+    async def drop_before(self, cutoff: datetime) -> int:
+        """Drop every partition whose whole day is older than cutoff; returns partitions dropped"""
+        dropped = 0
+        for day, table in sorted(self.days.items()):
+            if day + DAY > cutoff:
+                break
+            # DDL también por el writer único
+            await db_writer.submit(
+                lambda session: session.run_sync(lambda sync_session: table.drop(sync_session.connection(), checkfirst=True)),
+                PRIORITY_BACKGROUND
+            )
+            del self.days[day]
+            dropped += 1
+        return dropped
+
+
+def readings_table(start: datetime = None, end: datetime = None):
+    """
+    Core selectable with the motor_readings columns for a time range
+    Unpartitioned: the table itself; partitioned: UNION ALL of the legacy table and the overlapping partitions
+    """
+    base = MotorReading.__table__
+    if not settings.READINGS_PARTITIONED:
+        return base
+    tables = [base] + reading_partitions.tables(start, end)
+    if len(tables) == 1:
+        return base
+    selects = [select(*[table.c[c.name] for c in base.columns]) for table in tables]
+    return union_all(*selects).subquery(base.name)
+
+
+def readings_source(start: datetime = None, end: datetime = None):
+    """ORM entity for MotorReading restricted to the partitions of a time range"""
+    table = readings_table(start, end)
+    if table is MotorReading.__table__:
+        return MotorReading
+    return aliased(MotorReading, table, adapt_on_names=True)
+
+
+def readings_sql(start: datetime = None, end: datetime = None) -> str:
+    """FROM clause text for raw SQL over the readings of a time range"""
+    base = MotorReading.__table__
+    if not settings.READINGS_PARTITIONED:
+        return base.name
+    tables = [base] + reading_partitions.tables(start, end)
+    if len(tables) == 1:
+        return base.name
+    columns = ", ".join(c.name for c in base.columns)
+    return "(" + " UNION ALL ".join(f"SELECT {columns} FROM {table.name}" for table in tables) + ")"
+
+
+async def _insert(session, table, rows: list) -> list:
+    stmt = insert(table).returning(table.c.id, sort_by_parameter_order=True)
+    return (await session.execute(stmt, rows)).scalars().all()
+
+
+async def insert_readings(session, rows: list) -> list:
+    """
+    Insert reading dicts (with "timestamp") into the table or the partition of each row's day
+    Returns: the new ids, in input order
+    """
+    if not rows:
+        return []
+    if not settings.READINGS_PARTITIONED:
+        return await _insert(session, MotorReading.__table__, rows)
+    by_day = {}
+    for i, row in enumerate(rows):
+        by_day.setdefault(_day(row["timestamp"]), []).append(i)
+    ids = [None] * len(rows)
+    for day, positions in by_day.items():
+        table = await reading_partitions.ensure(session, day)
+        for i, row_id in zip(positions, await _insert(session, table, [rows[i] for i in positions])):
+            ids[i] = row_id
+    return ids
+
+
+# Global partition registry
+reading_partitions = ReadingPartitions()
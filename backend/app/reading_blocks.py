@@ -0,0 +1,230 @@
+"""
+Compressed block storage for older raw readings (READING_BLOCKS_ENABLED).
+
+Readings older than READING_BLOCKS_AFTER_HOURS are moved out of
+motor_readings into reading_blocks: one row per minute whose blob holds the
+numeric columns encoded with app.gorilla. A day becomes 1,440 small rows
+instead of one wide row per reading, so range scans touch far fewer pages.
+History queries (app.history: column arrays and newest-first row pages)
+merge blocks and raw rows transparently. The numeric columns go through
+Gorilla; anomaly_attribution, present only on anomalous readings, is kept
+as a JSON map {id: attribution} next to the blob.
+"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, delete, insert, func, desc
+
+from app.config import settings
+from app.database import MotorReading, READING_FIELDS, reading_blocks
+from app.cold_archive import to_array
+from app.partitions import readings_table, reading_partitions
+from app.db_writer import db_writer, PRIORITY_BACKGROUND
+from app import gorilla
+
+BLOCK_INTS = ("timestamp", "id")
+BLOCK_FLOATS = tuple(READING_FIELDS) + ("anomaly_score",)
+BLOCK_BOOLS = ("is_anomaly",)
+BLOCK_COLUMNS = BLOCK_INTS + BLOCK_FLOATS + BLOCK_BOOLS
+
+# Minutos compactados por transacción
+COMPACT_SPAN = timedelta(hours=1)
+MINUTE_US = 60 * 10 ** 6
+
+
+def _minute(ts: datetime) -> datetime:
+    return ts.replace(second=0, microsecond=0)
+
+
+def encode(arrays: dict) -> bytes:
+    columns = dict(arrays, timestamp=arrays["timestamp"].astype("datetime64[us]").astype(np.int64))
+    return gorilla.encode_block(columns, BLOCK_INTS, BLOCK_FLOATS, BLOCK_BOOLS)
+
+
+def decode(data: bytes, count: int, wanted=None) -> dict:
+    arrays = gorilla.decode_block(data, count, BLOCK_INTS, BLOCK_FLOATS, BLOCK_BOOLS, wanted)
+    if "timestamp" in arrays:
+        arrays["timestamp"] = arrays["timestamp"].astype("datetime64[us]")
+    return arrays
+
+
+def _raw_tables(start: datetime, end: datetime) -> list:
+    tables = [MotorReading.__table__]
+    if settings.READINGS_PARTITIONED:
+        tables += reading_partitions.tables(start, end)
+    return tables
+
+
+def _blocks(arrays: dict, attributions: dict) -> list:
+    """Split column arrays (sorted by timestamp) into per-minute block rows"""
+    ts_us = arrays["timestamp"].astype(np.int64)
+    minutes, first = np.unique(ts_us // MINUTE_US, return_index=True)
+    bounds = first.tolist() + [len(ts_us)]
+    rows = []
+    for k, minute in enumerate(minutes):
+        i, j = bounds[k], bounds[k + 1]
+        kept = {str(r): attributions[r] for r in arrays["id"][i:j].tolist() if r in attributions}
+        rows.append({
+            "minute": np.datetime64(int(minute) * MINUTE_US, "us").astype(datetime),
+            "count": j - i,
+            "data": encode({c: arrays[c][i:j] for c in BLOCK_COLUMNS}),
+            "attributions": json.dumps(kept) if kept else None,
+        })
+    return rows
+
+
+def _attributions(text_value) -> dict:
+    return {int(k): v for k, v in json.loads(text_value).items()} if text_value else {}
+
+
+async def _compact_span(session, start: datetime, end: datetime) -> int:
+    table = MotorReading.__table__
+    source = readings_table(start, end)
+    rows = (await session.execute(
+        select(*[source.c[c] for c in BLOCK_COLUMNS], source.c.anomaly_attribution).where(
+            source.c.timestamp >= start, source.c.timestamp < end
+        ).order_by(source.c.timestamp)
+    )).all()
+    if not rows:
+        return 0
+    values = list(zip(*rows))
+    chunks = [{c: to_array(table.c[c], v) for c, v in zip(BLOCK_COLUMNS, values)}]
+    attributions = {i: a for i, a in zip(chunks[0]["id"].tolist(), values[-1]) if a}
+
+    # Lecturas tardías de minutos ya compactados: se fusionan con el bloque existente
+    existing = (await session.execute(
+        select(reading_blocks.c.count, reading_blocks.c.data, reading_blocks.c.attributions).where(
+            reading_blocks.c.minute >= start, reading_blocks.c.minute < end
+        )
+    )).all()
+    chunks += [decode(data, count) for count, data, _ in existing]
+    for *_, kept in existing:
+        attributions.update(_attributions(kept))
+    arrays = {c: np.concatenate([chunk[c] for chunk in chunks]) for c in BLOCK_COLUMNS}
+    order = np.argsort(arrays["timestamp"], kind="stable")
+    arrays = {c: values[order] for c, values in arrays.items()}
+
+    await session.execute(delete(reading_blocks).where(
+        reading_blocks.c.minute >= start, reading_blocks.c.minute < end
+    ))
+    await session.execute(insert(reading_blocks), _blocks(arrays, attributions))
+    for raw in _raw_tables(start, end):
+        await session.execute(delete(raw).where(raw.c.timestamp >= start, raw.c.timestamp < end))
+    return len(rows)
+
+
+async def compact_readings(before: datetime) -> int:
+    """Move raw readings older than `before` (floored to the minute) into blocks; returns rows moved"""
+    cutoff = _minute(before)
+    moved = 0
+
+    async def compact_next(session):
+        source = readings_table(None, cutoff)
+        first = (await session.execute(
+            select(func.min(source.c.timestamp)).where(source.c.timestamp < cutoff)
+        )).scalar()
+        if first is None:
+            return None
+        start = _minute(first)
+        return await _compact_span(session, start, min(start + COMPACT_SPAN, cutoff))
+
+    while True:
+        rows = await db_writer.submit(compact_next, PRIORITY_BACKGROUND)
+        if rows is None:
+            return moved
+        moved += rows
+        # Ceder el writer a la ingesta entre transacciones
+        await asyncio.sleep(settings.RETENTION_BATCH_PAUSE)
+
+
+async def has_blocks(session, start: datetime, end: datetime) -> bool:
+    minute = reading_blocks.c.minute
+    query = select(minute).where(minute >= _minute(start), minute <= end).limit(1)
+    return (await session.execute(query)).first() is not None
+
+
+def _decode_range(blocks: list, columns: list, start: datetime, end: datetime) -> dict:
+    wanted = set(columns) | {"timestamp"}
+    chunks = [decode(data, count, wanted) for count, data in blocks]
+    arrays = {c: np.concatenate([chunk[c] for chunk in chunks]) for c in wanted}
+    ts = arrays["timestamp"]
+    mask = (ts >= np.datetime64(start, "us")) & (ts <= np.datetime64(end, "us"))
+    return {c: arrays[c][mask] for c in columns}
+
+
+async def read_blocks(session, columns: list, start: datetime, end: datetime):
+    """
+    Requested columns for compacted readings with start <= timestamp <= end
+    Returns: {column: array}, or None when no block overlaps the range
+    """
+    unknown = set(columns) - set(BLOCK_COLUMNS)
+    if unknown:
+        raise ValueError(f"Columns not stored in reading blocks: {sorted(unknown)}")
+    blocks = (await session.execute(
+        select(reading_blocks.c.count, reading_blocks.c.data).where(
+            reading_blocks.c.minute >= _minute(start), reading_blocks.c.minute <= end
+        ).order_by(reading_blocks.c.minute)
+    )).all()
+    if not blocks:
+        return None
+    # Decodificar es CPU: fuera del event loop
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _decode_range, blocks, columns, start, end)
+
+
+def _decode_rows(blocks: list, start: datetime, end: datetime, before, anomalies_only: bool) -> list:
+    """Block rows -> reading dicts in range (and before the (timestamp, id) key), newest first"""
+    rows = []
+    for count, data, kept in blocks:
+        arrays = decode(data, count)
+        attributions = _attributions(kept)
+        ts = arrays["timestamp"]
+        mask = (ts >= np.datetime64(start, "us")) & (ts <= np.datetime64(end, "us"))
+        if before is not None:
+            key_ts = np.datetime64(before[0], "us")
+            mask &= (ts < key_ts) | ((ts == key_ts) & (arrays["id"] < before[1]))
+        if anomalies_only:
+            mask &= arrays["is_anomaly"] & np.isin(arrays["id"], list(attributions))
+        columns = {c: arrays[c][mask].tolist() for c in BLOCK_COLUMNS}
+        for values in zip(*columns.values()):
+            row = dict(zip(BLOCK_COLUMNS, values))
+            for field in BLOCK_FLOATS:
+                # NaN en el bloque = NULL en la tabla cruda
+                if row[field] != row[field]:
+                    row[field] = None
+            row["anomaly_attribution"] = attributions.get(row["id"])
+            rows.append(row)
+    rows.sort(key=lambda r: (r["timestamp"], r["id"]), reverse=True)
+    return rows
+
+
+async def read_rows(session, start: datetime, end: datetime, before=None, limit: int = 100,
+                    anomalies_only: bool = False) -> list:
+    """
+    Up to `limit` compacted readings as row dicts, newest first
+    before: (timestamp, id) key of a cursor; only older rows are returned
+    Blocks are decoded a few minutes at a time, newest first, until the page is full
+    """
+    minute = reading_blocks.c.minute
+    upper = min(end, before[0]) if before is not None else end
+    query = select(minute, reading_blocks.c.count, reading_blocks.c.data, reading_blocks.c.attributions).where(
+        minute >= _minute(start), minute <= upper
+    ).order_by(desc(minute))
+    # Bloques de ~60 lecturas: con limit/60 + 2 minutos suele bastar una vuelta
+    step = limit // 60 + 2
+    loop = asyncio.get_running_loop()
+    rows = []
+    while len(rows) < limit:
+        blocks = (await session.execute(query.limit(step))).all()
+        if not blocks:
+            break
+        rows += await loop.run_in_executor(
+            None, _decode_rows, [b[1:] for b in blocks], start, end, before, anomalies_only
+        )
+        if len(blocks) < step:
+            break
+        query = query.where(minute < blocks[-1].minute)
+        step *= 2
+    return rows[:limit]
@@ -5,7 +5,6 @@ Analiza datos históricos y genera reportes personalizados
 from fastapi import APIRouter, Depends, HTTPException
 from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 from typing import Optional
@@ -19,7 +18,8 @@ from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, Tabl
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
 import re
 
-from app.database import get_db, MotorReading, Alert
+from app.database import get_read_db
+from app.analytics import load_report_statistics
 from app.ai_agent import OllamaAgent
 
 router = APIRouter(prefix="/api/reports", tags=["reports"])
@@ -67,7 +67,7 @@ class ReportResponse(BaseModel):
 @router.post("/generate", response_model=ReportResponse)
 async def generate_report(
     request: ReportRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Genera un reporte usando IA basado en datos históricos
@@ -82,36 +82,18 @@ async def generate_report(
     else:
         start_time = request.start_time
     
-    # Consultar datos históricos
-    query = select(MotorReading).where(
-        MotorReading.timestamp >= start_time,
-        MotorReading.timestamp <= end_time
-    ).order_by(MotorReading.timestamp)
+    # Calcular estadísticas (base activa + archivo frío)
+    stats = await load_report_statistics(db, start_time, end_time)
     
-    result = await db.execute(query)
-    readings = result.scalars().all()
-    
-    if not readings:
+    if not stats:
         raise HTTPException(
             status_code=404,
             detail=f"No se encontraron datos entre {start_time} y {end_time}"
         )
     
-    # Consultar alertas del período
-    alert_query = select(Alert).where(
-        Alert.timestamp >= start_time,
-        Alert.timestamp <= end_time
-    ).order_by(Alert.timestamp)
-    
-    alert_result = await db.execute(alert_query)
-    alerts = alert_result.scalars().all()
-    
     # Detectar variables específicas solicitadas
     requested_vars = detect_requested_variables(request.prompt)
     
-    # Calcular estadísticas
-    stats = calculate_statistics(readings, alerts)
-    
     # Filtrar estadísticas según variables solicitadas
     if 'all' not in requested_vars:
         filtered_stats = filter_statistics(stats, requested_vars)
@@ -124,8 +106,8 @@ async def generate_report(
         prompt=request.prompt,
         statistics=filtered_stats,
         time_range={"start": start_time.isoformat(), "end": end_time.isoformat()},
-        readings_count=len(readings),
-        alerts_count=len(alerts),
+        readings_count=stats["total_readings"],
+        alerts_count=stats["alerts"]["total"],
         requested_variables=requested_vars
     )
     
@@ -171,124 +153,6 @@ def extract_time_range(prompt: str, end_time: datetime) -> datetime:
     # Por defecto: últimas 24 horas
     return end_time - timedelta(hours=24)
 
-def calculate_statistics(readings: list, alerts: list) -> dict:
-    """
-    Calcula estadísticas del período incluyendo análisis temporal por hora
-    """
-    if not readings:
-        return {}
-    
-    from collections import defaultdict
-    
-    # Calcular promedios y rangos
-    temperatures = [r.temperature for r in readings if r.temperature is not None]
-    vibrations = [r.vibration for r in readings if r.vibration is not None]
-    rpms = [r.rpm for r in readings if r.rpm is not None]
-    
-    # Voltajes por fase
-    voltage_a = [r.voltage_a for r in readings if r.voltage_a is not None]
-    voltage_b = [r.voltage_b for r in readings if r.voltage_b is not None]
-    voltage_c = [r.voltage_c for r in readings if r.voltage_c is not None]
-    
-    # Corrientes por fase
-    current_a = [r.current_a for r in readings if r.current_a is not None]
-    current_b = [r.current_b for r in readings if r.current_b is not None]
-    current_c = [r.current_c for r in readings if r.current_c is not None]
-    
-    # Alertas por severidad
-    alerts_by_severity = {
-        "critical": len([a for a in alerts if a.severity == "critical"]),
-        "warning": len([a for a in alerts if a.severity == "warning"]),
-        "info": len([a for a in alerts if a.severity == "info"])
-    }
-    
-    # Alertas por categoría
-    alerts_by_category = {}
-    for alert in alerts:
-        category = alert.category
-        alerts_by_category[category] = alerts_by_category.get(category, 0) + 1
-    
-    # ===== ANÁLISIS TEMPORAL POR HORA =====
-    hourly_data = defaultdict(lambda: {
-        'temperatures': [], 'vibrations': [], 'rpms': [],
-        'alerts': 0, 'critical_alerts': 0
-    })
-    
-    # Agrupar datos por hora
-    for r in readings:
-        hour_key = r.timestamp.replace(minute=0, second=0, microsecond=0)
-        if r.temperature: hourly_data[hour_key]['temperatures'].append(r.temperature)
-        if r.vibration: hourly_data[hour_key]['vibrations'].append(r.vibration)
-        if r.rpm: hourly_data[hour_key]['rpms'].append(r.rpm)
-    
-    # Agrupar alertas por hora
-    for alert in alerts:
-        hour_key = alert.timestamp.replace(minute=0, second=0, microsecond=0)
-        if hour_key in hourly_data:
-            hourly_data[hour_key]['alerts'] += 1
-            if alert.severity == 'critical':
-                hourly_data[hour_key]['critical_alerts'] += 1
-    
-    # Calcular estadísticas por hora
-    hourly_stats = []
-    for hour, data in sorted(hourly_data.items()):
-        if data['vibrations'] or data['temperatures']:
-            hourly_stats.append({
-                'hour': hour.strftime('%Y-%m-%d %H:%M'),
-                'temperature_avg': round(sum(data['temperatures']) / len(data['temperatures']), 2) if data['temperatures'] else 0,
-                'temperature_max': round(max(data['temperatures']), 2) if data['temperatures'] else 0,
-                'vibration_avg': round(sum(data['vibrations']) / len(data['vibrations']), 2) if data['vibrations'] else 0,
-                'vibration_max': round(max(data['vibrations']), 2) if data['vibrations'] else 0,
-                'rpm_avg': round(sum(data['rpms']) / len(data['rpms']), 0) if data['rpms'] else 0,
-                'alerts': data['alerts'],
-                'critical_alerts': data['critical_alerts']
-            })
-    
-    # Identificar horas críticas (vibración > 8 o temperatura > 70 o alertas críticas > 0)
-    critical_hours = [
-        h for h in hourly_stats 
-        if h['vibration_max'] > 8 or h['temperature_max'] > 70 or h['critical_alerts'] > 0
-    ]
-    
-    stats = {
-        "total_readings": len(readings),
-        "temperature": {
-            "avg": round(sum(temperatures) / len(temperatures), 2) if temperatures else 0,
-            "min": round(min(temperatures), 2) if temperatures else 0,
-            "max": round(max(temperatures), 2) if temperatures else 0
-        },
-        "vibration": {
-            "avg": round(sum(vibrations) / len(vibrations), 2) if vibrations else 0,
-            "min": round(min(vibrations), 2) if vibrations else 0,
-            "max": round(max(vibrations), 2) if vibrations else 0
-        },
-        "rpm": {
-            "avg": round(sum(rpms) / len(rpms), 0) if rpms else 0,
-            "min": round(min(rpms), 0) if rpms else 0,
-            "max": round(max(rpms), 0) if rpms else 0
-        },
-        "phase_a": {
-            "voltage_avg": round(sum(voltage_a) / len(voltage_a), 2) if voltage_a else 0,
-            "current_avg": round(sum(current_a) / len(current_a), 2) if current_a else 0
-        },
-        "phase_b": {
-            "voltage_avg": round(sum(voltage_b) / len(voltage_b), 2) if voltage_b else 0,
-            "current_avg": round(sum(current_b) / len(current_b), 2) if current_b else 0
-        },
-        "phase_c": {
-            "voltage_avg": round(sum(voltage_c) / len(voltage_c), 2) if voltage_c else 0,
-            "current_avg": round(sum(current_c) / len(current_c), 2) if current_c else 0
-        },
-        "alerts": {
-            "total": len(alerts),
-            "by_severity": alerts_by_severity,
-            "by_category": alerts_by_category
-        },
-        "hourly_analysis": hourly_stats,
-        "critical_hours": critical_hours
-    }
-    
-    return stats
 def filter_statistics(stats: dict, requested_vars: list) -> dict:
     """
     Filtra las estadísticas para incluir solo las variables solicitadas
@@ -441,7 +305,7 @@ def markdown_to_pdf(markdown_text: str, title: str = "Reporte de Motor") -> io.B
 @router.post("/generate-pdf")
 async def generate_pdf_report(
     request: ReportRequest,
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """
     Genera un reporte en formato PDF
@@ -454,36 +318,18 @@ async def generate_pdf_report(
     else:
         start_time = request.start_time
     
-    # Consultar datos históricos
-    query = select(MotorReading).where(
-        MotorReading.timestamp >= start_time,
-        MotorReading.timestamp <= end_time
-    ).order_by(MotorReading.timestamp)
-    
-    result = await db.execute(query)
-    readings = result.scalars().all()
+    # Calcular estadísticas (base activa + archivo frío)
+    stats = await load_report_statistics(db, start_time, end_time)
     
-    if not readings:
+    if not stats:
         raise HTTPException(
             status_code=404,
             detail=f"No se encontraron datos entre {start_time} y {end_time}"
         )
     
-    # Consultar alertas
-    alert_query = select(Alert).where(
-        Alert.timestamp >= start_time,
-        Alert.timestamp <= end_time
-    ).order_by(Alert.timestamp)
-    
-    alert_result = await db.execute(alert_query)
-    alerts = alert_result.scalars().all()
-    
     # Detectar variables solicitadas
     requested_vars = detect_requested_variables(request.prompt)
     
-    # Calcular estadísticas
-    stats = calculate_statistics(readings, alerts)
-    
     # Filtrar estadísticas según variables solicitadas
     if 'all' not in requested_vars:
         filtered_stats = filter_statistics(stats, requested_vars)
@@ -496,8 +342,8 @@ async def generate_pdf_report(
         prompt=request.prompt,
         statistics=filtered_stats,
         time_range={"start": start_time.isoformat(), "end": end_time.isoformat()},
-        readings_count=len(readings),
-        alerts_count=len(alerts),
+        readings_count=stats["total_readings"],
+        alerts_count=stats["alerts"]["total"],
         requested_variables=requested_vars
     )
     
@@ -0,0 +1,173 @@
+"""
+Retention and downsampling policy.
+
+Raw readings are kept for RETENTION_RAW_DAYS, 1-minute rollups for
+RETENTION_ROLLUP_1M_DAYS and hourly rollups for RETENTION_ROLLUP_1H_DAYS
+(0 = forever). Expired rows are deleted in small batches, each in its own
+short transaction, so ingestion never waits long for the write lock.
+With the cold archive enabled, closed days are exported first and raw rows
+are only deleted once their day is in the cold tier. With day partitions,
+expired days are dropped as whole tables. With reading blocks enabled, raw
+rows older than READING_BLOCKS_AFTER_HOURS are compacted into compressed
+per-minute blocks, which expire with the raw tier. Resolved alerts older
+than ALERTS_ARCHIVE_DAYS move to alerts_archive, so `alerts` only holds
+active and recently resolved ones.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, insert, func, literal, DateTime
+
+from app.config import settings
+from app.cold_archive import cold_archive, export_closed_days
+from app.partitions import reading_partitions
+from app.reading_blocks import compact_readings
+from app.db_writer import db_writer, write_log, PRIORITY_BACKGROUND
+from app.database import (
+    MotorReading, Alert, AlertArchive,
+    reading_rollups_1m, reading_rollups_1h, reading_blocks, spectral_features
+)
+
+
+def retention_tiers() -> list:
+    """(name, table, timestamp column, key column, days) for each tier"""
+    return [
+        ("raw", MotorReading.__table__, MotorReading.timestamp, MotorReading.id, settings.RETENTION_RAW_DAYS),
+        ("blocks", reading_blocks, reading_blocks.c.minute, reading_blocks.c.minute, settings.RETENTION_RAW_DAYS),
+        ("spectral", spectral_features, spectral_features.c.timestamp, spectral_features.c.id, settings.RETENTION_RAW_DAYS),
+        ("rollup_1m", reading_rollups_1m, reading_rollups_1m.c.bucket, reading_rollups_1m.c.bucket, settings.RETENTION_ROLLUP_1M_DAYS),
+        ("rollup_1h", reading_rollups_1h, reading_rollups_1h.c.bucket, reading_rollups_1h.c.bucket, settings.RETENTION_ROLLUP_1H_DAYS),
+    ]
+
+
+async def delete_expired(table, ts_column, key_column, cutoff: datetime) -> int:
+    """Delete rows older than cutoff in batches of RETENTION_BATCH_SIZE"""
+    removed = 0
+    batch_size = settings.RETENTION_BATCH_SIZE
+
+    async def delete_batch(session):
+        keys = select(key_column).where(ts_column < cutoff).limit(batch_size)
+        return (await session.execute(delete(table).where(key_column.in_(keys)))).rowcount
+
+    while True:
+        rowcount = await db_writer.submit(delete_batch, PRIORITY_BACKGROUND)
+        removed += rowcount
+        if rowcount < batch_size:
+            return removed
+        # Ceder el writer a la ingesta entre lotes
+        await asyncio.sleep(settings.RETENTION_BATCH_PAUSE)
+
+
+async def archive_resolved_alerts(cutoff: datetime) -> int:
+    """Move alerts resolved before cutoff to alerts_archive in batches; returns alerts moved"""
+    alerts = Alert.__table__
+    columns = [c.name for c in alerts.columns]
+    resolved_before = (Alert.resolved == True) & (func.coalesce(Alert.resolved_at, Alert.timestamp) < cutoff)
+    moved = 0
+    batch_size = settings.RETENTION_BATCH_SIZE
+
+    async def archive_batch(session):
+        ids = (await session.execute(select(Alert.id).where(resolved_before).limit(batch_size))).scalars().all()
+        if ids:
+            rows = select(*[alerts.c[c] for c in columns], literal(datetime.utcnow(), DateTime)).where(alerts.c.id.in_(ids))
+            await session.execute(insert(AlertArchive).from_select(columns + ["archived_at"], rows))
+            await session.execute(delete(alerts).where(alerts.c.id.in_(ids)))
+        return ids
+
+    while True:
+        ids = await db_writer.submit(archive_batch, PRIORITY_BACKGROUND)
+        moved += len(ids)
+        if len(ids) < batch_size:
+            return moved
+        await asyncio.sleep(settings.RETENTION_BATCH_PAUSE)
+
+
+async def _file_stats(conn) -> dict:
+    stats = {}
+    for pragma in ("page_count", "page_size", "freelist_count", "auto_vacuum"):
+        stats[pragma] = (await conn.exec_driver_sql(f"PRAGMA {pragma}")).scalar()
+    return stats
+
+
+async def _vacuum_step(session) -> dict:
+    """Writer job: free up to RETENTION_VACUUM_PAGES pages, then report the file stats"""
+    conn = await session.connection()
+    free = (await conn.exec_driver_sql("PRAGMA freelist_count")).scalar()
+    # sqlite3 ejecuta un solo paso por execute() y cada paso del pragma libera una página
+    # (executescript lo completaría, pero hace commit de la transacción del writer)
+    for _ in range(min(free, settings.RETENTION_VACUUM_PAGES)):
+        await conn.exec_driver_sql("PRAGMA incremental_vacuum(1)")
+    return await _file_stats(conn)
+
+
+async def reclaim_space() -> int:
+    """Return free pages to the OS with incremental vacuum; returns bytes reclaimed"""
+    async def file_stats(session):
+        return await _file_stats(await session.connection())
+
+    before = await db_writer.submit(file_stats, PRIORITY_BACKGROUND)
+    if before["auto_vacuum"] != 2:
+        # Sin auto_vacuum=INCREMENTAL las páginas libres quedan para reutilización interna
+        return 0
+    stats = before
+    # Pasos acotados en el writer único (prioridad de fondo), cediendo a la ingesta entre ellos
+    while stats["freelist_count"]:
+        previous = stats["freelist_count"]
+        stats = await db_writer.submit(_vacuum_step, PRIORITY_BACKGROUND)
+        if stats["freelist_count"] >= previous:
+            break
+        await asyncio.sleep(settings.RETENTION_BATCH_PAUSE)
+    return (before["page_count"] - stats["page_count"]) * before["page_size"]
+
+
+async def run_retention(now: datetime = None) -> dict:
+    """Apply every retention tier once and report what was removed"""
+    now = now or datetime.utcnow()
+    started = time.perf_counter()
+    report = {}
+
+    if settings.COLD_ARCHIVE_ENABLED:
+        report["cold_days_exported"] = await export_closed_days(now)
+
+    if settings.READING_BLOCKS_ENABLED:
+        compact_before = now - timedelta(hours=settings.READING_BLOCKS_AFTER_HOURS)
+        if settings.COLD_ARCHIVE_ENABLED:
+            # Los bloques solo toman días ya exportados: la exportación lee la tabla cruda
+            archived_until = cold_archive.watermark(MotorReading.__tablename__)
+            compact_before = min(compact_before, archived_until) if archived_until else None
+        report["rows_compacted"] = await compact_readings(compact_before) if compact_before else 0
+
+    if settings.ALERTS_ARCHIVE_DAYS > 0:
+        report["alerts_archived"] = await archive_resolved_alerts(now - timedelta(days=settings.ALERTS_ARCHIVE_DAYS))
+
+    for name, table, ts_column, key_column, days in retention_tiers():
+        cutoff = now - timedelta(days=days) if days > 0 else None
+        if cutoff and name in ("raw", "blocks") and settings.COLD_ARCHIVE_ENABLED:
+            # Nunca borrar lecturas que aún no están en el nivel frío
+            archived_until = cold_archive.watermark(MotorReading.__tablename__)
+            cutoff = min(cutoff, archived_until) if archived_until else None
+        if cutoff is None:
+            report[f"{name}_rows_removed"] = 0
+            continue
+        if name == "raw" and settings.READINGS_PARTITIONED:
+            # Días completos: DROP TABLE de la partición, sin borrar fila por fila
+            report["raw_partitions_dropped"] = await reading_partitions.drop_before(cutoff)
+        report[f"{name}_rows_removed"] = await delete_expired(table, ts_column, key_column, cutoff)
+
+    report["bytes_reclaimed"] = await reclaim_space()
+    report["duration_seconds"] = round(time.perf_counter() - started, 3)
+
+    print(f"🧹 Retention: {report}")
+    await write_log("info", "database", "Retention job completed", report)
+    return report
+
+
+async def retention_loop():
+    """Background job: apply retention every RETENTION_INTERVAL seconds"""
+    while True:
+        try:
+            await run_retention()
+        except Exception as e:
+            print(f"Error in retention job: {e}")
+        await asyncio.sleep(settings.RETENTION_INTERVAL)
@@ -0,0 +1,207 @@
+"""
+Rolling-window temporal features per motor.
+
+Each reading updates running sums in O(1) (amortized) so the detector can see
+trends (slow temperature rise, growing vibration) without rescanning history.
+"""
+import math
+from collections import deque
+from pathlib import Path
+
+import joblib
+import numpy as np
+
+# Campos con seguimiento temporal
+ROLLING_FIELDS = ("temperature", "vibration", "current_avg")
+
+# Ventanas de pendiente (segundos): 1, 5 y 15 minutos
+SLOPE_WINDOWS = (60, 300, 900)
+STD_WINDOW = 300
+EWMA_TAU = 60.0
+# Cobertura mínima de una ventana para reportar std/pendiente (tras un hueco quedan 2-3 puntos)
+MIN_WINDOW_POINTS = 10
+MIN_WINDOW_SPAN = 0.5  # fracción de la ventana
+
+
+def _field_value(field: str, data: dict) -> float:
+    if field == "current_avg":
+        return (data["current_a"] + data["current_b"] + data["current_c"]) / 3
+    return float(data[field])
+
+
+def feature_names() -> list:
+    """Names of the rolling features, in feature-vector order"""
+    names = []
+    for field in ROLLING_FIELDS:
+        names.append(f"{field}_ewma")
+        names.append(f"{field}_std_{STD_WINDOW // 60}m")
+        for window in SLOPE_WINDOWS:
+            names.append(f"{field}_slope_{window // 60}m")
+        names.append(f"{field}_rate")
+    return names
+
+
+class _Window:
+    """Time window with running sums for mean, variance and least-squares slope"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.points = deque()
+        self.n = 0
+        self.st = self.sx = self.stt = self.stx = self.sxx = 0.0
+
+    def push(self, t: float, x: float):
+        self.points.append((t, x))
+        self.n += 1
+        self.st += t
+        self.sx += x
+        self.stt += t * t
+        self.stx += t * x
+        self.sxx += x * x
+        while self.points and t - self.points[0][0] > self.seconds:
+            old_t, old_x = self.points.popleft()
+            self.n -= 1
+            self.st -= old_t
+            self.sx -= old_x
+            self.stt -= old_t * old_t
+            self.stx -= old_t * old_x
+            self.sxx -= old_x * old_x
+
+    def covered(self) -> bool:
+        """Enough points spread over enough of the window for a stable estimate"""
+        if self.n < MIN_WINDOW_POINTS:
+            return False
+        return self.points[-1][0] - self.points[0][0] >= self.seconds * MIN_WINDOW_SPAN
+
+    def std(self) -> float:
+        if not self.covered():
+            return 0.0
+        var = (self.sxx - self.sx * self.sx / self.n) / (self.n - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+    def slope(self) -> float:
+        """Least-squares slope in units per minute (0 until the window is covered)"""
+        if not self.covered():
+            return 0.0
+        denom = self.n * self.stt - self.st * self.st
+        if denom <= 1e-9:
+            return 0.0
+        return (self.n * self.stx - self.st * self.sx) / denom * 60.0
+
+
+class _FieldState:
+    def __init__(self):
+        self.ewma = None
+        self.last_t = None
+        self.last_x = None
+        self.rate = 0.0
+        self.std_window = _Window(STD_WINDOW)
+        self.slope_windows = [_Window(w) for w in SLOPE_WINDOWS]
+
+    def update(self, t: float, x: float):
+        if self.ewma is None:
+            self.ewma = x
+        else:
+            dt = max(t - self.last_t, 0.0)
+            alpha = 1.0 - math.exp(-dt / EWMA_TAU)
+            self.ewma += alpha * (x - self.ewma)
+            # Tasa de cambio por minuto respecto a la lectura anterior
+            self.rate = (x - self.last_x) / dt * 60.0 if dt > 0 else 0.0
+        self.last_t = t
+        self.last_x = x
+        self.std_window.push(t, x)
+        for window in self.slope_windows:
+            window.push(t, x)
+
+    def features(self) -> list:
+        return [self.ewma, self.std_window.std()] + \
+            [w.slope() for w in self.slope_windows] + [self.rate]
+
+
+class RollingFeatureTracker:
+    """Per-motor rolling statistics (EWMA, rolling std, slopes, rate of change)"""
+
+    def __init__(self, state_path: str = None):
+        self.state_path = Path(state_path) if state_path else None
+        self.motors = {}
+        # Timestamps are stored relative to this origin to keep the sums well conditioned
+        self.origin = None
+
+    def update(self, motor_id: str, timestamp: float, data: dict) -> list:
+        """Add one reading and return the rolling features for that motor"""
+        if self.origin is None:
+            self.origin = timestamp
+        t = timestamp - self.origin
+        fields = self.motors.get(motor_id)
+        if fields is None:
+            fields = self.motors[motor_id] = {f: _FieldState() for f in ROLLING_FIELDS}
+
+        features = []
+        for field in ROLLING_FIELDS:
+            state = fields[field]
+            state.update(t, _field_value(field, data))
+            features.extend(state.features())
+        return features
+
+    def reset(self, motor_id: str):
+        """Forget the window state of one motor"""
+        self.motors.pop(motor_id, None)
+
+    def snapshot(self) -> dict:
+        """Compact snapshot: only the points still inside the longest window"""
+        motors = {}
+        for motor_id, fields in self.motors.items():
+            motors[motor_id] = {}
+            for field, state in fields.items():
+                points = state.slope_windows[-1].points
+                motors[motor_id][field] = {
+                    "ewma": state.ewma,
+                    "rate": state.rate,
+                    "points": np.array(points, dtype=np.float64).reshape(-1, 2) + [self.origin, 0.0],
+                }
+        return {"version": 1, "motors": motors}
+
+    def restore(self, snapshot: dict, now: float = None):
+        """Rebuild window state from a snapshot, dropping points older than the longest window"""
+        self.motors = {}
+        self.origin = None
+        horizon = max(SLOPE_WINDOWS)
+        for motor_id, fields in snapshot.get("motors", {}).items():
+            for field, saved in fields.items():
+                if field not in ROLLING_FIELDS:
+                    continue
+                points = saved["points"]
+                if now is not None:
+                    points = points[points[:, 0] >= now - horizon]
+                if len(points) == 0:
+                    continue
+                if self.origin is None:
+                    self.origin = float(points[0, 0])
+                state = self.motors.setdefault(
+                    motor_id, {f: _FieldState() for f in ROLLING_FIELDS}
+                )[field]
+                for t, x in points:
+                    state.update(float(t) - self.origin, float(x))
+                state.ewma = saved["ewma"]
+                state.rate = saved["rate"]
+
+    def save(self):
+        """Persist the window snapshot to disk"""
+        if not self.state_path:
+            return
+        try:
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            joblib.dump(self.snapshot(), self.state_path)
+        except Exception as e:
+            print(f"Error saving rolling state: {e}")
+
+    def load(self, now: float = None):
+        """Load the window snapshot from disk if present"""
+        try:
+            if self.state_path and self.state_path.exists():
+                self.restore(joblib.load(self.state_path), now=now)
+                print(f"Rolling state loaded from {self.state_path}")
+        except Exception as e:
+            print(f"Error loading rolling state: {e}")
+            self.motors = {}
+            self.origin = None
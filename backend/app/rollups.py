@@ -0,0 +1,312 @@
+"""
+Incrementally maintained 1-minute and 1-hour rollups of motor readings.
+
+Ingestion folds each batch into the rollup rows with an upsert, so range
+statistics can read a handful of pre-aggregated buckets instead of every raw
+reading. Only the partial buckets at the edges of a range touch raw rows.
+"""
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, delete, func, and_, case, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.config import settings
+from app.database import READING_FIELDS, reading_rollups_1m, reading_rollups_1h
+from app.partitions import readings_table, readings_sql
+from app.reading_blocks import read_blocks
+
+MINUTE = timedelta(minutes=1)
+HOUR = timedelta(hours=1)
+
+ROLLUP_TABLES = {
+    "1m": (reading_rollups_1m, MINUTE),
+    "1h": (reading_rollups_1h, HOUR),
+}
+
+# Formato que SQLAlchemy usa para DateTime en SQLite (mismo PK desde SQL y Python)
+_SQL_BUCKET_FORMAT = {
+    "1m": "%Y-%m-%d %H:%M:00.000000",
+    "1h": "%Y-%m-%d %H:00:00.000000",
+}
+_SQL_TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def _floor(ts: datetime, step: timedelta) -> datetime:
+    if step == HOUR:
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(second=0, microsecond=0)
+
+
+def _ceil(ts: datetime, step: timedelta) -> datetime:
+    floored = _floor(ts, step)
+    return floored if floored == ts else floored + step
+
+
+def _aggregate_batch(rows: list, step: timedelta) -> dict:
+    """Fold (timestamp, data) rows into per-bucket aggregates"""
+    buckets = {}
+    for timestamp, data in rows:
+        bucket = _floor(timestamp, step)
+        agg = buckets.get(bucket)
+        if agg is None:
+            agg = buckets[bucket] = {"bucket": bucket, "count": 0, "anomaly_count": 0}
+        agg["count"] += 1
+        if data.get("is_anomaly"):
+            agg["anomaly_count"] += 1
+        for field in READING_FIELDS:
+            value = data.get(field)
+            if value is None:
+                continue
+            if f"{field}_sum" not in agg:
+                agg[f"{field}_sum"] = agg[f"{field}_sumsq"] = 0.0
+                agg[f"{field}_min"] = agg[f"{field}_max"] = value
+            agg[f"{field}_sum"] += value
+            agg[f"{field}_sumsq"] += value * value
+            agg[f"{field}_min"] = min(agg[f"{field}_min"], value)
+            agg[f"{field}_max"] = max(agg[f"{field}_max"], value)
+    return buckets
+
+
+async def apply_readings(session, rows: list):
+    """
+    Fold a batch of (timestamp, data) readings into both rollup levels
+    Runs inside the caller's transaction so rollups commit together with the raw rows
+    """
+    if not rows:
+        return
+
+    for table, step in ROLLUP_TABLES.values():
+        for agg in _aggregate_batch(rows, step).values():
+            stmt = sqlite_insert(table).values(**agg)
+            excluded = stmt.excluded
+            updates = {
+                "count": table.c.count + excluded.count,
+                "anomaly_count": table.c.anomaly_count + excluded.anomaly_count,
+            }
+            for field in READING_FIELDS:
+                if f"{field}_sum" not in agg:
+                    continue
+                updates[f"{field}_sum"] = func.coalesce(table.c[f"{field}_sum"], 0) + excluded[f"{field}_sum"]
+                updates[f"{field}_sumsq"] = func.coalesce(table.c[f"{field}_sumsq"], 0) + excluded[f"{field}_sumsq"]
+                # min()/max() escalares de SQLite devuelven NULL si algún argumento es NULL
+                updates[f"{field}_min"] = func.min(
+                    func.coalesce(table.c[f"{field}_min"], excluded[f"{field}_min"]), excluded[f"{field}_min"]
+                )
+                updates[f"{field}_max"] = func.max(
+                    func.coalesce(table.c[f"{field}_max"], excluded[f"{field}_max"]), excluded[f"{field}_max"]
+                )
+            await session.execute(stmt.on_conflict_do_update(index_elements=["bucket"], set_=updates))
+
+
+async def rebuild_rollups(session) -> dict:
+    """
+    Recreate the rollup buckets still covered by raw readings
+    Older buckets (raw rows already expired or compacted) are kept as they are:
+    they are the only copy of that history. Returns {resolution: (from, to)} rebuilt.
+    """
+    first, last = (await session.execute(text(
+        f"SELECT MIN(timestamp), MAX(timestamp) FROM {readings_sql()} WHERE timestamp IS NOT NULL"
+    ))).one()
+    if first is None:
+        return {}
+    first, last = datetime.fromisoformat(str(first)), datetime.fromisoformat(str(last))
+
+    rebuilt = {}
+    for resolution, (table, step) in ROLLUP_TABLES.items():
+        # El bucket del primer dato crudo solo se recalcula si no hay historia anterior en rollups
+        older = (await session.execute(
+            select(func.count()).select_from(table).where(table.c.bucket < _floor(first, step))
+        )).scalar()
+        low = _ceil(first, step) if older else _floor(first, step)
+        high = _floor(last, step) + step
+        if low >= high:
+            continue
+        await session.execute(delete(table).where(and_(table.c.bucket >= low, table.c.bucket < high)))
+        columns = ["bucket", "count", "anomaly_count"]
+        selects = [
+            f"strftime('{_SQL_BUCKET_FORMAT[resolution]}', timestamp) AS bucket",
+            "COUNT(*)",
+            "SUM(CASE WHEN is_anomaly THEN 1 ELSE 0 END)",
+        ]
+        for field in READING_FIELDS:
+            columns += [f"{field}_sum", f"{field}_min", f"{field}_max", f"{field}_sumsq"]
+            selects += [f"SUM({field})", f"MIN({field})", f"MAX({field})", f"SUM({field} * {field})"]
+        await session.execute(text(
+            f"INSERT INTO {table.name} ({', '.join(columns)}) "
+            f"SELECT {', '.join(selects)} FROM {readings_sql(low, high)} "
+            f"WHERE timestamp >= :low AND timestamp < :high GROUP BY bucket"
+        ), {"low": low.strftime(_SQL_TS_FORMAT), "high": high.strftime(_SQL_TS_FORMAT)})
+        rebuilt[resolution] = (low, high)
+    await session.commit()
+    return rebuilt
+
+
+def _plan(start: datetime, end: datetime) -> list:
+    """
+    Split [start, end) into hourly rollups, minute rollups and raw edges
+    Returns: list of (source, segment_start, segment_end)
+    """
+    def minute_plan(s, e):
+        m0, m1 = _ceil(s, MINUTE), _floor(e, MINUTE)
+        if m0 < m1:
+            return [("raw", s, m0), ("1m", m0, m1), ("raw", m1, e)]
+        return [("raw", s, e)]
+
+    h0, h1 = _ceil(start, HOUR), _floor(end, HOUR)
+    if h0 < h1:
+        plan = minute_plan(start, h0) + [("1h", h0, h1)] + minute_plan(h1, end)
+    else:
+        plan = minute_plan(start, end)
+    return [(source, s, e) for source, s, e in plan if s < e]
+
+
+async def aggregate_range(session, fields: list, start: datetime, end: datetime) -> dict:
+    """
+    count/sum/min/max/sumsq per field over [start, end), reading rollups where buckets are complete
+    Returns: {"count": n, "anomaly_count": k, field: {"count", "sum", "min", "max", "sumsq"}}
+    """
+    result = {"count": 0, "anomaly_count": 0}
+    for field in fields:
+        result[field] = {"count": 0, "sum": 0.0, "min": None, "max": None, "sumsq": 0.0}
+
+    for source, seg_start, seg_end in _plan(start, end):
+        if source == "raw":
+            raw = readings_table(seg_start, seg_end)
+            columns = [func.count(), func.sum(case((raw.c.is_anomaly == True, 1), else_=0))]
+            for field in fields:
+                col = raw.c[field]
+                columns += [func.count(col), func.sum(col), func.min(col), func.max(col), func.sum(col * col)]
+            query = select(*columns).where(and_(
+                raw.c.timestamp >= seg_start, raw.c.timestamp < seg_end
+            ))
+        else:
+            table = ROLLUP_TABLES[source][0]
+            columns = [func.sum(table.c.count), func.sum(table.c.anomaly_count)]
+            for field in fields:
+                # Buckets without the field have NULL sums; the bucket count is the closest proxy
+                columns += [
+                    func.sum(case((table.c[f"{field}_sum"].isnot(None), table.c.count), else_=0)),
+                    func.sum(table.c[f"{field}_sum"]),
+                    func.min(table.c[f"{field}_min"]),
+                    func.max(table.c[f"{field}_max"]),
+                    func.sum(table.c[f"{field}_sumsq"]),
+                ]
+            query = select(*columns).where(and_(table.c.bucket >= seg_start, table.c.bucket < seg_end))
+
+        rows = [(await session.execute(query)).one()]
+        if source == "raw" and settings.READING_BLOCKS_ENABLED:
+            # Bordes de rangos antiguos: las lecturas ya compactadas están en reading_blocks
+            blocks = await read_blocks(session, ["timestamp", "is_anomaly"] + fields, seg_start, seg_end)
+            if blocks is not None:
+                rows.append(_block_aggregates(blocks, fields, seg_end))
+        for row in rows:
+            _fold(result, fields, row)
+
+    return result
+
+
+def _block_aggregates(arrays: dict, fields: list, end: datetime) -> list:
+    """Same row shape as the raw SQL aggregate, for block readings with timestamp < end"""
+    keep = arrays["timestamp"] < np.datetime64(end, "us")
+    row = [int(keep.sum()), int(arrays["is_anomaly"][keep].sum())]
+    for field in fields:
+        values = arrays[field][keep]
+        values = values[~np.isnan(values)]
+        if not len(values):
+            row += [0, None, None, None, None]
+            continue
+        row += [len(values), float(values.sum()), float(values.min()), float(values.max()), float((values * values).sum())]
+    return row
+
+
+def _fold(result: dict, fields: list, row):
+    result["count"] += row[0] or 0
+    result["anomaly_count"] += row[1] or 0
+    for i, field in enumerate(fields):
+        count, total, low, high, sumsq = row[2 + 5 * i: 7 + 5 * i]
+        if not count:
+            continue
+        agg = result[field]
+        agg["count"] += count
+        agg["sum"] += total or 0.0
+        agg["sumsq"] += sumsq or 0.0
+        agg["min"] = low if agg["min"] is None else min(agg["min"], low)
+        agg["max"] = high if agg["max"] is None else max(agg["max"], high)
+
+
+def summarize(agg: dict) -> dict:
+    """min/max/avg/std from a field aggregate"""
+    n = agg["count"]
+    if not n:
+        return {"min": None, "max": None, "avg": None, "std": None}
+    avg = agg["sum"] / n
+    var = (agg["sumsq"] - n * avg * avg) / (n - 1) if n > 1 else 0.0
+    return {
+        "min": agg["min"],
+        "max": agg["max"],
+        "avg": avg,
+        "std": math.sqrt(var) if var > 0 else 0.0,
+    }
+
+
+async def get_rollup_series(session, fields: list, start: datetime, end: datetime, resolution: str) -> list:
+    """Bucketed series (avg/min/max per field) straight from a rollup table"""
+    table, _ = ROLLUP_TABLES[resolution]
+    columns = [table.c.bucket, table.c.count, table.c.anomaly_count]
+    for field in fields:
+        columns += [table.c[f"{field}_sum"], table.c[f"{field}_min"], table.c[f"{field}_max"]]
+    query = select(*columns).where(
+        and_(table.c.bucket >= _floor(start, ROLLUP_TABLES[resolution][1]), table.c.bucket < end)
+    ).order_by(table.c.bucket)
+
+    series = []
+    for row in (await session.execute(query)).all():
+        point = {"bucket": row[0], "count": row[1], "anomaly_count": row[2]}
+        for i, field in enumerate(fields):
+            total, low, high = row[3 + 3 * i: 6 + 3 * i]
+            point[field] = {
+                "avg": total / row[1] if total is not None and row[1] else None,
+                "min": low,
+                "max": high,
+            }
+        series.append(point)
+    return series
+
+
+async def minute_averages(session, fields: list, start: datetime, end: datetime) -> dict:
+    """
+    Per-minute averages from the 1-minute rollups, as arrays for distribution statistics
+    Returns: {"count": reading count per bucket, field: average per bucket (NaN without data)}
+    """
+    table = reading_rollups_1m
+    columns = [table.c.count] + [table.c[f"{field}_sum"] for field in fields]
+    query = select(*columns).where(
+        and_(table.c.bucket >= _floor(start, MINUTE), table.c.bucket < end)
+    ).order_by(table.c.bucket)
+    rows = (await session.execute(query)).all()
+
+    counts = np.array([row[0] for row in rows], dtype=np.float64)
+    result = {"count": counts}
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for i, field in enumerate(fields):
+            sums = np.array([row[1 + i] for row in rows], dtype=np.float64)
+            result[field] = sums / counts
+    return result
+
+
+def weighted_percentiles(values: np.ndarray, weights: np.ndarray, percentiles: list) -> dict:
+    """Percentiles of bucket values weighted by their reading counts (NaN buckets skipped)"""
+    mask = ~np.isnan(values) & (weights > 0)
+    if not mask.any():
+        return {f"p{p:g}": None for p in percentiles}
+    order = np.argsort(values[mask])
+    ordered = values[mask][order]
+    cumulative = np.cumsum(weights[mask][order])
+    result = {}
+    for p in percentiles:
+        i = int(np.searchsorted(cumulative, p / 100 * cumulative[-1], side="left"))
+        result[f"p{p:g}"] = float(ordered[min(i, len(ordered) - 1)])
+    return result
+
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, UploadFile, File, Form
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, desc, and_
+from sqlalchemy import select, desc, and_, func
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict
+import asyncio
 import base64
 import io
-from app.database import get_db
-from app.database import MotorReading, Alert, SystemLog, ThresholdSettings as ThresholdSettingsDB
+import json
+import math
+import time
+import numpy as np
+from app.database import get_read_db, read_session_maker
+from app.database import MotorReading, Alert, AlertArchive, SystemLog, ThresholdSettings as ThresholdSettingsDB, READING_FIELDS
 from app.models import (
     MotorReading as MotorReadingSchema,
     Alert as AlertSchema,
@@ -15,141 +20,289 @@ from app.models import (
     ThresholdSettings as ThresholdSettingsSchema,
     ThresholdSettingsUpdate,
     HistoricalDataQuery,
-    AlertQuery
+    AlertQuery,
+    AlertBulkFilter
 )
 from app.ai_agent import OllamaAgent
+from app.config import settings
+from app.waveform_archive import waveform_archive, validate_motor_id
+from app.warmup import warmup_status
+from app.rollups import aggregate_range, summarize, get_rollup_series, minute_averages, weighted_percentiles
+from app.hot_store import hot_store
+from app.cache import summary_cache
+from app.ws_hub import ws_hub
+from app.alert_index import alert_index, ALERT_COLUMNS
+from app.alert_bulk import bulk_alerts, ACTIONS as BULK_ACTIONS
+from app.pagination import paginate, page, decode_cursor
+from app.history import load_rows
+from app.columnar import columnar_response
+from app.downsample import downsample
+from app.batch_ingest import ingest_batch, parse_json, parse_binary, read_body, BatchError, BatchTooLarge
+from app.export import stream_readings, EXPORT_COLUMNS, FORMATS as EXPORT_FORMATS
+from app.db_writer import db_writer, write_log, PRIORITY_USER
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/api", tags=["api"])
 
+PROJECTABLE_FIELDS = READING_FIELDS + ["anomaly_score", "is_anomaly"]
+READING_COLUMNS = [c.name for c in MotorReading.__table__.columns]
+
 @router.get("/readings", response_model=List[MotorReadingSchema])
 async def get_readings(
+    response: Response,
     limit: int = Query(100, ge=1, le=1000),
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get historical motor readings"""
-    query = select(MotorReading).order_by(desc(MotorReading.timestamp))
-    
-    if start_time:
-        query = query.where(MotorReading.timestamp >= start_time)
-    if end_time:
-        query = query.where(MotorReading.timestamp <= end_time)
-    
-    query = query.limit(limit)
-    
-    result = await db.execute(query)
-    readings = result.scalars().all()
+    """
+    Get historical motor readings (newest first; follow X-Next-Cursor for older pages)
+    With fields=a,b: columnar JSON {timestamps, ids, a, b} from a projection of only those columns
+    """
+    field_list = None
+    if fields:
+        field_list = fields.split(",")
+        unknown = [f for f in field_list if f not in PROJECTABLE_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    
+    # Ventanas recientes: desde el hot store en memoria (la primera página)
+    if not cursor:
+        rows = hot_store.window(start_time, end_time, limit + 1)
+        if rows is not None:
+            rows = page(rows, limit, response)
+            return rows if field_list is None else columnar_response(rows, field_list, response.headers)
+    
+    # Filas crudas y bloques compactados (READING_BLOCKS_ENABLED), sin objetos ORM
+    before = decode_cursor(cursor) if cursor else None
+    columns = field_list if field_list is not None else READING_COLUMNS
+    rows = await load_rows(db, columns, start_time, end_time, before, limit + 1)
+    rows = page(rows, limit, response)
+    if field_list is not None:
+        # Proyección: solo las columnas pedidas, sin validación por fila
+        return columnar_response(rows, field_list, response.headers)
+    return rows
+
+@router.get("/readings/export")
+async def export_readings(
+    start_time: datetime,
+    end_time: Optional[datetime] = None,
+    format: str = Query("csv", pattern="^(csv|ndjson|arrow)$"),
+    fields: Optional[str] = None,
+    gzip: bool = False
+):
+    """Stream every reading in [start_time, end_time] as CSV, NDJSON or Arrow (memory does not grow with the range)"""
+    end_time = end_time or datetime.utcnow()
+    if end_time < start_time:
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Arrow export requires pyarrow (pip install pyarrow)")
+    
+    columns = fields.split(",") if fields else EXPORT_COLUMNS
+    unknown = [c for c in columns if c not in EXPORT_COLUMNS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # El timestamp siempre va primero
+    columns = ["timestamp"] + [c for c in columns if c != "timestamp"]
+    
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"readings_{start_time:%Y%m%d%H%M}_{end_time:%Y%m%d%H%M}.{extension}"
+    if gzip:
+        media_type, filename = "application/gzip", filename + ".gz"
+    return StreamingResponse(
+        stream_readings(start_time, end_time, columns, format, gzip),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/readings/downsampled")
+async def get_downsampled_readings(
+    start_time: datetime,
+    end_time: Optional[datetime] = None,
+    fields: Optional[str] = None,
+    points: int = Query(500, ge=10, le=5000),
+    method: str = Query("lttb", pattern="^(lttb|minmax)$"),
+    db: AsyncSession = Depends(get_read_db)
+):
+    """At most `points` points per field for any range (LTTB or avg/min/max buckets) for charts"""
+    end_time = end_time or datetime.utcnow()
+    if end_time < start_time:
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+    field_list = fields.split(",") if fields else ["temperature", "vibration", "rpm"]
+    unknown = [f for f in field_list if f not in READING_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    
+    result = await downsample(db, field_list, start_time, end_time, points, method)
+    return {"start_time": start_time, "end_time": end_time, "points": points, **result}
+
+@router.post("/readings/batch")
+async def ingest_readings_batch(
+    request: Request,
+    motor_id: Optional[str] = None,
+    first_seq: int = 0
+):
+    """
+    Bulk upload of buffered readings (JSON, or application/octet-stream float64 records)
+    Binary records: timestamp (epoch seconds) followed by every reading field; motor_id/first_seq as query params
+    """
+    started = time.perf_counter()
+    binary = request.headers.get("content-type", "").startswith("application/octet-stream")
+    try:
+        # Tamaño acotado antes de leer: no se carga en memoria un cuerpo que se rechazaría
+        body = await read_body(request, binary)
+        if binary:
+            timestamps, values = parse_binary(body)
+        else:
+            body_motor, body_seq, timestamps, values = parse_json(body)
+            motor_id = motor_id or body_motor
+            first_seq = first_seq if body_seq is None else body_seq
+    except BatchTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except BatchError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(values) > settings.INGEST_BATCH_MAX_READINGS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.INGEST_BATCH_MAX_READINGS} readings per batch"
+        )
+    timing = {"parse_ms": (time.perf_counter() - started) * 1000}
     
-    return readings
+    result = await ingest_batch(motor_id, first_seq, timestamps, values, timing)
+    result["timing_ms"]["total_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
 
 @router.get("/readings/latest", response_model=MotorReadingSchema)
-async def get_latest_reading(db: AsyncSession = Depends(get_db)):
+async def get_latest_reading(db: AsyncSession = Depends(get_read_db)):
     """Get the most recent motor reading"""
-    query = select(MotorReading).order_by(desc(MotorReading.timestamp)).limit(1)
-    result = await db.execute(query)
-    reading = result.scalar_one_or_none()
+    reading = hot_store.latest()
+    if reading is not None:
+        return reading
     
-    if not reading:
+    rows = await load_rows(db, READING_COLUMNS, limit=1)
+    if not rows:
         raise HTTPException(status_code=404, detail="No readings found")
     
-    return reading
+    return rows[0]
 
 @router.get("/alerts", response_model=List[AlertSchema])
 async def get_alerts(
+    response: Response,
     limit: int = Query(50, ge=1, le=500),
     severity: Optional[str] = None,
     resolved: Optional[bool] = None,
     start_time: Optional[datetime] = None,
     end_time: Optional[datetime] = None,
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get alerts with optional filtering"""
-    query = select(Alert).order_by(desc(Alert.timestamp))
-    
-    conditions = []
-    if severity:
-        conditions.append(Alert.severity == severity)
-    if resolved is not None:
-        conditions.append(Alert.resolved == resolved)
-    if start_time:
-        conditions.append(Alert.timestamp >= start_time)
-    if end_time:
-        conditions.append(Alert.timestamp <= end_time)
-    
-    if conditions:
-        query = query.where(and_(*conditions))
-    
-    query = query.limit(limit)
-    
-    result = await db.execute(query)
-    alerts = result.scalars().all()
+    """
+    Get alerts with optional filtering (newest first; follow X-Next-Cursor for older pages)
+    Resolved alerts moved to alerts_archive (ALERTS_ARCHIVE_DAYS) are listed too
+    """
+    # Activas: solo la tabla alerts; si no, también el archivo (cada una paginada por su índice)
+    tables = [Alert.__table__] if resolved is False else [Alert.__table__, AlertArchive.__table__]
+    rows = []
+    for table in tables:
+        query = select(*[table.c[c] for c in ALERT_COLUMNS])
+        
+        conditions = []
+        if severity:
+            conditions.append(table.c.severity == severity)
+        if resolved is not None:
+            conditions.append(table.c.resolved == resolved)
+        if start_time:
+            conditions.append(table.c.timestamp >= start_time)
+        if end_time:
+            conditions.append(table.c.timestamp <= end_time)
+        
+        if conditions:
+            query = query.where(and_(*conditions))
+        
+        query = paginate(query, table.c.timestamp, table.c.id, cursor, limit)
+        rows += (await db.execute(query)).all()
     
-    return alerts
+    # El archivo conserva el id original: (timestamp, id) sigue siendo único al mezclar
+    rows = sorted(rows, key=lambda r: (r.timestamp, r.id), reverse=True)[:limit + 1]
+    return page(rows, limit, response)
 
 @router.get("/alerts/active", response_model=List[AlertSchema])
-async def get_active_alerts(db: AsyncSession = Depends(get_db)):
-    """Get all unresolved alerts"""
-    query = select(Alert).where(Alert.resolved == False).order_by(desc(Alert.timestamp))
-    result = await db.execute(query)
-    alerts = result.scalars().all()
-    
-    print(f"📢 API /alerts/active devolvió {len(alerts)} alertas no resueltas")
-    for alert in alerts[:5]:  # Solo imprimir las primeras 5
-        print(f"   - ID: {alert.id} | Categoría: {alert.category} | Severidad: {alert.severity} | Resuelto: {alert.resolved} | Timestamp: {alert.timestamp}")
+async def get_active_alerts(
+    severity: Optional[str] = None,
+    category: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Get all unresolved alerts (from the in-memory index once it is loaded)"""
+    if alert_index.ready:
+        return alert_index.active(severity, category)
     
-    return alerts
+    query = select(Alert).where(Alert.resolved == False)
+    if severity:
+        query = query.where(Alert.severity == severity)
+    if category:
+        query = query.where(Alert.category == category)
+    result = await db.execute(query.order_by(desc(Alert.timestamp), desc(Alert.id)))
+    return result.scalars().all()
 
 @router.post("/alerts/resolve-all")
-async def resolve_all_alerts(db: AsyncSession = Depends(get_db)):
-    """Resolve all unresolved alerts"""
+async def resolve_all_alerts():
+    """Resolve all unresolved alerts (one UPDATE)"""
     try:
-        query = select(Alert).where(Alert.resolved == False)
-        result = await db.execute(query)
-        alerts = result.scalars().all()
-        
-        count = len(alerts)
-        for alert in alerts:
-            alert.resolved = True
-            alert.resolved_at = datetime.now()
-        
-        await db.commit()
+        count = (await bulk_alerts("resolve", AlertBulkFilter()))["count"]
         print(f"✅ Resueltas {count} alertas manualmente")
         
         return {"message": f"Resolved {count} alerts", "count": count}
     except Exception as e:
         print(f"❌ Error al resolver alertas: {e}")
-        await db.rollback()
         raise
 
+@router.post("/alerts/bulk/{action}")
+async def bulk_alert_operation(action: str, filters: AlertBulkFilter):
+    """
+    Resolve, delete or archive every alert matching the filter with one statement
+    Returns: affected count and duration
+    """
+    if action not in BULK_ACTIONS:
+        raise HTTPException(status_code=404, detail=f"Unknown bulk action: {action} ({', '.join(BULK_ACTIONS)})")
+    if action != "resolve" and not filters.model_dump(exclude_none=True):
+        # Borrar o archivar todo el historial requiere un filtro explícito
+        raise HTTPException(status_code=400, detail=f"{action} requires at least one filter")
+    return await bulk_alerts(action, filters)
+
 @router.post("/alerts/{alert_id}/resolve")
-async def resolve_alert(alert_id: int, db: AsyncSession = Depends(get_db)):
+async def resolve_alert(alert_id: int):
     """Mark an alert as resolved"""
-    query = select(Alert).where(Alert.id == alert_id)
-    result = await db.execute(query)
-    alert = result.scalar_one_or_none()
+    async def resolve(db):
+        query = select(Alert).where(Alert.id == alert_id)
+        result = await db.execute(query)
+        alert = result.scalar_one_or_none()
+        
+        if alert:
+            alert.resolved = True
+            alert.resolved_at = datetime.utcnow()
+        return alert
     
-    if not alert:
+    if not await db_writer.submit(resolve, PRIORITY_USER):
         raise HTTPException(status_code=404, detail="Alert not found")
-    
-    alert.resolved = True
-    alert.resolved_at = datetime.utcnow()
-    
-    await db.commit()
+    alert_index.resolve([alert_id])
+    summary_cache.invalidate()
     
     return {"message": "Alert resolved successfully"}
 
 @router.get("/logs", response_model=List[SystemLogSchema])
 async def get_logs(
+    response: Response,
     limit: int = Query(100, ge=1, le=500),
     level: Optional[str] = None,
     source: Optional[str] = None,
     start_time: Optional[datetime] = None,
-    db: AsyncSession = Depends(get_db)
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Get system logs"""
-    query = select(SystemLog).order_by(desc(SystemLog.timestamp))
+    """Get system logs (newest first; follow X-Next-Cursor for older pages)"""
+    query = select(SystemLog)
     
     conditions = []
     if level:
@@ -162,97 +315,182 @@ async def get_logs(
     if conditions:
         query = query.where(and_(*conditions))
     
-    query = query.limit(limit)
+    query = paginate(query, SystemLog.timestamp, SystemLog.id, cursor, limit)
     
     result = await db.execute(query)
     logs = result.scalars().all()
     
-    return logs
+    return page(logs, limit, response)
 
 @router.get("/stats/summary")
-async def get_summary_stats(db: AsyncSession = Depends(get_db)):
+async def get_summary_stats():
     """Get summary statistics for dashboard"""
-    # Get last 24 hours of data
-    yesterday = datetime.utcnow() - timedelta(hours=24)
-    
-    # Count readings
-    readings_query = select(MotorReading).where(MotorReading.timestamp >= yesterday)
-    readings_result = await db.execute(readings_query)
-    readings_count = len(readings_result.scalars().all())
-    
-    # Count active alerts
-    alerts_query = select(Alert).where(Alert.resolved == False)
-    alerts_result = await db.execute(alerts_query)
-    active_alerts = len(alerts_result.scalars().all())
-    
-    # Count anomalies in last 24h
-    anomalies_query = select(MotorReading).where(
-        and_(
-            MotorReading.timestamp >= yesterday,
-            MotorReading.is_anomaly == True
-        )
-    )
-    anomalies_result = await db.execute(anomalies_query)
-    anomalies_count = len(anomalies_result.scalars().all())
-    
-    # Get latest reading for current values
-    latest_query = select(MotorReading).order_by(desc(MotorReading.timestamp)).limit(1)
-    latest_result = await db.execute(latest_query)
-    latest_reading = latest_result.scalar_one_or_none()
+    # Caché corto compartido: clientes concurrentes esperan el mismo cálculo
+    return await summary_cache.get("summary", compute_summary_stats)
+
+async def compute_summary_stats():
+    """Counts from rollups and COUNT(*) aggregates; cost does not grow with history"""
+    now = datetime.utcnow()
+    yesterday = now - timedelta(hours=24)
+    
+    # Sesión propia: el cálculo compartido no depende de la petición que lo inició
+    async with read_session_maker() as db:
+        # Lecturas y anomalías de 24h: buckets de rollups + bordes crudos
+        counts = await aggregate_range(db, [], yesterday, now)
+        
+        # Alertas activas: índice en memoria, o COUNT sobre el índice parcial (resolved = 0) antes de cargarlo
+        if alert_index.ready:
+            active_alerts = len(alert_index.alerts)
+        else:
+            active_alerts = (await db.execute(
+                select(func.count()).select_from(Alert).where(Alert.resolved == False)
+            )).scalar()
+        
+        # Get latest reading for current values
+        latest_reading = hot_store.latest()
+        if latest_reading is None:
+            rows = await load_rows(db, READING_COLUMNS, yesterday, limit=1)
+            latest_reading = rows[0] if rows else None
+        if latest_reading is not None:
+            # Misma forma en ambos caminos (anomaly_attribution como dict, no texto JSON)
+            latest_reading = MotorReadingSchema.model_validate(latest_reading)
     
     return {
-        "readings_24h": readings_count,
+        "readings_24h": counts["count"],
         "active_alerts": active_alerts,
-        "anomalies_24h": anomalies_count,
+        "anomalies_24h": counts["anomaly_count"],
         "latest_reading": latest_reading,
-        "timestamp": datetime.utcnow()
+        "timestamp": now
+    }
+
+PHASES = ["A", "B", "C"]
+PHASE_KINDS = ["voltage", "current", "power", "energy", "frequency", "pf"]
+
+def _unbalance(a, b, c):
+    """NEMA unbalance (%): max deviation from the three-phase average over that average"""
+    phases = np.vstack([a, b, c])
+    mean = phases.mean(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(mean > 0, np.abs(phases - mean).max(axis=0) / mean * 100, np.nan)
+
+@router.get("/stats/phases")
+async def get_all_phase_stats(
+    hours: int = Query(24, ge=1, le=168),
+    fields: str = "voltage,current,power",
+    percentiles: str = "50,95,99",
+    db: AsyncSession = Depends(get_read_db)
+):
+    """
+    Statistics for phases A, B and C plus voltage/current unbalance in one call
+    min/max/avg/std are exact (rollups + raw edges); percentiles and unbalance use 1-minute averages
+    """
+    kinds = fields.split(",")
+    unknown = [k for k in kinds if k not in PHASE_KINDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    try:
+        quantiles = [float(p) for p in percentiles.split(",") if p]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="percentiles must be numbers between 0 and 100")
+    if any(not 0 <= p <= 100 for p in quantiles):
+        raise HTTPException(status_code=400, detail="percentiles must be numbers between 0 and 100")
+    
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(hours=hours)
+    columns = [f"{kind}_{phase.lower()}" for kind in kinds for phase in PHASES]
+    
+    # Una sola pasada: buckets de rollups para todos los campos de las tres fases
+    agg = await aggregate_range(db, columns, start_time, end_time)
+    if not agg["count"]:
+        return {"message": "No data available for the specified period"}
+    minutes = await minute_averages(db, columns, start_time, end_time)
+    
+    phases = {}
+    for phase in PHASES:
+        phases[phase] = {}
+        for kind in kinds:
+            column = f"{kind}_{phase.lower()}"
+            phases[phase][kind] = {
+                **summarize(agg[column]),
+                **weighted_percentiles(minutes[column], minutes["count"], quantiles)
+            }
+    
+    unbalance = {}
+    for kind in [k for k in ("voltage", "current") if k in kinds]:
+        averages = [phases[phase][kind]["avg"] for phase in PHASES]
+        period = None
+        if None not in averages:
+            period = float(_unbalance(*[np.array([v]) for v in averages])[0])
+        per_minute = _unbalance(*[minutes[f"{kind}_{phase.lower()}"] for phase in PHASES])
+        valid = per_minute[~np.isnan(per_minute)]
+        unbalance[kind] = {
+            "period_pct": None if period is None or math.isnan(period) else period,
+            "avg_pct": float(valid.mean()) if len(valid) else None,
+            "max_pct": float(valid.max()) if len(valid) else None,
+            **weighted_percentiles(per_minute, minutes["count"], quantiles)
+        }
+    
+    return {
+        "period_hours": hours,
+        "data_points": agg["count"],
+        "phases": phases,
+        "unbalance": unbalance,
+        "percentiles_resolution": "1m"
     }
 
 @router.get("/stats/phase/{phase}")
 async def get_phase_stats(
     phase: str,
     hours: int = Query(24, ge=1, le=168),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """Get statistics for a specific phase (A, B, or C)"""
     if phase not in ["A", "B", "C"]:
         raise HTTPException(status_code=400, detail="Phase must be A, B, or C")
     
-    start_time = datetime.utcnow() - timedelta(hours=hours)
+    end_time = datetime.utcnow()
+    start_time = end_time - timedelta(hours=hours)
     
-    query = select(MotorReading).where(MotorReading.timestamp >= start_time).order_by(MotorReading.timestamp)
-    result = await db.execute(query)
-    readings = result.scalars().all()
+    phase_lower = phase.lower()
+    fields = [f"voltage_{phase_lower}", f"current_{phase_lower}", f"power_{phase_lower}"]
     
-    if not readings:
-        return {"message": "No data available for the specified period"}
+    # Complete buckets come from rollups, only the edges read raw rows
+    agg = await aggregate_range(db, fields, start_time, end_time)
     
-    phase_lower = phase.lower()
+    if not agg["count"]:
+        return {"message": "No data available for the specified period"}
     
-    # Extract phase-specific data
-    voltages = [getattr(r, f"voltage_{phase_lower}") for r in readings]
-    currents = [getattr(r, f"current_{phase_lower}") for r in readings]
-    powers = [getattr(r, f"power_{phase_lower}") for r in readings]
+    def min_max_avg(field):
+        stats = summarize(agg[field])
+        return {"min": stats["min"], "max": stats["max"], "avg": stats["avg"]}
     
     return {
         "phase": phase,
         "period_hours": hours,
-        "data_points": len(readings),
-        "voltage": {
-            "min": min(voltages),
-            "max": max(voltages),
-            "avg": sum(voltages) / len(voltages)
-        },
-        "current": {
-            "min": min(currents),
-            "max": max(currents),
-            "avg": sum(currents) / len(currents)
-        },
-        "power": {
-            "min": min(powers),
-            "max": max(powers),
-            "avg": sum(powers) / len(powers)
-        }
+        "data_points": agg["count"],
+        "voltage": min_max_avg(fields[0]),
+        "current": min_max_avg(fields[1]),
+        "power": min_max_avg(fields[2])
+    }
+
+@router.get("/readings/rollups")
+async def get_reading_rollups(
+    start_time: datetime,
+    end_time: Optional[datetime] = None,
+    resolution: str = Query("1h", pattern="^(1m|1h)$"),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db)
+):
+    """Bucketed avg/min/max series from the 1-minute or 1-hour rollup tables"""
+    end_time = end_time or datetime.utcnow()
+    field_list = fields.split(",") if fields else ["temperature", "vibration", "rpm"]
+    unknown = [f for f in field_list if f not in READING_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    
+    return {
+        "resolution": resolution,
+        "buckets": await get_rollup_series(db, field_list, start_time, end_time, resolution)
     }
 
 @router.get("/health")
@@ -260,11 +498,25 @@ async def health_check():
     """Health check endpoint"""
     return {
         "status": "healthy",
+        "ready": warmup_status["ready"],
+        "warmup": warmup_status,
+        "hot_store": hot_store.status(),
+        "summary_cache": summary_cache.status(),
+        "alert_index": alert_index.status(),
+        "websocket": {k: v for k, v in ws_hub.metrics().items() if k != "slowest_clients"},
+        "db_writer": db_writer.status(),
         "timestamp": datetime.utcnow()
     }
 
+@router.get("/health/ready")
+async def readiness_check():
+    """Readiness probe: 503 until the startup warm-up has succeeded (with the last error, if any)"""
+    if not warmup_status["ready"]:
+        return JSONResponse(status_code=503, content={"ready": False, "error": warmup_status["error"]})
+    return {"ready": True, "warmup_seconds": warmup_status["duration_seconds"]}
+
 @router.get("/settings/thresholds", response_model=ThresholdSettingsSchema)
-async def get_thresholds(db: AsyncSession = Depends(get_db)):
+async def get_thresholds(db: AsyncSession = Depends(get_read_db)):
     """Get current threshold settings"""
     query = select(ThresholdSettingsDB).order_by(desc(ThresholdSettingsDB.id)).limit(1)
     result = await db.execute(query)
@@ -272,48 +524,81 @@ async def get_thresholds(db: AsyncSession = Depends(get_db)):
     
     # If no thresholds exist, create default ones
     if not thresholds:
-        thresholds = ThresholdSettingsDB()
-        db.add(thresholds)
-        await db.commit()
-        await db.refresh(thresholds)
+        async def create_defaults(session):
+            thresholds = ThresholdSettingsDB()
+            session.add(thresholds)
+            await session.flush()
+            await session.refresh(thresholds)
+            return thresholds
+        
+        thresholds = await db_writer.submit(create_defaults, PRIORITY_USER)
     
     return thresholds
 
 @router.put("/settings/thresholds", response_model=ThresholdSettingsSchema)
-async def update_thresholds(
-    threshold_update: ThresholdSettingsUpdate,
-    db: AsyncSession = Depends(get_db)
-):
+async def update_thresholds(threshold_update: ThresholdSettingsUpdate):
     """Update threshold settings"""
-    # Get current thresholds
-    query = select(ThresholdSettingsDB).order_by(desc(ThresholdSettingsDB.id)).limit(1)
-    result = await db.execute(query)
-    thresholds = result.scalar_one_or_none()
+    async def update(db):
+        # Get current thresholds
+        query = select(ThresholdSettingsDB).order_by(desc(ThresholdSettingsDB.id)).limit(1)
+        result = await db.execute(query)
+        thresholds = result.scalar_one_or_none()
+        
+        if not thresholds:
+            # Create new if doesn't exist
+            thresholds = ThresholdSettingsDB(**threshold_update.dict())
+            db.add(thresholds)
+        else:
+            # Update existing
+            for key, value in threshold_update.dict().items():
+                setattr(thresholds, key, value)
+            thresholds.updated_at = datetime.utcnow()
+        
+        await db.flush()
+        await db.refresh(thresholds)
+        return thresholds
     
-    if not thresholds:
-        # Create new if doesn't exist
-        thresholds = ThresholdSettingsDB(**threshold_update.dict())
-        db.add(thresholds)
-    else:
-        # Update existing
-        for key, value in threshold_update.dict().items():
-            setattr(thresholds, key, value)
-        thresholds.updated_at = datetime.utcnow()
-    
-    await db.commit()
-    await db.refresh(thresholds)
-    
-    # Log the change
-    log = SystemLog(
-        level="info",
-        source="api",
-        message="Threshold settings updated",
-        details=threshold_update.json()
+    # Cambio de usuario: pasa delante de la ingesta en la cola del writer
+    thresholds = await db_writer.submit(update, PRIORITY_USER)
+    await write_log("info", "api", "Threshold settings updated", threshold_update.json())
+    ws_hub.publish("thresholds", ThresholdSettingsSchema.model_validate(thresholds).model_dump())
+    return thresholds
+
+@router.get("/ws/metrics")
+async def get_ws_metrics():
+    """WebSocket fan-out metrics: clients, queued/coalesced/dropped messages, slowest clients"""
+    return ws_hub.metrics()
+
+# ============================================
+# Vibration Endpoints
+# ============================================
+
+@router.get("/vibration/spectrogram")
+async def get_spectrogram(
+    start_time: datetime,
+    end_time: datetime,
+    motor_id: Optional[str] = None,
+    max_rows: int = Query(200, ge=1, le=2000),
+    max_bins: int = Query(128, ge=1, le=1024)
+):
+    """Downsampled spectrogram from the waveform archive for a time range"""
+    if end_time <= start_time:
+        raise HTTPException(status_code=400, detail="end_time must be after start_time")
+    try:
+        motor_id = validate_motor_id(motor_id or settings.DEFAULT_MOTOR_ID)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(
+        None, waveform_archive.spectrogram,
+        motor_id, start_time, end_time, max_rows, max_bins
     )
-    db.add(log)
-    await db.commit()
     
-    return thresholds
+    if result is None:
+        raise HTTPException(status_code=404, detail="No vibration data for the specified period")
+    
+    return result
 
 # ============================================
 # AI Agent Endpoints
@@ -396,16 +681,15 @@ async def execute_ai_action(action: Dict[str, str]):
     try:
         if action_type == 'modificar_umbrales':
             # Modificar umbrales en la base de datos
-            from app.database import async_session_maker, ThresholdSettings
+            from app.database import ThresholdSettings
             
             tipo = action.get('tipo')  # temperatura, vibration, rpm
             warning = float(action.get('warning', 0))
             critical = float(action.get('critical', 0))
             print(f"🎯 Modificando {tipo}: warning={warning}, critical={critical}")
             
-            async with async_session_maker() as db:
+            async def apply(db):
                 # Obtener configuración actual
-                from sqlalchemy import select
                 query = select(ThresholdSettings).limit(1)
                 result = await db.execute(query)
                 thresholds = result.scalar_one_or_none()
@@ -426,26 +710,28 @@ async def execute_ai_action(action: Dict[str, str]):
                     thresholds.rpm_critical = int(critical)
                 
                 thresholds.updated_at = datetime.utcnow()
-                await db.commit()
-                
-                # PUBLICAR A MQTT para que el frontend se actualice automáticamente
-                from app.mqtt_client import mqtt_handler
-                import json
-                
-                mqtt_payload = {
-                    "tipo": tipo,
-                    "warning": warning,
-                    "critical": critical,
-                    "timestamp": datetime.utcnow().isoformat()
-                }
-                
-                if mqtt_handler and mqtt_handler.client:
-                    mqtt_handler.client.publish(
-                        'motor/thresholds/update',
-                        json.dumps(mqtt_payload),
-                        qos=1
-                    )
-                    print(f"📡 Umbrales publicados a MQTT: {mqtt_payload}")
+            
+            # Acción del asistente: prioridad de usuario en el writer
+            await db_writer.submit(apply, PRIORITY_USER)
+            
+            # PUBLICAR A MQTT para que el frontend se actualice automáticamente
+            from app.mqtt_client import mqtt_handler
+            import json
+            
+            mqtt_payload = {
+                "tipo": tipo,
+                "warning": warning,
+                "critical": critical,
+                "timestamp": datetime.utcnow().isoformat()
+            }
+            
+            if mqtt_handler and mqtt_handler.client:
+                mqtt_handler.client.publish(
+                    'motor/thresholds/update',
+                    json.dumps(mqtt_payload),
+                    qos=1
+                )
+                print(f"📡 Umbrales publicados a MQTT: {mqtt_payload}")
             
             return {
                 "success": True,
@@ -618,12 +904,31 @@ async def analyze_csv(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/ai/diagnosis")
-async def generate_diagnosis(request: DiagnosisRequest):
+async def generate_diagnosis(request: DiagnosisRequest, db: AsyncSession = Depends(get_read_db)):
     """
     Genera diagnóstico automático del motor basado en datos actuales
+    Incluye la atribución cacheada de la última anomalía reciente (sin recalcular ML)
     """
     try:
-        response = await ai_agent.generate_diagnosis(request.motor_data)
+        motor_data = dict(request.motor_data)
+        
+        since = datetime.utcnow() - timedelta(minutes=settings.DIAGNOSIS_ANOMALY_WINDOW_MINUTES)
+        latest_anomaly = await load_rows(
+            db, ["anomaly_score", "anomaly_attribution"], since, limit=1, anomalies_only=True
+        )
+        
+        attribution = None
+        if latest_anomaly:
+            latest_anomaly = latest_anomaly[0]
+            attribution = {
+                "timestamp": latest_anomaly["timestamp"].isoformat(),
+                "score": latest_anomaly["anomaly_score"],
+                "features": json.loads(latest_anomaly["anomaly_attribution"])
+            }
+            motor_data["anomalyAttribution"] = attribution
+        
+        response = await ai_agent.generate_diagnosis(motor_data)
+        response["anomaly_attribution"] = attribution
         return response
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,163 @@
+"""
+Vibration waveform decoding and spectral features.
+
+The ESP32 publishes raw accelerometer blocks as packed int16. Blocks from all
+motors are grouped into batches and transformed with a single vectorized FFT
+in a worker pool so the event loop never blocks on the math.
+"""
+import asyncio
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.config import settings
+
+# Header: sample_rate (uint16), n_samples (uint16), scale g/LSB (float32), rpm (float32)
+WAVEFORM_HEADER = struct.Struct("<HHff")
+
+# Bandas de energía (Hz)
+SPECTRAL_BANDS = ((0, 10), (10, 50), (50, 100), (100, 200), (200, 400))
+
+
+def spectral_feature_names() -> list:
+    """Names of the spectral features, in feature-vector order"""
+    names = [f"band_{low}_{high}hz" for low, high in SPECTRAL_BANDS]
+    return names + ["harmonic_1x", "harmonic_2x", "crest_factor", "accel_rms"]
+
+
+def unpack_waveform(payload: bytes) -> tuple[int, float, float, np.ndarray]:
+    """
+    Unpack a waveform block without scaling
+    Returns: (sample_rate, scale, rpm, raw int16 samples)
+    """
+    if len(payload) < WAVEFORM_HEADER.size:
+        raise ValueError("Waveform payload shorter than header")
+    sample_rate, n_samples, scale, rpm = WAVEFORM_HEADER.unpack_from(payload)
+    expected = WAVEFORM_HEADER.size + 2 * n_samples
+    if len(payload) != expected:
+        raise ValueError(f"Waveform payload has {len(payload)} bytes, expected {expected}")
+    raw = np.frombuffer(payload, dtype="<i2", count=n_samples, offset=WAVEFORM_HEADER.size)
+    return sample_rate, scale, rpm, raw
+
+
+def compute_spectra(blocks: np.ndarray, sample_rate: int, rpms: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized FFT over a (n_blocks, n_samples) array
+    Returns: (magnitude spectra, feature matrix)
+    """
+    blocks = blocks - blocks.mean(axis=1, keepdims=True)
+    n_samples = blocks.shape[1]
+    window = np.hanning(n_samples).astype(np.float32)
+    # Amplitude-corrected single-sided spectrum
+    spectra = np.abs(np.fft.rfft(blocks * window, axis=1)) * (2.0 / window.sum())
+    freqs = np.fft.rfftfreq(n_samples, d=1.0 / sample_rate)
+    power = spectra ** 2
+
+    columns = []
+    for low, high in SPECTRAL_BANDS:
+        mask = (freqs >= low) & (freqs < high)
+        columns.append(power[:, mask].sum(axis=1))
+
+    # Amplitude around 1x and 2x running speed (±1 bin)
+    bin_width = freqs[1] - freqs[0]
+    rows = np.arange(len(blocks))
+    for order in (1, 2):
+        center = np.rint(order * rpms / 60.0 / bin_width).astype(int)
+        center = np.clip(center, 1, len(freqs) - 2)
+        around = np.stack([spectra[rows, center + k] for k in (-1, 0, 1)], axis=1)
+        harmonic = around.max(axis=1)
+        columns.append(np.where(rpms > 0, harmonic, 0.0))
+
+    rms = np.sqrt((blocks ** 2).mean(axis=1))
+    peak = np.abs(blocks).max(axis=1)
+    columns.append(np.divide(peak, rms, out=np.zeros_like(rms), where=rms > 0))
+    columns.append(rms)
+
+    return spectra, np.stack(columns, axis=1)
+
+
+class SpectrumStore:
+    """Latest spectral features per motor"""
+
+    def __init__(self):
+        self.features = {}
+
+    def add(self, motor_id: str, features: np.ndarray):
+        self.features[motor_id] = features
+
+    def latest_features(self, motor_id: str) -> list:
+        """Latest spectral features for the motor, zeros if no waveform has arrived"""
+        features = self.features.get(motor_id)
+        if features is None:
+            return [0.0] * len(spectral_feature_names())
+        return features.tolist()
+
+
+class SpectralAnalyzer:
+    """Batches waveform blocks across motors and runs the FFTs in a thread pool"""
+
+    def __init__(self, store: SpectrumStore):
+        self.store = store
+        self.executor = ThreadPoolExecutor(
+            max_workers=settings.SPECTRAL_WORKERS,
+            thread_name_prefix="spectral"
+        )
+        self.pending = []
+        self.flush_task = None
+
+    async def submit(self, motor_id: str, timestamp, sample_rate: int, rpm: float, samples: np.ndarray) -> tuple[dict, np.ndarray]:
+        """
+        Queue one block for the next batch and wait for its result
+        Returns: (features, magnitude spectrum)
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((motor_id, timestamp, sample_rate, rpm, samples, future))
+
+        if len(self.pending) >= settings.SPECTRAL_MAX_BATCH:
+            await self.flush()
+        elif self.flush_task is None:
+            self.flush_task = loop.create_task(self._flush_later())
+
+        return await future
+
+    async def _flush_later(self):
+        await asyncio.sleep(settings.SPECTRAL_BATCH_WINDOW)
+        self.flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+
+        # Same-shape blocks are stacked into one FFT call
+        groups = {}
+        for item in batch:
+            groups.setdefault((item[2], len(item[4])), []).append(item)
+
+        loop = asyncio.get_running_loop()
+        for (sample_rate, _), items in groups.items():
+            blocks = np.stack([item[4] for item in items])
+            rpms = np.array([item[3] for item in items], dtype=np.float32)
+            try:
+                spectra, features = await loop.run_in_executor(
+                    self.executor, compute_spectra, blocks, sample_rate, rpms
+                )
+            except Exception as e:
+                for item in items:
+                    if not item[5].done():
+                        item[5].set_exception(e)
+                continue
+
+            names = spectral_feature_names()
+            for item, spectrum, row in zip(items, spectra, features):
+                self.store.add(item[0], row)
+                if not item[5].done():
+                    item[5].set_result((dict(zip(names, row.tolist())), spectrum))
+
+
+# Global spectral pipeline
+spectrum_store = SpectrumStore()
+spectral_analyzer = SpectralAnalyzer(spectrum_store)
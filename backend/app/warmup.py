@@ -0,0 +1,132 @@
+"""
+Warm start on boot: bulk-load recent readings so the detector and the
+in-memory state are usable immediately after a restart.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, desc, func
+
+from app.config import settings
+from app.database import read_session_maker, READING_FIELDS, spectral_features
+from app.partitions import readings_source
+from app.hot_store import hot_store, VALUE_FIELDS
+from app.spectral import spectral_feature_names
+from app.db_writer import write_log
+from app.alert_index import alert_index
+
+warmup_status = {
+    "ready": False,
+    "started_at": None,
+    "finished_at": None,
+    "duration_seconds": None,
+    "readings_loaded": 0,
+    "hot_store_readings": 0,
+    "active_alerts": 0,
+    "attempts": 0,
+    "error": None,
+}
+
+
+async def load_recent_readings(session, limit: int):
+    """
+    Fetch the last `limit` readings as plain rows with one columnar query
+    Returns: (timestamps, list of field dicts), oldest first
+    """
+    R = readings_source()
+    columns = [R.timestamp] + [getattr(R, f) for f in READING_FIELDS]
+    query = select(*columns).order_by(desc(R.timestamp)).limit(limit)
+    rows = (await session.execute(query)).all()
+    rows.reverse()
+
+    timestamps = [row[0] for row in rows]
+    readings = [
+        {field: (value or 0.0) for field, value in zip(READING_FIELDS, row[1:])}
+        for row in rows
+    ]
+    return timestamps, readings
+
+
+async def load_spectral_features(session, motor_id: str, start: datetime, end: datetime):
+    """
+    Stored spectral features covering [start, end], including the last waveform before start
+    Returns: (timestamps, features matrix), oldest first
+    """
+    S = spectral_features
+    names = spectral_feature_names()
+    previous = select(func.max(S.c.timestamp)).where(S.c.motor_id == motor_id, S.c.timestamp <= start)
+    query = select(S.c.timestamp, *[S.c[n] for n in names]).where(
+        S.c.motor_id == motor_id,
+        S.c.timestamp >= func.coalesce(previous.scalar_subquery(), start),
+        S.c.timestamp <= end,
+    ).order_by(S.c.timestamp)
+    rows = (await session.execute(query)).all()
+    features = np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, len(names))
+    return [row[0] for row in rows], np.nan_to_num(features)
+
+
+async def fill_hot_store(session):
+    """Seed the in-memory hot store with the readings inside its horizon"""
+    since = datetime.utcnow() - timedelta(minutes=settings.HOT_STORE_MINUTES)
+    R = readings_source(since)
+    columns = ["id", "timestamp"] + VALUE_FIELDS + ["is_anomaly", "anomaly_attribution"]
+    query = select(*[getattr(R, c) for c in columns]).where(R.timestamp >= since).order_by(R.timestamp)
+    rows = [dict(zip(columns, row)) for row in (await session.execute(query)).all()]
+    # La base no guarda motor_id: todas las lecturas históricas son del motor por defecto
+    hot_store.fill(settings.DEFAULT_MOTOR_ID, rows, since)
+    return len(rows)
+
+
+async def _warm(detector):
+    motor_id = settings.DEFAULT_MOTOR_ID
+    async with read_session_maker() as session:
+        timestamps, readings = await load_recent_readings(session, settings.WARMUP_READINGS)
+        spectral = await load_spectral_features(session, motor_id, timestamps[0], timestamps[-1]) if timestamps else ([], None)
+
+    await detector.warm_start(timestamps, readings, motor_id, *spectral)
+    warmup_status["readings_loaded"] = len(readings)
+
+    async with read_session_maker() as session:
+        warmup_status["hot_store_readings"] = await fill_hot_store(session)
+
+    warmup_status["active_alerts"] = (await alert_index.reconcile(startup=True))["db_active"]
+
+
+async def warm_start(detector):
+    """Fill the detector buffer and rolling state from the database; ready only once it succeeds"""
+    started = time.perf_counter()
+    warmup_status["started_at"] = datetime.utcnow()
+
+    for attempt in range(1, settings.WARMUP_RETRIES + 2):
+        warmup_status["attempts"] = attempt
+        try:
+            await _warm(detector)
+            warmup_status["error"] = None
+            break
+        except Exception as e:
+            print(f"❌ Error during warm-up (intento {attempt}): {e}")
+            warmup_status["error"] = str(e)
+            if attempt <= settings.WARMUP_RETRIES:
+                await asyncio.sleep(settings.WARMUP_RETRY_DELAY)
+
+    duration = time.perf_counter() - started
+    warmup_status["duration_seconds"] = round(duration, 3)
+    warmup_status["finished_at"] = datetime.utcnow()
+    # Tras agotar los reintentos sigue sin estar listo: /api/health/ready responde 503 con el error
+    warmup_status["ready"] = warmup_status["error"] is None
+    if warmup_status["ready"]:
+        print(f"🔥 Warm-up complete: {warmup_status['readings_loaded']} readings in {duration:.2f}s")
+
+    await write_log(
+        "info" if warmup_status["ready"] else "error", "ml",
+        "Warm-up complete" if warmup_status["ready"] else "Warm-up failed",
+        {
+            "readings_loaded": warmup_status["readings_loaded"],
+            "hot_store_readings": warmup_status["hot_store_readings"],
+            "duration_seconds": warmup_status["duration_seconds"],
+            "attempts": warmup_status["attempts"],
+            "error": warmup_status["error"],
+        }
+    )
@@ -0,0 +1,148 @@
+"""
+Append-only archive of raw vibration blocks and their spectra.
+
+One directory per motor and day holds fixed-width binary files that are
+memory-mapped on read, so any time range can be sliced without loading
+whole files:
+
+    <motor_id>/<YYYYMMDD>/index.f8     epoch timestamps (float64)
+    <motor_id>/<YYYYMMDD>/waveform.i2  raw samples (int16, one row per block)
+    <motor_id>/<YYYYMMDD>/spectra.f2   magnitude spectra (float16, one row per block)
+    <motor_id>/<YYYYMMDD>/meta.json    sample_rate, n_samples, n_bins, scale
+"""
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+
+# Filas procesadas por iteración al reducir el espectrograma
+READ_CHUNK_ROWS = 4096
+# motor_id es un componente de ruta: nada de "/", ".." ni caracteres especiales
+MOTOR_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def validate_motor_id(motor_id: str) -> str:
+    """Return motor_id if it is safe as a directory name, else raise ValueError"""
+    if not isinstance(motor_id, str) or not MOTOR_ID_PATTERN.fullmatch(motor_id):
+        raise ValueError(f"Invalid motor_id: {motor_id!r}")
+    return motor_id
+
+
+def _epoch(dt: datetime) -> float:
+    # Los timestamps del backend son UTC naive
+    return dt.replace(tzinfo=timezone.utc).timestamp()
+
+
+class WaveformArchive:
+    def __init__(self, root: str):
+        self.root = Path(root)
+        # Un solo hilo de escritura: los bloques se agregan en el orden en que llegan,
+        # las filas de los tres archivos quedan alineadas y el índice ordenado
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="waveform-archive")
+
+    def _day_dir(self, motor_id: str, day: datetime) -> Path:
+        return self.root / validate_motor_id(motor_id) / day.strftime("%Y%m%d")
+
+    def append(self, motor_id: str, timestamp: datetime, sample_rate: int, scale: float,
+               raw: np.ndarray, spectrum: np.ndarray):
+        """
+        Append one block; the index is written last so readers never see partial rows
+        Not thread-safe: run it on `self.writer` (see MQTTHandler.process_waveform)
+        """
+        day_dir = self._day_dir(motor_id, timestamp)
+        meta_path = day_dir / "meta.json"
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_text())
+            if meta["n_samples"] != len(raw) or meta["n_bins"] != len(spectrum):
+                raise ValueError(f"Block shape differs from archive layout in {day_dir}")
+        else:
+            day_dir.mkdir(parents=True, exist_ok=True)
+            meta_path.write_text(json.dumps({
+                "sample_rate": sample_rate,
+                "n_samples": len(raw),
+                "n_bins": len(spectrum),
+                "scale": scale,
+            }))
+
+        with open(day_dir / "waveform.i2", "ab") as f:
+            f.write(np.asarray(raw, dtype="<i2").tobytes())
+        with open(day_dir / "spectra.f2", "ab") as f:
+            f.write(np.asarray(spectrum, dtype="<f2").tobytes())
+        with open(day_dir / "index.f8", "ab") as f:
+            f.write(np.array([_epoch(timestamp)], dtype="<f8").tobytes())
+
+    def _days(self, start: datetime, end: datetime):
+        day = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        while day <= end:
+            yield day
+            day += timedelta(days=1)
+
+    def spectrogram(self, motor_id: str, start: datetime, end: datetime,
+                    max_rows: int = 200, max_bins: int = 128):
+        """
+        Downsampled spectrogram for a time range
+        Rows are mean-pooled into uniform time buckets; bins are max-pooled to keep peaks.
+        """
+        t0, t1 = _epoch(start), _epoch(end)
+        span = max(t1 - t0, 1e-9)
+        sums = None
+        counts = np.zeros(max_rows, dtype=np.int64)
+        meta = None
+
+        for day in self._days(start, end):
+            day_dir = self._day_dir(motor_id, day)
+            if not (day_dir / "index.f8").exists():
+                continue
+            day_meta = json.loads((day_dir / "meta.json").read_text())
+            if meta is None:
+                meta = day_meta
+                sums = np.zeros((max_rows, meta["n_bins"]), dtype=np.float64)
+            elif day_meta["n_bins"] != meta["n_bins"]:
+                continue
+
+            index = np.memmap(day_dir / "index.f8", dtype="<f8", mode="r")
+            rows = len(index)
+            # Spectra rows can only be trusted up to the rows covered by the index
+            spectra = np.memmap(day_dir / "spectra.f2", dtype="<f2", mode="r", shape=(rows, meta["n_bins"]))
+            lo = np.searchsorted(index, t0, side="left")
+            hi = np.searchsorted(index, t1, side="right")
+
+            for chunk_start in range(lo, hi, READ_CHUNK_ROWS):
+                chunk_end = min(chunk_start + READ_CHUNK_ROWS, hi)
+                ts = np.asarray(index[chunk_start:chunk_end])
+                block = np.asarray(spectra[chunk_start:chunk_end], dtype=np.float32)
+                bucket = np.clip(((ts - t0) / span * max_rows).astype(np.int64), 0, max_rows - 1)
+                # Buckets are sorted, so each run can be reduced in one call
+                boundaries = np.concatenate(([0], np.flatnonzero(np.diff(bucket)) + 1))
+                sums[bucket[boundaries]] += np.add.reduceat(block, boundaries, axis=0)
+                counts[bucket[boundaries]] += np.diff(np.append(boundaries, len(bucket)))
+
+        if meta is None or not counts.any():
+            return None
+
+        filled = counts > 0
+        matrix = sums[filled] / counts[filled, None]
+        freqs = np.fft.rfftfreq(meta["n_samples"], d=1.0 / meta["sample_rate"])
+
+        if matrix.shape[1] > max_bins:
+            edges = np.linspace(0, matrix.shape[1], max_bins + 1).astype(int)[:-1]
+            matrix = np.maximum.reduceat(matrix, edges, axis=1)
+            freqs = freqs[edges]
+
+        bucket_times = t0 + (np.flatnonzero(filled) + 0.5) * span / max_rows
+        return {
+            "timestamps": [datetime.fromtimestamp(t, timezone.utc).replace(tzinfo=None).isoformat() for t in bucket_times],
+            "frequencies": np.round(freqs, 2).tolist(),
+            "magnitudes": np.round(matrix, 6).tolist(),
+            "blocks": int(counts.sum()),
+            "sample_rate": meta["sample_rate"],
+        }
+
+
+# Global archive instance
+waveform_archive = WaveformArchive(settings.VIBRATION_ARCHIVE_DIR)
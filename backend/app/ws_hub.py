@@ -0,0 +1,187 @@
+"""
+WebSocket fan-out of readings, alerts and threshold changes.
+
+Each message is serialized once and offered to every subscribed client.
+Clients do not get a plain FIFO: pending messages are keyed (latest reading
+per motor, latest alert per motor and category, latest thresholds), so a
+client that falls behind receives only the newest value of each key instead
+of a growing backlog. The pending map is bounded (WS_CLIENT_QUEUE keys; the
+oldest key is dropped when full) and every client has its own sender task,
+so a slow socket never stalls publishing or the other clients. A send that
+takes longer than WS_SEND_TIMEOUT disconnects that client.
+
+Client protocol (JSON text frames):
+    {"action": "subscribe", "topics": ["readings", "alerts"], "motors": ["motor_1"]}
+    {"action": "unsubscribe", "topics": ["alerts"]}
+    {"action": "ping"}
+Initial filters can also be given as query parameters (?topics=...&motors=...).
+"""
+import asyncio
+import json
+from datetime import datetime
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from app.config import settings
+from app.columnar import dumps
+
+TOPICS = ("readings", "alerts", "thresholds")
+
+
+def _csv(value: str):
+    return {v for v in value.split(",") if v} if value else None
+
+
+class _Client:
+    def __init__(self, websocket: WebSocket, topics: set, motors):
+        self.websocket = websocket
+        self.topics = topics
+        self.motors = motors  # None = todos los motores
+        # clave -> mensaje serializado; reemplazar una clave conserva su posición
+        self.pending = {}
+        self.wakeup = asyncio.Event()
+        self.sent = self.coalesced = self.dropped = 0
+        self.task = None
+
+    def wants(self, topic: str, motor_id) -> bool:
+        if topic not in self.topics:
+            return False
+        return motor_id is None or self.motors is None or motor_id in self.motors
+
+    def offer(self, key, text: str, limit: int) -> str:
+        """Queue a message; returns "queued", "coalesced" or "dropped" (oldest key evicted)"""
+        outcome = "queued"
+        if key in self.pending:
+            self.coalesced += 1
+            outcome = "coalesced"
+        elif len(self.pending) >= limit:
+            del self.pending[next(iter(self.pending))]
+            self.dropped += 1
+            outcome = "dropped"
+        self.pending[key] = text
+        self.wakeup.set()
+        return outcome
+
+
+class WebSocketHub:
+    def __init__(self, queue_size: int, send_timeout: float):
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.clients = set()
+        self.stats = {
+            "connections": 0, "published": 0, "offered": 0, "sent": 0,
+            "coalesced": 0, "dropped": 0, "slow_disconnects": 0,
+        }
+
+    def publish(self, topic: str, data, motor_id: str = None, key: str = None):
+        """Serialize once and offer to every matching client (never blocks)"""
+        self.stats["published"] += 1
+        if not self.clients:
+            return
+        text = dumps({
+            "type": topic,
+            "motor_id": motor_id,
+            "data": data,
+            "timestamp": datetime.utcnow(),
+        }).decode()
+        slot = (topic, motor_id, key)
+        for client in self.clients:
+            if client.wants(topic, motor_id):
+                outcome = client.offer(slot, text, self.queue_size)
+                self.stats["offered"] += 1
+                if outcome != "queued":
+                    self.stats[outcome] += 1
+
+    async def _sender(self, client: _Client):
+        try:
+            while True:
+                await client.wakeup.wait()
+                client.wakeup.clear()
+                while client.pending:
+                    key = next(iter(client.pending))
+                    text = client.pending.pop(key)
+                    await asyncio.wait_for(client.websocket.send_text(text), self.send_timeout)
+                    client.sent += 1
+                    self.stats["sent"] += 1
+        except asyncio.TimeoutError:
+            # Cliente demasiado lento: se desconecta para no retener memoria
+            self.stats["slow_disconnects"] += 1
+            await self._close(client)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+
+    async def _close(self, client: _Client):
+        self.clients.discard(client)
+        try:
+            await client.websocket.close(code=1013)
+        except Exception:
+            pass
+
+    def _handle(self, client: _Client, message: dict):
+        action = message.get("action")
+        topics = set(message.get("topics") or TOPICS) & set(TOPICS)
+        if action == "subscribe":
+            client.topics |= topics
+            if "motors" in message:
+                client.motors = set(message["motors"]) if message["motors"] else None
+        elif action == "unsubscribe":
+            client.topics -= topics
+        elif action != "ping":
+            return {"type": "error", "message": f"Unknown action: {action}"}
+        return {
+            "type": "pong" if action == "ping" else "subscribed",
+            "topics": sorted(client.topics),
+            "motors": sorted(client.motors) if client.motors is not None else None,
+        }
+
+    async def serve(self, websocket: WebSocket):
+        """Run one WebSocket connection until the client leaves"""
+        await websocket.accept()
+        params = websocket.query_params
+        topics = (_csv(params.get("topics")) or set(TOPICS)) & set(TOPICS)
+        client = _Client(websocket, topics, _csv(params.get("motors")))
+        self.clients.add(client)
+        self.stats["connections"] += 1
+        client.task = asyncio.create_task(self._sender(client))
+        client.offer(("connection", None, None), dumps({
+            "type": "connection",
+            "message": "Connected to Motor Monitoring System",
+            "topics": sorted(client.topics),
+            "timestamp": datetime.utcnow(),
+        }).decode(), self.queue_size)
+        try:
+            while True:
+                text = await websocket.receive_text()
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    # Texto libre: eco como antes
+                    message = None
+                if isinstance(message, dict):
+                    reply = self._handle(client, message)
+                else:
+                    reply = {"type": "echo", "data": text, "timestamp": datetime.utcnow()}
+                client.offer(("reply", None, None), dumps(reply).decode(), self.queue_size)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        finally:
+            self.clients.discard(client)
+            client.task.cancel()
+
+    def metrics(self) -> dict:
+        pending = [len(c.pending) for c in self.clients]
+        return {
+            **self.stats,
+            "clients": len(self.clients),
+            "queue_size": self.queue_size,
+            "pending_total": sum(pending),
+            "pending_max": max(pending, default=0),
+            "slowest_clients": sorted(
+                ({"pending": len(c.pending), "sent": c.sent, "coalesced": c.coalesced, "dropped": c.dropped}
+                 for c in self.clients), key=lambda c: c["pending"], reverse=True
+            )[:5],
+        }
+
+
+# Global hub (publishers call ws_hub.publish after their writes commit)
+ws_hub = WebSocketHub(settings.WS_CLIENT_QUEUE, settings.WS_SEND_TIMEOUT)
@@ -0,0 +1,154 @@
+"""
+Benchmark de bloques comprimidos (Gorilla): tamaño en disco, velocidad de decodificación y lectura de rangos
+
+Crea una base temporal con lecturas sintéticas con la resolución del PZEM
+(0.1 V, 0.001 A, ...), mide la tabla cruda, compacta todo en reading_blocks
+y compara tamaño, páginas y tiempo de una consulta de rango de un día.
+
+Uso: python benchmark_blocks.py [--days 3] [--interval 1] [--repeat 3]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--days", type=int, default=3)
+parser.add_argument("--interval", type=int, default=1, help="segundos entre lecturas")
+parser.add_argument("--repeat", type=int, default=3)
+args = parser.parse_args()
+
+# La configuración se lee al importar app: base temporal, bloques activados y sin archivo frío
+workdir = tempfile.mkdtemp(prefix="bench_blocks_")
+db_path = os.path.join(workdir, "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+os.environ["COLD_ARCHIVE_DIR"] = os.path.join(workdir, "cold")
+os.environ["READING_BLOCKS_ENABLED"] = "True"
+os.environ["DEBUG"] = "False"
+
+from sqlalchemy import select  # noqa: E402
+
+from app.database import init_db, engine, async_session_maker, MotorReading, READING_FIELDS, reading_blocks  # noqa: E402
+from app.history import load_columns  # noqa: E402
+from app.reading_blocks import compact_readings, decode, BLOCK_COLUMNS  # noqa: E402
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+RESOLUTION = {"voltage": 1, "current": 3, "power": 1, "energy": 3, "frequency": 1, "pf": 2,
+              "temperature": 1, "vibration": 2, "rpm": 0}
+
+
+def synthetic(n: int) -> dict:
+    """Slowly drifting signals rounded to the sensor resolution"""
+    rng = np.random.default_rng(42)
+    columns = {}
+    for field in READING_FIELDS:
+        kind = field.split("_")[0]
+        base = {"voltage": 127, "current": 8, "power": 900, "energy": 0, "frequency": 60, "pf": 0.9,
+                "temperature": 45, "vibration": 3, "rpm": 1750}[kind]
+        if kind == "energy":
+            values = np.cumsum(rng.uniform(0, 0.0005, n))
+        else:
+            values = base + np.cumsum(rng.normal(0, 0.02, n)) * (base / 100 or 1)
+        columns[field] = np.round(values, RESOLUTION[kind])
+    return columns
+
+
+def seed(start: datetime) -> int:
+    n = args.days * 86400 // args.interval
+    columns = synthetic(n)
+    scores = np.random.default_rng(7).uniform(-0.2, 0.2, n)
+    rows = [
+        [(start + timedelta(seconds=i * args.interval)).strftime(TS_FORMAT)]
+        + [float(columns[f][i]) for f in READING_FIELDS] + [float(scores[i]), False]
+        for i in range(n)
+    ]
+    names = ["timestamp"] + READING_FIELDS + ["anomaly_score", "is_anomaly"]
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        f"INSERT INTO motor_readings ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})", rows
+    )
+    conn.commit()
+    conn.close()
+    return n
+
+
+def storage() -> dict:
+    """Bytes of the file and pages of each readings table (incl. indexes) after VACUUM"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("VACUUM")
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    stats = {"file": os.path.getsize(db_path), "page_size": page_size}
+    try:
+        for table in ("motor_readings", "reading_blocks"):
+            stats[table] = conn.execute(
+                "SELECT COALESCE(SUM(pgsize), 0) / ? FROM dbstat WHERE name = ? "
+                "OR name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?)",
+                (page_size, table, table)
+            ).fetchone()[0]
+    except sqlite3.OperationalError:
+        # SQLite compilado sin dbstat: solo el tamaño del archivo
+        pass
+    conn.close()
+    return stats
+
+
+async def range_scan(start, end):
+    best = None
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        async with async_session_maker() as session:
+            columns = await load_columns(session, MotorReading, ["timestamp"] + READING_FIELDS, start, end)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(columns["timestamp"])
+
+
+async def main():
+    await init_db()
+    start = datetime(2024, 1, 1)
+    n = seed(start)
+    day = (start + timedelta(days=1), start + timedelta(days=2) - timedelta(microseconds=1))
+    print(f"📊 {n} lecturas en {args.days} días (cada {args.interval}s), mejor de {args.repeat}\n")
+
+    raw = storage()
+    raw_scan, raw_rows = await range_scan(*day)
+
+    started = time.perf_counter()
+    moved = await compact_readings(start + timedelta(days=args.days))
+    compact_seconds = time.perf_counter() - started
+    await engine.dispose()
+    packed = storage()
+    block_scan, block_rows = await range_scan(*day)
+
+    async with async_session_maker() as session:
+        blocks = (await session.execute(select(reading_blocks.c.count, reading_blocks.c.data))).all()
+    blob_bytes = sum(len(data) for _, data in blocks)
+    started = time.perf_counter()
+    for count, data in blocks:
+        decode(data, count)
+    decode_seconds = time.perf_counter() - started
+    plain_bytes = moved * len(BLOCK_COLUMNS) * 8
+
+    print(f"🗜️  Compactadas {moved} lecturas en {len(blocks)} bloques ({compact_seconds:.2f}s)")
+    print(f"   Columnas float64/int64 sin comprimir: {plain_bytes / 1e6:.1f} MB -> bloques {blob_bytes / 1e6:.2f} MB "
+          f"({plain_bytes / blob_bytes:.1f}x, {blob_bytes * 8 / (moved * len(BLOCK_COLUMNS)):.1f} bits/valor)")
+    print(f"   Archivo SQLite: {raw['file'] / 1e6:.1f} MB -> {packed['file'] / 1e6:.1f} MB "
+          f"({raw['file'] / packed['file']:.1f}x)")
+    if "motor_readings" in raw:
+        print(f"   Páginas: motor_readings {raw['motor_readings']} -> reading_blocks {packed['reading_blocks']}")
+    print(f"   Decodificación: {moved / decode_seconds / 1e6:.2f} M lecturas/s ({decode_seconds * 1000:.0f}ms)\n")
+
+    print(f"{'rango de 1 día':<22} {'tiempo':>10} {'filas':>8}")
+    print(f"{'tabla cruda':<22} {raw_scan * 1000:>8.1f}ms {raw_rows:>8}")
+    print(f"{'bloques comprimidos':<22} {block_scan * 1000:>8.1f}ms {block_rows:>8}")
+    print(f"\n{'✅' if raw_rows == block_rows else '❌'} Mismo número de lecturas en ambas rutas")
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
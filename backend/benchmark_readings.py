@@ -0,0 +1,99 @@
+"""
+Benchmark de /api/readings: objetos ORM + esquema pydantic vs proyección columnar (fields=)
+
+Crea una base temporal con lecturas sintéticas, desactiva el hot store para
+medir la ruta SQL y compara latencia y bytes de respuesta de páginas de
+`--limit` lecturas con todas las columnas y con solo las pedidas.
+
+Uso: python benchmark_readings.py [--rows 200000] [--limit 1000] [--fields temperature] [--repeat 20]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--rows", type=int, default=200000)
+parser.add_argument("--limit", type=int, default=1000)
+parser.add_argument("--fields", default="temperature", help="campos de la proyección, separados por coma")
+parser.add_argument("--repeat", type=int, default=20)
+args = parser.parse_args()
+
+# La configuración se lee al importar app: base temporal y sin hot store (siempre SQL)
+workdir = tempfile.mkdtemp(prefix="bench_readings_")
+db_path = os.path.join(workdir, "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+os.environ["COLD_ARCHIVE_DIR"] = os.path.join(workdir, "cold")
+os.environ["HOT_STORE_MAX_POINTS"] = "0"
+os.environ["DEBUG"] = "False"
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app.database import init_db, engine, READING_FIELDS  # noqa: E402
+from app.columnar import orjson  # noqa: E402
+from main import app  # noqa: E402
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def seed(start: datetime):
+    columns = ["timestamp"] + READING_FIELDS + ["anomaly_score", "is_anomaly"]
+    rows = [
+        [(start + timedelta(seconds=i)).strftime(TS_FORMAT)]
+        + [round(random.uniform(0, 300), 2) for _ in READING_FIELDS] + [0.1, False]
+        for i in range(args.rows)
+    ]
+    conn = sqlite3.connect(db_path)
+    conn.executemany(
+        f"INSERT INTO motor_readings ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+    )
+    conn.commit()
+    conn.close()
+
+
+def measure(client, params: dict):
+    """Latencias (s) de una página por repetición y bytes de la respuesta"""
+    client.get("/api/readings", params=params)  # calentar caché de SQLite
+    times = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        response = client.get("/api/readings", params=params)
+        times.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.text
+    return times, len(response.content)
+
+
+async def prepare():
+    await init_db()
+    await engine.dispose()
+
+
+def main():
+    asyncio.run(prepare())
+    start = datetime(2024, 1, 1)
+    seed(start)
+    # Una página en mitad del historial (no la más reciente)
+    end = start + timedelta(seconds=args.rows // 2)
+    base = {"limit": args.limit, "start_time": start.isoformat(), "end_time": end.isoformat()}
+    print(f"📊 {args.rows} lecturas, páginas de {args.limit}, mediana de {args.repeat} "
+          f"(encoder: {'orjson' if orjson else 'json'})\n")
+
+    client = TestClient(app)
+    full_times, full_bytes = measure(client, base)
+    cols_times, cols_bytes = measure(client, {**base, "fields": args.fields})
+
+    full, cols = statistics.median(full_times), statistics.median(cols_times)
+    print(f"{'ruta':<28} {'latencia':>10} {'bytes':>10}")
+    print(f"{'ORM + pydantic (todo)':<28} {full * 1000:>8.1f}ms {full_bytes:>10}")
+    print(f"{'columnar fields=' + args.fields:<28} {cols * 1000:>8.1f}ms {cols_bytes:>10}")
+    print(f"\n⚡ {full / cols:.1f}x más rápido, {full_bytes / cols_bytes:.1f}x menos bytes")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Benchmark de estadísticas de reportes: carga ORM vs columnas NumPy vs agregación SQL (SQLite + DuckDB)
+
+Crea una base temporal con N días de lecturas, exporta los días más antiguos
+al archivo frío y mide cada ruta sobre el rango completo.
+
+Uso: python benchmark_reports.py [--days 30] [--interval 10] [--cold-days 20] [--repeat 3]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+parser.add_argument("--days", type=int, default=30)
+parser.add_argument("--interval", type=int, default=10, help="segundos entre lecturas")
+parser.add_argument("--cold-days", type=int, default=20, help="días exportados al archivo frío")
+parser.add_argument("--repeat", type=int, default=3)
+args = parser.parse_args()
+
+# La configuración se lee al importar app: apuntar a una base y un archivo frío temporales
+workdir = tempfile.mkdtemp(prefix="bench_reports_")
+db_path = os.path.join(workdir, "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{db_path}"
+os.environ["COLD_ARCHIVE_DIR"] = os.path.join(workdir, "cold")
+os.environ["DEBUG"] = "False"
+
+from sqlalchemy import select  # noqa: E402
+
+from app.database import init_db, async_session_maker, MotorReading, Alert, READING_FIELDS  # noqa: E402
+from app.cold_archive import export_closed_days  # noqa: E402
+from app.history import load_columns  # noqa: E402
+from app.analytics import (  # noqa: E402
+    calculate_statistics, sql_report_statistics, duckdb, REPORT_READING_COLUMNS, REPORT_ALERT_COLUMNS
+)
+
+TS_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+
+def seed(start: datetime):
+    conn = sqlite3.connect(db_path)
+    rows = []
+    n = args.days * 86400 // args.interval
+    for i in range(n):
+        ts = (start + timedelta(seconds=i * args.interval)).strftime(TS_FORMAT)
+        values = [random.uniform(0, 300) for _ in READING_FIELDS]
+        rows.append([ts] + values + [0.1, False])
+    columns = ["timestamp"] + READING_FIELDS + ["anomaly_score", "is_anomaly"]
+    conn.executemany(
+        f"INSERT INTO motor_readings ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})", rows
+    )
+    alerts = [
+        ((start + timedelta(seconds=random.uniform(0, args.days * 86400))).strftime(TS_FORMAT),
+         random.choice(["warning", "critical"]), random.choice(["temperature", "vibration", "voltage"]), "bench", False)
+        for _ in range(n // 100)
+    ]
+    alerts.sort()
+    conn.executemany("INSERT INTO alerts (timestamp, severity, category, message, resolved) VALUES (?, ?, ?, ?, ?)", alerts)
+    conn.commit()
+    conn.close()
+    return n, len(alerts)
+
+
+async def orm_load(start, end):
+    # Ruta anterior: un objeto ORM por lectura (solo la carga, sin el cálculo)
+    async with async_session_maker() as session:
+        readings = (await session.execute(
+            select(MotorReading).where(MotorReading.timestamp >= start, MotorReading.timestamp <= end)
+        )).scalars().all()
+        alerts = (await session.execute(
+            select(Alert).where(Alert.timestamp >= start, Alert.timestamp <= end)
+        )).scalars().all()
+    return {"total_readings": len(readings), "alerts": {"total": len(alerts)}}
+
+
+async def numpy_stats(start, end):
+    async with async_session_maker() as session:
+        readings = await load_columns(session, MotorReading, REPORT_READING_COLUMNS, start, end)
+        alerts = await load_columns(session, Alert, REPORT_ALERT_COLUMNS, start, end)
+    return calculate_statistics(readings, alerts)
+
+
+async def sql_stats(start, end):
+    async with async_session_maker() as session:
+        return await sql_report_statistics(session, start, end)
+
+
+async def timed(fn, start, end):
+    best, result = None, None
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        result = await fn(start, end)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+async def main():
+    await init_db()
+    start = datetime(2024, 1, 1)
+    end = start + timedelta(days=args.days)
+    n_readings, n_alerts = seed(start)
+    await export_closed_days(now=start + timedelta(days=args.cold_days))
+
+    print(f"📊 {n_readings} lecturas y {n_alerts} alertas en {args.days} días "
+          f"({args.cold_days} días en el archivo frío), mejor de {args.repeat}\n")
+    if duckdb is None:
+        print("⚠️  DuckDB no instalado: la ruta SQL no puede leer el archivo frío y se omite\n")
+
+    paths = [("ORM (solo carga)", orm_load), ("NumPy columnar", numpy_stats), ("SQL (SQLite+DuckDB)", sql_stats)]
+    results = {}
+    print(f"{'ruta':<22} {'tiempo':>10}")
+    for name, fn in paths:
+        elapsed, result = await timed(fn, start, end)
+        if result is None:
+            print(f"{name:<22} {'n/a':>10}")
+            continue
+        results[name] = result
+        print(f"{name:<22} {elapsed * 1000:>8.1f}ms")
+
+    if "SQL (SQLite+DuckDB)" in results:
+        a, b = results["NumPy columnar"], results["SQL (SQLite+DuckDB)"]
+        same = (a["total_readings"] == b["total_readings"] and a["alerts"] == b["alerts"]
+                and len(a["hourly_analysis"]) == len(b["hourly_analysis"]))
+        print(f"\n{'✅' if same else '❌'} NumPy y SQL coinciden en conteos, alertas y horas")
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,177 @@
+"""
+Benchmark de concurrencia lectura/escritura en SQLite: perfil por defecto vs perfil optimizado
+
+Simula la ingesta (una lectura por transacción, como el cliente MQTT) mientras
+varios lectores ejecutan las consultas calientes del dashboard.
+
+Uso: python benchmark_sqlite.py [--seconds 10] [--readers 4] [--rows 50000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from app.database import sqlite_pragmas
+from app.migrations import COMPOSITE_INDEXES
+
+SCHEMA = [
+    """CREATE TABLE motor_readings (
+        id INTEGER PRIMARY KEY, timestamp DATETIME, temperature FLOAT, vibration FLOAT,
+        rpm FLOAT, anomaly_score FLOAT, is_anomaly BOOLEAN)""",
+    "CREATE INDEX ix_motor_readings_timestamp ON motor_readings (timestamp)",
+    """CREATE TABLE alerts (
+        id INTEGER PRIMARY KEY, timestamp DATETIME, severity VARCHAR(20), category VARCHAR(50),
+        message TEXT, resolved BOOLEAN)""",
+    "CREATE INDEX ix_alerts_timestamp ON alerts (timestamp)",
+    """CREATE TABLE system_logs (
+        id INTEGER PRIMARY KEY, timestamp DATETIME, level VARCHAR(20), source VARCHAR(50), message TEXT)""",
+    "CREATE INDEX ix_system_logs_timestamp ON system_logs (timestamp)",
+]
+
+READ_QUERIES = [
+    "SELECT COUNT(*) FROM alerts WHERE resolved = 0 AND timestamp >= ?",
+    "SELECT COUNT(*) FROM motor_readings WHERE is_anomaly = 1 AND timestamp >= ?",
+    "SELECT * FROM alerts WHERE severity = 'critical' AND timestamp >= ? ORDER BY timestamp DESC LIMIT 50",
+    "SELECT * FROM system_logs WHERE level = 'error' AND source = 'mqtt' AND timestamp >= ? ORDER BY timestamp DESC LIMIT 50",
+]
+
+PROFILES = {
+    "default": {
+        "pragmas": ["PRAGMA journal_mode=DELETE", "PRAGMA synchronous=FULL"],
+        "indexes": [],
+    },
+    "tuned": {
+        "pragmas": sqlite_pragmas(),
+        "indexes": COMPOSITE_INDEXES,
+    },
+}
+
+
+def connect(path, pragmas):
+    # Mismo timeout de espera del lock que el driver por defecto (5 s) en ambos perfiles
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None, check_same_thread=False)
+    for pragma in pragmas:
+        conn.execute(pragma)
+    return conn
+
+
+def seed(path, profile, rows):
+    conn = connect(path, profile["pragmas"])
+    for statement in SCHEMA + profile["indexes"]:
+        conn.execute(statement)
+    start = datetime.utcnow() - timedelta(seconds=rows)
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO motor_readings (timestamp, temperature, vibration, rpm, anomaly_score, is_anomaly) VALUES (?, ?, ?, ?, ?, ?)",
+        [(str(start + timedelta(seconds=i)), 45.0, 3.5, 1750.0, 0.1, random.random() < 0.02) for i in range(rows)]
+    )
+    conn.executemany(
+        "INSERT INTO alerts (timestamp, severity, category, message, resolved) VALUES (?, ?, ?, ?, ?)",
+        [(str(start + timedelta(seconds=i * 5)), random.choice(["warning", "critical"]), "temperature", "x", random.random() > 0.01)
+         for i in range(rows // 5)]
+    )
+    conn.executemany(
+        "INSERT INTO system_logs (timestamp, level, source, message) VALUES (?, ?, ?, ?)",
+        [(str(start + timedelta(seconds=i * 5)), random.choice(["info", "warning", "error"]), random.choice(["mqtt", "ml", "api"]), "x")
+         for i in range(rows // 5)]
+    )
+    conn.execute("COMMIT")
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def run_profile(name, profile, seconds, readers, rows):
+    path = os.path.join(tempfile.mkdtemp(), f"bench_{name}.db")
+    seed(path, profile, rows)
+
+    stop = threading.Event()
+    stats = {"writes": 0, "reads": 0, "locked": 0, "read_latencies": [], "write_latencies": []}
+    lock = threading.Lock()
+
+    def writer():
+        conn = connect(path, profile["pragmas"])
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.execute(
+                    "INSERT INTO motor_readings (timestamp, temperature, vibration, rpm, anomaly_score, is_anomaly) VALUES (?, ?, ?, ?, ?, ?)",
+                    (str(datetime.utcnow()), 45.0, 3.5, 1750.0, 0.1, False)
+                )
+                conn.execute("COMMIT")
+                elapsed = time.perf_counter() - started
+                with lock:
+                    stats["writes"] += 1
+                    stats["write_latencies"].append(elapsed)
+            except sqlite3.OperationalError:
+                with lock:
+                    stats["locked"] += 1
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+        conn.close()
+
+    def reader():
+        conn = connect(path, profile["pragmas"])
+        since = str(datetime.utcnow() - timedelta(hours=24))
+        while not stop.is_set():
+            query = random.choice(READ_QUERIES)
+            started = time.perf_counter()
+            try:
+                conn.execute(query, (since,)).fetchall()
+                elapsed = time.perf_counter() - started
+                with lock:
+                    stats["reads"] += 1
+                    stats["read_latencies"].append(elapsed)
+            except sqlite3.OperationalError:
+                with lock:
+                    stats["locked"] += 1
+        conn.close()
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {
+        "profile": name,
+        "writes_per_s": stats["writes"] / seconds,
+        "reads_per_s": stats["reads"] / seconds,
+        "write_p95_ms": _p95(stats["write_latencies"]) * 1000,
+        "read_p95_ms": _p95(stats["read_latencies"]) * 1000,
+        "locked_errors": stats["locked"],
+    }
+
+
+def _p95(values: list) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[max(int(len(values) * 0.95) - 1, 0)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    print(f"📊 SQLite benchmark: {args.rows} filas, 1 escritor + {args.readers} lectores, {args.seconds}s por perfil\n")
+    print(f"{'perfil':<10} {'escrituras/s':>13} {'p95 escritura':>14} {'lecturas/s':>11} {'p95 lectura':>12} {'locked':>8}")
+    for name, profile in PROFILES.items():
+        r = run_profile(name, profile, args.seconds, args.readers, args.rows)
+        print(
+            f"{r['profile']:<10} {r['writes_per_s']:>13.1f} {r['write_p95_ms']:>12.2f}ms "
+            f"{r['reads_per_s']:>11.1f} {r['read_p95_ms']:>10.2f}ms {r['locked_errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 import uvicorn
@@ -10,6 +10,10 @@ from app.database import init_db
 from app.mqtt_client import mqtt_handler
 from app.routes import router
 from app.report_generator import router as report_router
+from app.warmup import warm_start
+from app.retention import retention_loop
+from app.db_writer import db_writer, log_writer
+from app.ws_hub import ws_hub
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -21,6 +25,16 @@ async def lifespan(app: FastAPI):
     await init_db()
     print("✅ Database initialized")
     
+    # Single writer task: every database write goes through its queue
+    db_writer.start()
+    log_writer.start()
+    
+    # Warm-up in background: /api/health/ready reports 503 until it finishes
+    warmup_task = asyncio.create_task(warm_start(mqtt_handler.ml_detector))
+    
+    # Retention job (raw readings and rollups)
+    retention_task = asyncio.create_task(retention_loop())
+    
     # Start MQTT client (desactivado temporalmente - TLS issue en Windows)
     # loop = asyncio.get_event_loop()
     # await mqtt_handler.start(loop)
@@ -30,7 +44,14 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("🛑 Shutting down...")
+    if not warmup_task.done():
+        warmup_task.cancel()
+    retention_task.cancel()
     # await mqtt_handler.stop()
+    # Ventanas temporales del detector para el próximo arranque (en su hilo, tras la extracción en curso)
+    await mqtt_handler.ml_detector.save_rolling()
+    await db_writer.stop()
+    await log_writer.stop()
 
 # Create FastAPI app
 app = FastAPI(
@@ -47,6 +68,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],  # cursor de paginación para el frontend
 )
 
 # Include API routes
@@ -64,29 +86,10 @@ async def root():
         "timestamp": datetime.utcnow().isoformat()
     }
 
-# WebSocket endpoint for real-time updates
+# WebSocket endpoint for real-time updates (lecturas, alertas y umbrales por motor / tópico)
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
-    try:
-        await websocket.send_json({
-            "type": "connection",
-            "message": "Connected to Motor Monitoring System",
-            "timestamp": datetime.utcnow().isoformat()
-        })
-        
-        # Keep connection alive
-        while True:
-            data = await websocket.receive_text()
-            # Echo back for now - can be extended for real-time data streaming
-            await websocket.send_json({
-                "type": "echo",
-                "data": data,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-    except WebSocketDisconnect:
-        print("Client disconnected from WebSocket")
+    await ws_hub.serve(websocket)
 
 if __name__ == "__main__":
     uvicorn.run(
@@ -0,0 +1,22 @@
+"""
+Script para reconstruir las tablas de rollups (1 minuto y 1 hora) desde motor_readings
+
+Solo se recalculan los buckets cubiertos por lecturas crudas; los más antiguos
+(lecturas ya borradas por retención o compactadas en bloques) se conservan.
+"""
+import asyncio
+import time
+from app.database import async_session_maker, init_db
+from app.rollups import rebuild_rollups
+
+async def rebuild():
+    await init_db()
+    started = time.perf_counter()
+    async with async_session_maker() as session:
+        rebuilt = await rebuild_rollups(session)
+    for resolution, (low, high) in rebuilt.items():
+        print(f"   {resolution}: {low} → {high}")
+    print(f"✅ Rollups reconstruidos en {time.perf_counter() - started:.2f}s")
+
+if __name__ == "__main__":
+    asyncio.run(rebuild())
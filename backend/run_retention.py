@@ -0,0 +1,32 @@
+"""Script para aplicar la política de retención manualmente"""
+import asyncio
+import sys
+from app.database import engine, init_db
+from app.retention import run_retention
+
+async def enable_incremental_vacuum():
+    # Cambiar auto_vacuum en una base existente requiere un VACUUM completo (una sola vez)
+    async with engine.connect() as conn:
+        await conn.exec_driver_sql("PRAGMA auto_vacuum=INCREMENTAL")
+        await conn.commit()
+        await conn.exec_driver_sql("VACUUM")
+    print("✅ auto_vacuum=INCREMENTAL activado")
+
+async def main():
+    await init_db()
+    if "--enable-incremental-vacuum" in sys.argv:
+        await enable_incremental_vacuum()
+    report = await run_retention()
+    if "cold_days_exported" in report:
+        print(f"✅ Días exportados al nivel frío: {report['cold_days_exported']}")
+    if "rows_compacted" in report:
+        print(f"✅ Lecturas compactadas en bloques: {report['rows_compacted']}")
+    print(f"✅ Lecturas crudas eliminadas: {report['raw_rows_removed']}")
+    print(f"   Bloques comprimidos eliminados: {report['blocks_rows_removed']}")
+    print(f"   Características espectrales eliminadas: {report['spectral_rows_removed']}")
+    print(f"   Rollups 1m eliminados: {report['rollup_1m_rows_removed']}")
+    print(f"   Rollups 1h eliminados: {report['rollup_1h_rows_removed']}")
+    print(f"   Espacio recuperado: {report['bytes_reclaimed'] / 1024:.1f} KB")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -46,6 +46,13 @@ float prevOut = 0;
 
 int16_t xRaw, yRaw, zRaw;
 
+// Bloque crudo para análisis espectral en el backend
+// Header: sample_rate (uint16), n_samples (uint16), escala g/LSB (float32), rpm (float32)
+#define WAVEFORM_HEADER 12
+#define G_PER_LSB 0.000732f
+int16_t waveform[N_SAMPLES];
+uint8_t waveformPayload[WAVEFORM_HEADER + 2 * N_SAMPLES];
+
 // Variables de vibración
 float ARMS;
 float APico;
@@ -182,9 +189,10 @@ void medirVibracion() {
 
   for (int i = 0; i < N_SAMPLES; i++) {
     readXYZ(xRaw, yRaw, zRaw);
+    waveform[i] = zRaw;
 
     // ±16g HR → 0.000732 g/LSB
-    float az = zRaw * 0.000732;
+    float az = zRaw * G_PER_LSB;
 
     // Filtro pasa-altos (quita gravedad y baja frecuencia)
     az = highPass(az);
@@ -227,6 +235,18 @@ void publicarDatos() {
   dtostrf(vibGeneral, 6, 4, buffer);
   client.publish("motor/vibracion/pico_pico", buffer);
   
+  // Forma de onda cruda (int16 little-endian) para FFT en el backend
+  uint16_t rate = SAMPLE_RATE;
+  uint16_t n = N_SAMPLES;
+  float scale = G_PER_LSB;
+  float rpm = RPM_FIJO;
+  memcpy(waveformPayload, &rate, 2);
+  memcpy(waveformPayload + 2, &n, 2);
+  memcpy(waveformPayload + 4, &scale, 4);
+  memcpy(waveformPayload + 8, &rpm, 4);
+  memcpy(waveformPayload + WAVEFORM_HEADER, waveform, 2 * N_SAMPLES);
+  client.publish("motor/vibracion/waveform", waveformPayload, sizeof(waveformPayload));
+  
   Serial.println("---- LIS2DHTR ISO 10816 ----");
   Serial.print("VRMS (mm/s): ");
   Serial.println(VRMS, 2);
@@ -256,6 +276,7 @@ void setup() {
   client.setCallback(callback);
   client.setKeepAlive(60);
   client.setSocketTimeout(20);
+  client.setBufferSize(1024);  // Bloque de forma de onda (812 bytes)
 
   // I2C (SDA=21, SCL=22)
   Wire.begin(21, 22);